@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Recall benchmark of the nearest-neighbour candidate index for the Traditional Matchmaking Telegram Bot.
+
+For a sample of seekers, the exact top-K candidates (every opposite-gender
+profile scored with calculate_batch_features_compatibility) are compared to
+the top-K left after re-scoring only the candidates the index retrieves.
+Recall@K and search latency are reported for several nprobe values.
+
+Usage:
+    python benchmarks/bench_ann_recall.py [--profiles 100000] [--queries 200] [--top 10]
+                                          [--candidates 300] [--nprobe 4 8 16 32]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the repository root to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from src.ann import CandidateIndex
+from src.features import ProfileFeatureStore
+from src.batch_matching import calculate_batch_features_compatibility
+
+from benchmarks.generator import generate_profiles
+
+def top_ids(seeker, candidates, vocabularies, k):
+    """Return the ids of the k best scoring candidates for a seeker."""
+    if not candidates:
+        return set()
+    scores = calculate_batch_features_compatibility(seeker, candidates, vocabularies)
+    best = np.argsort(-scores, kind='stable')[:k]
+    return {candidates[i].user_id for i in best}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=100000, help="Number of synthetic profiles")
+    parser.add_argument("--queries", type=int, default=200, help="Seekers evaluated")
+    parser.add_argument("--top", type=int, default=10, help="K of recall@K")
+    parser.add_argument("--candidates", type=int, default=300, help="Candidates retrieved for re-scoring")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32], help="Inverted lists scanned")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    store = ProfileFeatureStore()
+    records = store.get_many(generate_profiles(args.profiles, args.seed))
+    by_id = {features.user_id: features for features in records}
+
+    start = time.perf_counter()
+    index = CandidateIndex.build(records, store.vocabularies, seed=args.seed)
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    seekers = [records[i] for i in rng.choice(len(records), min(args.queries, len(records)), replace=False)]
+    exact = []
+    for seeker in seekers:
+        candidates = [features for features in records
+                      if features.gender != seeker.gender and features.user_id != seeker.user_id]
+        exact.append(top_ids(seeker, candidates, store.vocabularies, args.top))
+
+    results = {"profiles": args.profiles, "queries": len(seekers), "top": args.top,
+               "candidates": args.candidates, "build_seconds": round(build_seconds, 2), "nprobe": {}}
+    for nprobe in args.nprobe:
+        recalls, latencies = [], []
+        for seeker, expected in zip(seekers, exact):
+            start = time.perf_counter()
+            retrieved = index.search(seeker, store.vocabularies, args.candidates, nprobe)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = top_ids(seeker, [by_id[user_id] for user_id in retrieved], store.vocabularies, args.top)
+            recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+        results["nprobe"][str(nprobe)] = {
+            "recall": round(statistics.fmean(recalls), 4),
+            "search_p50_ms": round(statistics.median(latencies), 3),
+            "search_max_ms": round(max(latencies), 3)
+        }
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
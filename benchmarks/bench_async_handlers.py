@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the async handlers of the Traditional Matchmaking Telegram Bot.
+
+Seeds a temporary SQLite database, then fires show_potential_matches for
+many simultaneous users against mocked Telegram updates and reports update
+latency percentiles. It compares database work run through the bounded
+executor (run_db) with the same work run directly on the event loop, and
+also reports how late a 10 ms heartbeat task fires, which is the delay any
+other update (a /start, a button press) would see while the burst is served.
+
+Usage:
+    python benchmarks/bench_async_handlers.py [--users 500] [--pool 5000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the repository root to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import src.bot as bot
+import src.database as database
+from src.models import Base, User, Profile, Gender, ReligiosityLevel
+from src.match_cache import get_ranked_matches
+
+def seed_database(session, pool_size, seed=0):
+    """Insert users with profiles of alternating gender."""
+    rng = random.Random(seed)
+    for i in range(1, pool_size + 1):
+        user = User(telegram_id=str(i), first_name=f"User {i}")
+        user.profile = Profile(
+            gender=Gender.MALE if i % 2 else Gender.FEMALE,
+            age=rng.randint(20, 45),
+            religiosity_level=rng.choice(list(ReligiosityLevel)),
+            education_level=rng.choice(["High School", "Bachelor's Degree", "Master's Degree", "PhD"])
+        )
+        session.add(user)
+    session.commit()
+
+def warm_match_caches(session, user_count):
+    """Build the ranked match cache of every benchmarked user."""
+    for user in session.query(User).filter(User.id <= user_count).all():
+        get_ranked_matches(session, user)
+
+def make_update(telegram_id):
+    """Build a minimal callback-query update for show_potential_matches."""
+    async def edit_message_text(*args, **kwargs):
+        return None
+
+    query = SimpleNamespace(
+        from_user=SimpleNamespace(id=telegram_id),
+        edit_message_text=edit_message_text
+    )
+    return SimpleNamespace(callback_query=query)
+
+async def run_concurrent(user_count):
+    """
+    Run one update per user concurrently.
+
+    All updates arrive at the same moment, so latency is measured from that
+    moment to the handler's completion and includes time spent waiting for
+    the event loop.
+
+    Returns:
+        Tuple of (per-update latencies, heartbeat lags), both in milliseconds
+    """
+    latencies = []
+    lags = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            expected = time.perf_counter() + 0.01
+            await asyncio.sleep(0.01)
+            lags.append(max(time.perf_counter() - expected, 0) * 1000)
+
+    probe = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    arrival = time.perf_counter()
+
+    async def handle(telegram_id):
+        context = SimpleNamespace(user_data={'language': 'en'})
+        await bot.show_potential_matches(make_update(telegram_id), context)
+        latencies.append((time.perf_counter() - arrival) * 1000)
+
+    await asyncio.gather(*(handle(telegram_id) for telegram_id in range(1, user_count + 1)))
+    done.set()
+    await probe
+    return latencies, lags
+
+async def run_inline(func, *args, **kwargs):
+    """Run database work directly on the event loop (the old behaviour)."""
+    return func(*args, **kwargs)
+
+def summarize(latencies, lags, elapsed):
+    """Return latency percentiles, event loop lag and throughput."""
+    ordered = sorted(latencies)
+    return {
+        "updates": len(ordered),
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1], 2),
+        "p99_ms": round(ordered[int(len(ordered) * 0.99) - 1], 2),
+        "max_ms": round(ordered[-1], 2),
+        "loop_lag_max_ms": round(max(lags, default=0), 2),
+        "updates_per_second": round(len(ordered) / elapsed, 1)
+    }
+
+def run(user_count, pool_size):
+    """Seed a temporary database and benchmark both execution modes."""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = database.create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        database.session_factory.configure(bind=engine)
+
+        session = database.session_factory()
+        seed_database(session, pool_size)
+        warm_match_caches(session, user_count)
+        session.close()
+
+        results = {"users": user_count, "pool": pool_size}
+        for mode, runner in (("executor", database.run_db), ("event_loop", run_inline)):
+            bot.run_db = runner
+            start = time.perf_counter()
+            latencies, lags = asyncio.run(run_concurrent(user_count))
+            results[mode] = summarize(latencies, lags, time.perf_counter() - start)
+
+        bot.run_db = database.run_db
+        engine.dispose()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500, help="Simultaneous users")
+    parser.add_argument("--pool", type=int, default=5000, help="Users in the database")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.users, args.pool), indent=2))
+
+if __name__ == "__main__":
+    main()
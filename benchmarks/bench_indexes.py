@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Index benchmark for the Traditional Matchmaking Telegram Bot.
+
+Seeds a SQLite database with synthetic users, profiles, matches and
+conversations, then prints the query plan and timing of each hot query
+before and after the model indexes are applied.
+
+Usage:
+    python benchmarks/bench_indexes.py [--users 100000] [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the repository root to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src.models import (
+    Base, User, Profile, Match, Conversation, Message, conversation_participants,
+    Gender, MatchStatus
+)
+from src.migrations import apply_indexes, drop_indexes
+
+def seed_database(engine, user_count, seed=0):
+    """Insert synthetic rows with bulk core inserts."""
+    rng = random.Random(seed)
+    genders = [Gender.MALE.name, Gender.FEMALE.name]
+    statuses = [status.name for status in MatchStatus]
+
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": i, "telegram_id": str(1000000 + i), "first_name": f"User {i}", "account_status": "ACTIVE"}
+            for i in range(1, user_count + 1)
+        ])
+        connection.execute(Profile.__table__.insert(), [
+            {"id": i, "user_id": i, "gender": genders[i % 2], "age": rng.randint(18, 60),
+             "nationality": rng.choice(["Saudi", "Emirati", "Kuwaiti", "Qatari", "Bahraini", "Omani"])}
+            for i in range(1, user_count + 1)
+        ])
+
+        # Each user has sent a handful of match requests
+        pairs = set()
+        for sender_id in range(1, user_count + 1):
+            for _ in range(rng.randint(0, 4)):
+                receiver_id = rng.randint(1, user_count)
+                if receiver_id != sender_id:
+                    pairs.add((sender_id, receiver_id))
+        connection.execute(Match.__table__.insert(), [
+            {"sender_id": sender_id, "receiver_id": receiver_id, "compatibility_score": 50.0,
+             "status": rng.choice(statuses)}
+            for sender_id, receiver_id in pairs
+        ])
+
+        # A tenth of the users have a conversation with a few messages
+        conversation_count = user_count // 10
+        connection.execute(Conversation.__table__.insert(), [
+            {"id": i} for i in range(1, conversation_count + 1)
+        ])
+        connection.execute(conversation_participants.insert(), [
+            {"conversation_id": i, "user_id": user_id}
+            for i in range(1, conversation_count + 1)
+            for user_id in (2 * i - 1, 2 * i)
+        ])
+        connection.execute(Message.__table__.insert(), [
+            {"conversation_id": rng.randint(1, conversation_count), "sender_id": rng.randint(1, user_count),
+             "content": "Salam"}
+            for _ in range(conversation_count * 10)
+        ])
+
+def hot_queries(user_count):
+    """Return the (name, sql, params) of the queries the handlers run most often."""
+    user_id = user_count // 2
+    return [
+        ("user_by_telegram_id",
+         "SELECT id FROM users WHERE telegram_id = :telegram_id",
+         {"telegram_id": str(1000000 + user_id)}),
+        ("pending_reverse_match",
+         "SELECT id FROM matches WHERE sender_id = :sender AND receiver_id = :receiver AND status = 'PENDING'",
+         {"sender": user_id + 1, "receiver": user_id}),
+        ("received_matches",
+         "SELECT id FROM matches WHERE receiver_id = :receiver AND status = 'PENDING'",
+         {"receiver": user_id}),
+        ("candidates_by_gender_age",
+         "SELECT users.id FROM users JOIN profiles ON profiles.user_id = users.id "
+         "WHERE profiles.gender = 'FEMALE' AND profiles.age BETWEEN 25 AND 30 "
+         "AND users.account_status = 'ACTIVE' "
+         "AND NOT EXISTS (SELECT 1 FROM matches WHERE matches.sender_id = :user_id "
+         "                AND matches.receiver_id = users.id) LIMIT 1000",
+         {"user_id": user_id}),
+        ("conversations_for_user",
+         "SELECT conversation_id FROM conversation_participants WHERE user_id = :user_id",
+         {"user_id": 2 * (user_count // 20)}),
+        ("recent_messages",
+         "SELECT id FROM messages WHERE conversation_id = :conversation_id ORDER BY sent_at DESC LIMIT 50",
+         {"conversation_id": user_count // 20}),
+    ]
+
+def measure(engine, queries, repeat, budget_seconds=5.0):
+    """Return query plans and mean timings in milliseconds.
+
+    Each query runs up to `repeat` times, stopping once it has used
+    `budget_seconds`. A single execution that exceeds the budget is
+    interrupted and reported as timed out, since unindexed correlated
+    subqueries can take hours on a large database.
+    """
+    results = {}
+    with engine.connect() as connection:
+        raw_connection = connection.connection.driver_connection
+        for name, sql, params in queries:
+            plan = connection.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+            deadline = time.perf_counter() + budget_seconds
+            raw_connection.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10000)
+
+            runs = 0
+            timed_out = False
+            start = time.perf_counter()
+            try:
+                while runs < repeat and (runs == 0 or time.perf_counter() < deadline):
+                    connection.execute(text(sql), params).fetchall()
+                    runs += 1
+            except OperationalError:
+                timed_out = True
+                connection.rollback()
+            finally:
+                raw_connection.set_progress_handler(None, 0)
+            elapsed = time.perf_counter() - start
+
+            results[name] = {
+                "plan": [row[-1] for row in plan],
+                "runs": runs,
+                "timed_out": timed_out,
+                "mean_ms": round(elapsed / runs * 1000, 4) if runs else None
+            }
+    return results
+
+def _speedup(before, after):
+    """Return the before/after timing ratio, or None if either run timed out."""
+    if before["mean_ms"] is None or after["mean_ms"] is None:
+        return None
+    return round(before["mean_ms"] / max(after["mean_ms"], 1e-9), 1)
+
+def run(user_count, repeat):
+    """Seed a temporary database and compare query plans with and without indexes."""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        drop_indexes(engine)
+
+        start = time.perf_counter()
+        seed_database(engine, user_count)
+        seed_seconds = time.perf_counter() - start
+
+        queries = hot_queries(user_count)
+        before = measure(engine, queries, repeat)
+        created = apply_indexes(engine)
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        after = measure(engine, queries, repeat)
+        engine.dispose()
+
+    return {
+        "users": user_count,
+        "seed_seconds": round(seed_seconds, 2),
+        "indexes_created": created,
+        "queries": {
+            name: {
+                "before": before[name],
+                "after": after[name],
+                "speedup": _speedup(before[name], after[name])
+            }
+            for name in before
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000, help="Number of synthetic users")
+    parser.add_argument("--repeat", type=int, default=200, help="Executions per query")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.users, args.repeat), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Webhook load test for the Traditional Matchmaking Telegram Bot.
+
+Replays recorded update JSON (or synthetic /start messages and menu button
+presses) against WebhookApp and reports how many updates per second are
+accepted and processed, request latency and whether every user's updates
+were processed in order. By default the ASGI app is called in-process
+through httpx, with the bot's handlers replaced by a fixed simulated
+processing time, so no Telegram API or server is involved. With --url the
+updates are sent to a running webhook server instead.
+
+Usage:
+    python benchmarks/bench_webhook.py [--updates recorded.jsonl] [--count 20000] [--users 1000]
+                                       [--clients 64] [--concurrency 8] [--handler-ms 2]
+    python benchmarks/bench_webhook.py --url http://localhost:8443/telegram --secret TOKEN
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Add the repository root to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from telegram import Bot
+
+from src.webhook import WebhookApp
+
+# Secret token of the in-process app
+SECRET = "load-test-secret"
+
+class ReplayApplication:
+    """Stand-in for a PTB Application that records processed updates."""
+
+    def __init__(self, handler_ms):
+        self.bot = Bot("0:replay")
+        self.handler_seconds = handler_ms / 1000
+        self.processed = defaultdict(list)
+
+    async def initialize(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update):
+        await asyncio.sleep(self.handler_seconds)
+        self.processed[update.effective_user.id].append(update.update_id)
+
+def synthetic_updates(count, users):
+    """Alternate /start messages and main menu button presses from `users` users."""
+    now = int(time.time())
+    for update_id in range(1, count + 1):
+        user = {"id": 1000 + update_id % users, "is_bot": False, "first_name": "User"}
+        message = {"message_id": update_id, "date": now, "chat": {"id": user["id"], "type": "private"},
+                   "from": user, "text": "/start"}
+        if update_id % 2:
+            yield {"update_id": update_id, "message": message}
+        else:
+            yield {"update_id": update_id, "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": "1", "data": "menu_matches",
+                "message": message
+            }}
+
+def recorded_updates(path):
+    """Read updates from a JSON array or a file with one update per line."""
+    text = Path(path).read_text().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def sender_of(update):
+    """Telegram id of an update's sender, from the raw JSON."""
+    for value in update.values():
+        if isinstance(value, dict) and "from" in value:
+            return value["from"]["id"]
+    return 0
+
+async def replay(client, url, updates, clients, secret=SECRET):
+    """
+    POST every update with `clients` concurrent senders and return latencies and status counts.
+
+    Each sender owns a subset of the users and sends their updates in order.
+    """
+    latencies = []
+    statuses = defaultdict(int)
+    batches = [[] for _ in range(clients)]
+    for update in updates:
+        batches[sender_of(update) % clients].append(update)
+
+    async def sender(batch):
+        for update in batch:
+            start = time.perf_counter()
+            response = await client.post(url, content=json.dumps(update),
+                                         headers={"X-Telegram-Bot-Api-Secret-Token": secret,
+                                                  "Content-Type": "application/json"})
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(sender(batch) for batch in batches))
+    return latencies, statuses
+
+async def run(args):
+    updates = list(recorded_updates(args.updates) if args.updates else synthetic_updates(args.count, args.users))
+
+    if args.url:
+        async with httpx.AsyncClient(timeout=30) as client:
+            start = time.perf_counter()
+            latencies, statuses = await replay(client, args.url, updates, args.clients, args.secret)
+            elapsed = time.perf_counter() - start
+        return {"updates": len(updates), "statuses": dict(statuses),
+                "accepted_per_second": round(statuses[200] / elapsed, 1), **latency_summary(latencies)}
+
+    application = ReplayApplication(args.handler_ms)
+    app = WebhookApp(application, SECRET, path="/telegram", queue_size=args.queue_size,
+                     concurrency=args.concurrency)
+    await app.startup()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bot") as client:
+        start = time.perf_counter()
+        latencies, statuses = await replay(client, "/telegram", updates, args.clients)
+        accepted = time.perf_counter() - start
+        await app.shutdown()
+        processed = time.perf_counter() - start
+
+    ordered = all(ids == sorted(ids) for ids in application.processed.values())
+    return {
+        "updates": len(updates),
+        "statuses": dict(statuses),
+        "accepted_per_second": round(app.stats['accepted'] / accepted, 1),
+        "processed_per_second": round(app.stats['processed'] / processed, 1),
+        "per_user_order_kept": ordered,
+        **latency_summary(latencies)
+    }
+
+def latency_summary(latencies):
+    """Return p50 and p99 request latency in milliseconds."""
+    ordered = sorted(latencies)
+    return {
+        "request_p50_ms": round(statistics.median(ordered), 3),
+        "request_p99_ms": round(ordered[max(int(len(ordered) * 0.99) - 1, 0)], 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", default=None, help="Recorded updates (JSON array or JSON lines)")
+    parser.add_argument("--count", type=int, default=20000, help="Synthetic updates when none are recorded")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct senders of synthetic updates")
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent HTTP senders")
+    parser.add_argument("--concurrency", type=int, default=8, help="Updates processed at the same time")
+    parser.add_argument("--queue-size", type=int, default=1000, help="Updates buffered before requests wait")
+    parser.add_argument("--handler-ms", type=float, default=2.0, help="Simulated processing time per update")
+    parser.add_argument("--url", default=None, help="Send to a running webhook server instead")
+    parser.add_argument("--secret", default=SECRET, help="Secret token of the running server")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
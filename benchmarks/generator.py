@@ -0,0 +1,233 @@
+"""
+Synthetic profile generator for the benchmarks of the Traditional Matchmaking Telegram Bot.
+
+Every Profile and UserSettings field is drawn from a weighted distribution
+that roughly follows the bot's audience (GCC nationals, mostly moderate or
+conservative, most users filling in the optional questionnaires). The same
+seed always produces the same data, so results are comparable between commits.
+"""
+
+import datetime
+import random
+from types import SimpleNamespace
+
+from src.models import (
+    User, Profile, Interest, UserSettings, user_interests,
+    Gender, ReligiosityLevel, CoveringStyle, VerificationLevel
+)
+from src.matching import PersonalityType, determine_zodiac_sign
+
+# (value, weight) pairs; None stands for a question left unanswered
+NATIONALITIES = [("Saudi", 55), ("Emirati", 12), ("Kuwaiti", 10), ("Qatari", 6), ("Bahraini", 6),
+                 ("Omani", 8), (None, 3)]
+CITIES = {
+    "Saudi": ["Riyadh", "Jeddah", "Dammam", "Mecca", "Medina", "Khobar", "Abha"],
+    "Emirati": ["Dubai", "Abu Dhabi", "Sharjah", "Al Ain"],
+    "Kuwaiti": ["Kuwait City", "Hawalli", "Salmiya"],
+    "Qatari": ["Doha", "Al Rayyan", "Al Wakrah"],
+    "Bahraini": ["Manama", "Muharraq", "Riffa"],
+    "Omani": ["Muscat", "Salalah", "Sohar"]
+}
+EDUCATION_LEVELS = [("High School", 20), ("Bachelor's Degree", 50), ("Master's Degree", 18), ("PhD", 5),
+                    ("Other", 4), (None, 3)]
+PROFESSIONS = [("Engineer", 14), ("Teacher", 14), ("Doctor", 8), ("Nurse", 6), ("Accountant", 9),
+               ("Government employee", 18), ("Business owner", 8), ("IT specialist", 9), ("Student", 9),
+               (None, 5)]
+FAMILY_BACKGROUNDS = [("Tribal family", 40), ("Urban family", 40), ("Mixed background", 15), (None, 5)]
+RELIGIOSITY_LEVELS = [(ReligiosityLevel.CONSERVATIVE, 35), (ReligiosityLevel.MODERATE, 50),
+                      (ReligiosityLevel.PROGRESSIVE, 12), (None, 3)]
+PRAYER_HABITS = [("Five times daily", 55), ("Most daily prayers", 22), ("Weekly", 8), ("Occasionally", 8),
+                 ("Rarely", 3), (None, 4)]
+RELIGIOUS_EDUCATION = [("Formal Islamic education", 15), ("Regular Islamic classes", 30), ("Self-taught", 30),
+                       ("Basic knowledge", 20), (None, 5)]
+RELIGIOUS_PRACTICES = ["Regular Quran reading", "Quran memorization", "Islamic charity work",
+                       "Attend religious gatherings", "Voluntary fasting", "Umrah yearly", "Night prayers"]
+MARRIAGE_TIMELINES = [("Within 6 months", 25), ("Within a year", 40), ("1-2 years", 25), ("Not sure", 7),
+                      (None, 3)]
+LIVING_ARRANGEMENTS = [("With husband's family", 20), ("With wife's family", 3),
+                       ("Independent home near family", 45), ("Completely independent", 25), (None, 7)]
+HUSBAND_ROLES = ["Provider", "Spiritual leader", "Decision maker", "Protector", "Involved father"]
+WIFE_ROLES = ["Homemaker", "Child-rearer", "Career professional", "Supportive partner", "Educator"]
+FAMILY_SIZES = [("No children", 3), ("1-2 children", 20), ("3-5 children", 55), ("More than 5", 15), (None, 7)]
+PERSONAL_COVERING = [(CoveringStyle.NIQAB, 30), (CoveringStyle.HIJAB, 55), (CoveringStyle.SITUATIONAL, 8),
+                     (CoveringStyle.NONE, 4), (None, 3)]
+PARTNER_COVERING = [(CoveringStyle.NIQAB, 30), (CoveringStyle.HIJAB, 45), (CoveringStyle.SITUATIONAL, 5),
+                    (CoveringStyle.NONE, 2), (None, 18)]
+COVERING_IMPORTANCE = [(1, 10), (2, 10), (3, 25), (4, 25), (5, 25), (None, 5)]
+VERIFICATION_LEVELS = [(VerificationLevel.NONE, 50), (VerificationLevel.BASIC, 35),
+                       (VerificationLevel.PROFESSIONAL, 10), (VerificationLevel.FULL, 5)]
+INTEREST_CATEGORIES = ["Sports", "Reading", "Travel", "Cooking", "Technology", "Arts", "Volunteering", "Nature"]
+
+# Share of users that completed each optional questionnaire
+PERSONALITY_TEST_RATE = 0.7
+HOROSCOPE_RATE = 0.5
+ROLE_EXPECTATIONS_RATE = 0.8
+SETTINGS_RATE = 0.85
+
+def weighted(rng, choices):
+    """Pick a value from (value, weight) pairs."""
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+def generate_profile_fields(rng, gender, interest_count=60):
+    """
+    Generate values for every Profile column of one user.
+
+    Args:
+        rng: random.Random instance
+        gender: Gender of the user
+        interest_count: Size of the interest catalogue
+
+    Returns:
+        Tuple of (column values dict, list of interest ids)
+    """
+    age = max(18, min(60, int(rng.gauss(29, 6))))
+    nationality = weighted(rng, NATIONALITIES)
+    birth_date = None
+    zodiac_sign = None
+    if rng.random() < HOROSCOPE_RATE:
+        birth_date = datetime.datetime(datetime.date.today().year - age, rng.randint(1, 12), rng.randint(1, 28))
+        zodiac_sign = determine_zodiac_sign(birth_date.date()).value
+
+    role_expectations = None
+    if rng.random() < ROLE_EXPECTATIONS_RATE:
+        role_expectations = {
+            "husband_role": rng.sample(HUSBAND_ROLES, rng.randint(1, 3)),
+            "wife_role": rng.sample(WIFE_ROLES, rng.randint(1, 3))
+        }
+
+    personality_type = None
+    if rng.random() < PERSONALITY_TEST_RATE:
+        personality_type = rng.choice(list(PersonalityType)).value
+
+    female = gender == Gender.FEMALE
+    fields = {
+        "age": age,
+        "gender": gender,
+        "nationality": nationality,
+        "city": rng.choice(CITIES[nationality]) if nationality else None,
+        "education_level": weighted(rng, EDUCATION_LEVELS),
+        "profession": weighted(rng, PROFESSIONS),
+        "family_background": weighted(rng, FAMILY_BACKGROUNDS),
+        "religiosity_level": weighted(rng, RELIGIOSITY_LEVELS),
+        "prayer_habits": weighted(rng, PRAYER_HABITS),
+        "religious_education": weighted(rng, RELIGIOUS_EDUCATION),
+        "religious_practices": rng.sample(RELIGIOUS_PRACTICES, rng.randint(0, 4)),
+        "marriage_timeline": weighted(rng, MARRIAGE_TIMELINES),
+        "living_arrangement": weighted(rng, LIVING_ARRANGEMENTS),
+        "role_expectations": role_expectations,
+        "family_size": weighted(rng, FAMILY_SIZES),
+        "personal_covering": weighted(rng, PERSONAL_COVERING) if female else None,
+        "partner_covering_preference": None if female else weighted(rng, PARTNER_COVERING),
+        "covering_importance": weighted(rng, COVERING_IMPORTANCE),
+        "personality_type": personality_type,
+        "personality_details": {"I": rng.randint(0, 100), "S": rng.randint(0, 100),
+                                "T": rng.randint(0, 100), "J": rng.randint(0, 100)} if personality_type else None,
+        "birth_date": birth_date,
+        "birth_time": f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}" if birth_date else None,
+        "birth_location": _birth_city(rng, nationality) if birth_date else None,
+        "zodiac_sign": zodiac_sign,
+        "verified": rng.random() < 0.3,
+        "verification_level": weighted(rng, VERIFICATION_LEVELS)
+    }
+    interest_ids = rng.sample(range(1, interest_count + 1), rng.randint(0, 8))
+    return fields, interest_ids
+
+def _birth_city(rng, nationality):
+    """Pick a city of a nationality, or a Saudi city when it is unknown."""
+    return rng.choice(CITIES[nationality] if nationality else CITIES["Saudi"])
+
+def generate_settings_fields(rng, age):
+    """
+    Generate values for the matching-related UserSettings columns of one user.
+
+    Args:
+        rng: random.Random instance
+        age: Age of the user
+
+    Returns:
+        Dict of column values
+    """
+    nationalities = [value for value, _ in NATIONALITIES if value]
+    return {
+        "age_range_min": max(18, age - rng.randint(3, 8)),
+        "age_range_max": age + rng.randint(3, 10),
+        "preferred_nationalities": rng.sample(nationalities, rng.randint(2, 6)) if rng.random() < 0.3 else None,
+        "religious_compatibility_importance": weighted(rng, [(5, 40), (4, 30), (3, 20), (2, 7), (1, 3)]),
+        "family_background_importance": rng.randint(1, 5),
+        "religious_dealbreaker": rng.random() < 0.4,
+        "language_preference": rng.choice(["ar", "ar", "en"])
+    }
+
+def generate_profiles(count, seed=0, interest_count=60):
+    """
+    Generate profile-like objects for scoring benchmarks without a database.
+
+    Each object carries the Profile fields, its interests and an optional
+    `settings` namespace as read by has_dealbreakers.
+
+    Args:
+        count: Number of profiles
+        seed: Random seed
+        interest_count: Size of the interest catalogue
+
+    Returns:
+        List of SimpleNamespace profiles with ids 1..count
+    """
+    rng = random.Random(seed)
+    profiles = []
+    for profile_id in range(1, count + 1):
+        gender = Gender.MALE if profile_id % 2 else Gender.FEMALE
+        fields, interest_ids = generate_profile_fields(rng, gender, interest_count)
+        settings = None
+        if rng.random() < SETTINGS_RATE:
+            settings = SimpleNamespace(**generate_settings_fields(rng, fields["age"]))
+        profiles.append(SimpleNamespace(
+            id=profile_id,
+            user_id=profile_id,
+            interests=[SimpleNamespace(id=interest_id) for interest_id in interest_ids],
+            settings=settings,
+            **fields
+        ))
+    return profiles
+
+def seed_database(engine, user_count, seed=0, interest_count=60, batch_size=20000):
+    """
+    Insert synthetic users with profiles, settings and interests using bulk core inserts.
+
+    Users alternate gender and have ids and Telegram ids 1..user_count.
+
+    Args:
+        engine: SQLAlchemy Engine with the schema created
+        user_count: Number of users
+        seed: Random seed
+        interest_count: Size of the interest catalogue
+        batch_size: Users inserted per statement batch
+    """
+    rng = random.Random(seed)
+
+    with engine.begin() as connection:
+        connection.execute(Interest.__table__.insert(), [
+            {"id": i, "name": f"{INTEREST_CATEGORIES[i % len(INTEREST_CATEGORIES)]} {i}",
+             "category": INTEREST_CATEGORIES[i % len(INTEREST_CATEGORIES)]}
+            for i in range(1, interest_count + 1)
+        ])
+
+        for start in range(1, user_count + 1, batch_size):
+            users, profiles, settings, interests = [], [], [], []
+            for user_id in range(start, min(start + batch_size, user_count + 1)):
+                gender = Gender.MALE if user_id % 2 else Gender.FEMALE
+                fields, interest_ids = generate_profile_fields(rng, gender, interest_count)
+                users.append({"id": user_id, "telegram_id": str(user_id), "first_name": f"User {user_id}",
+                              "language_code": "ar", "account_status": "ACTIVE"})
+                profiles.append({"id": user_id, "user_id": user_id, **fields})
+                if rng.random() < SETTINGS_RATE:
+                    settings.append({"user_id": user_id, **generate_settings_fields(rng, fields["age"])})
+                interests.extend({"user_id": user_id, "interest_id": interest_id} for interest_id in interest_ids)
+
+            connection.execute(User.__table__.insert(), users)
+            connection.execute(Profile.__table__.insert(), profiles)
+            if settings:
+                connection.execute(UserSettings.__table__.insert(), settings)
+            if interests:
+                connection.execute(user_interests.insert(), interests)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Traditional Matchmaking Telegram Bot.
+
+Measures, at each requested database size:
+
+- scoring: scalar calculate_overall_compatibility against batched scoring,
+  with and without pre-encoded profile features, and bounded top-K selection
+- dealbreakers: has_dealbreakers per pair against the vectorized check
+- database: timings of the queries behind the handlers
+- handlers: end-to-end show_potential_matches latency against mocked
+  Telegram updates, with a cold and a warm match cache
+
+Results are written as JSON together with the commit they were measured
+on. Passing a previous results file with --compare prints every metric
+that regressed by more than the threshold and exits with status 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scales 1000 10000 100000] [--output results.json]
+                                        [--compare baseline.json] [--threshold 0.25]
+"""
+
+import argparse
+import asyncio
+import datetime
+import functools
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the repository root to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+
+import src.bot as bot
+from src import repository
+from src.database import create_db_engine
+from src.models import Base, User
+from src.matching import calculate_overall_compatibility, has_dealbreakers
+from src.features import ProfileFeatureStore, feature_store
+from src.batch_matching import (
+    ProfileMatrix, batch_dealbreakers, calculate_batch_compatibility, calculate_batch_features_compatibility
+)
+from src.ranking import top_k_matches, top_k_features
+from src.candidates import find_candidates
+from src.match_cache import build_match_cache, get_ranked_matches
+
+from benchmarks.generator import generate_profiles, seed_database
+
+# Scalar loops are slow, so their rate is measured on at most this many pairs
+MAX_SCALAR_PAIRS = 20000
+
+def timings(func, repeat):
+    """Run func `repeat` times and return latency statistics in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+def summarize(samples):
+    """Return mean, p50 and p99 of latency samples in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        "p50_ms": round(statistics.median(ordered), 4),
+        "p99_ms": round(ordered[max(int(len(ordered) * 0.99) - 1, 0)], 4)
+    }
+
+def throughput(func, pairs, repeat=3):
+    """Return the best pairs-per-second rate of func over `repeat` runs."""
+    best = min(timings(func, 1)["mean_ms"] for _ in range(repeat))
+    return round(pairs / (best / 1000), 1)
+
+def bench_scoring(scale, seed=0):
+    """Compare scalar, batched and pre-encoded scoring of one seeker against `scale` candidates."""
+    profiles = generate_profiles(scale + 1, seed)
+    seeker, candidates = profiles[0], profiles[1:]
+    scalar_candidates = candidates[:MAX_SCALAR_PAIRS]
+
+    store = ProfileFeatureStore()
+    seeker_features = store.get(seeker)
+    candidate_features = store.get_many(candidates)
+
+    start = time.perf_counter()
+    ProfileFeatureStore().get_many(candidates)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "pairs": len(candidates),
+        "scalar_pairs_per_second": throughput(
+            lambda: [calculate_overall_compatibility(seeker, candidate) for candidate in scalar_candidates],
+            len(scalar_candidates), repeat=1),
+        "batch_pairs_per_second": throughput(
+            lambda: calculate_batch_compatibility(seeker, candidates), len(candidates)),
+        "features_pairs_per_second": throughput(
+            lambda: calculate_batch_features_compatibility(seeker_features, candidate_features, store.vocabularies),
+            len(candidates)),
+        "top_k_pairs_per_second": throughput(
+            lambda: top_k_matches(seeker, scalar_candidates), len(scalar_candidates), repeat=1),
+        "top_k_features_pairs_per_second": throughput(
+            lambda: top_k_features(seeker_features, candidate_features), len(candidates)),
+        "encode_ms": round(encode_ms, 2)
+    }
+
+def bench_dealbreakers(scale, seed=0):
+    """Compare has_dealbreakers per pair with the vectorized check."""
+    profiles = generate_profiles(scale + 1, seed)
+    # A seeker with a strict covering preference, so some pairs are blocked
+    seeker = next(profile for profile in profiles
+                  if profile.partner_covering_preference and profile.covering_importance == 5)
+    candidates = [profile for profile in profiles if profile is not seeker]
+    scalar_candidates = candidates[:MAX_SCALAR_PAIRS]
+
+    store = ProfileFeatureStore()
+    seeker_matrix = ProfileMatrix.from_features([store.get(seeker)], store.vocabularies)
+    candidate_matrix = ProfileMatrix.from_features(store.get_many(candidates), store.vocabularies)
+    blocked = batch_dealbreakers(seeker_matrix, candidate_matrix)
+
+    return {
+        "pairs": len(candidates),
+        "blocked_share": round(float(np.mean(blocked)), 4),
+        "scalar_pairs_per_second": throughput(
+            lambda: [has_dealbreakers(seeker, candidate) for candidate in scalar_candidates],
+            len(scalar_candidates)),
+        "batch_pairs_per_second": throughput(
+            lambda: batch_dealbreakers(seeker_matrix, candidate_matrix), len(candidates))
+    }
+
+def bench_database(factory, sample_ids, repeat):
+    """Time the queries behind the handlers for a sample of users."""
+    session = factory()
+    try:
+        users = itertools.cycle([session.get(User, user_id) for user_id in sample_ids])
+        next_user = functools.partial(next, users)
+
+        results = {
+            "user_by_telegram_id": timings(
+                lambda: repository.get_user_by_telegram_id(
+                    session, next_user().telegram_id, repository.MATCHING_OPTIONS), repeat),
+            "find_candidates": timings(lambda: find_candidates(session, next_user()), repeat),
+            "build_match_cache": timings(lambda: build_match_cache(session, next_user()), repeat)
+        }
+        # Every sampled user now has a fresh cache
+        results["ranked_matches_warm"] = timings(lambda: get_ranked_matches(session, next_user()), repeat)
+        results["load_conversations"] = timings(
+            lambda: repository.load_conversations(next_user().telegram_id), repeat)
+        return results
+    finally:
+        session.close()
+
+def make_update(telegram_id):
+    """Build a minimal callback-query update for show_potential_matches."""
+    async def edit_message_text(*args, **kwargs):
+        return None
+
+    return SimpleNamespace(callback_query=SimpleNamespace(
+        from_user=SimpleNamespace(id=telegram_id),
+        edit_message_text=edit_message_text
+    ))
+
+def bench_handlers(sample_ids):
+    """Measure show_potential_matches end to end, first with a cold and then a warm match cache."""
+    async def serve(telegram_id):
+        context = SimpleNamespace(user_data={'language': 'en'})
+        start = time.perf_counter()
+        await bot.show_potential_matches(make_update(telegram_id), context)
+        return (time.perf_counter() - start) * 1000
+
+    async def run_all():
+        cold = [await serve(telegram_id) for telegram_id in sample_ids]
+        warm = [await serve(telegram_id) for telegram_id in sample_ids]
+        return cold, warm
+
+    cold, warm = asyncio.run(run_all())
+    return {"show_potential_matches_cold": summarize(cold), "show_potential_matches_warm": summarize(warm)}
+
+def run_scale(scale, repeat, sample_size, seed=0):
+    """Run every benchmark against a database of `scale` users."""
+    results = {
+        "scoring": bench_scoring(scale, seed),
+        "dealbreakers": bench_dealbreakers(scale, seed)
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        seed_database(engine, scale, seed)
+        results["seed_seconds"] = round(time.perf_counter() - start, 2)
+
+        factory = sessionmaker(bind=engine)
+        rng = random.Random(seed)
+        database_sample = rng.sample(range(1, scale + 1), min(sample_size, scale))
+        handler_sample = rng.sample(range(1, scale + 1), min(sample_size, scale))
+
+        feature_store.clear()
+        with patch('src.repository.get_session', factory):
+            results["database"] = bench_database(factory, database_sample, repeat)
+            results["handlers"] = bench_handlers(handler_sample)
+        engine.dispose()
+
+    return results
+
+def git_commit():
+    """Return the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results, prefix=""):
+    """Return {dotted.path: value} for every comparable metric in a results tree."""
+    metrics = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_per_second")):
+            metrics[path] = value
+    return metrics
+
+def compare(current, baseline, threshold):
+    """
+    Return the metrics that got worse than the baseline by more than `threshold`.
+
+    Latencies (*_ms) regress when they grow, throughputs (*_per_second) when
+    they shrink.
+
+    Returns:
+        List of (metric, baseline value, current value, relative change)
+    """
+    before = flatten(baseline["scales"])
+    after = flatten(current["scales"])
+    regressions = []
+    for metric in sorted(before.keys() & after.keys()):
+        if not before[metric]:
+            continue
+        change = (after[metric] - before[metric]) / before[metric]
+        worse = change > threshold if metric.endswith("_ms") else change < -threshold
+        if worse:
+            regressions.append((metric, before[metric], after[metric], round(change, 3)))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Numbers of users to benchmark with")
+    parser.add_argument("--repeat", type=int, default=50, help="Executions per database query")
+    parser.add_argument("--sample", type=int, default=50, help="Users sampled for handler and query timings")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file")
+    parser.add_argument("--compare", default=None, help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scales": {str(scale): run_scale(scale, args.repeat, args.sample) for scale in args.scales}
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        for metric, before, after, change in regressions:
+            print(f"REGRESSION {metric}: {before} -> {after} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
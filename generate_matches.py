@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Entry point for the nightly match generation pipeline of the Traditional Matchmaking Telegram Bot.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.pipeline import main
+
+if __name__ == "__main__":
+    main()
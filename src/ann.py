@@ -0,0 +1,519 @@
+"""
+Approximate nearest-neighbour candidate retrieval for the Traditional Matchmaking Telegram Bot.
+
+Every profile is embedded into a fixed-length vector built from the same
+factors calculate_overall_compatibility weights. Candidates get a one-hot
+(or normalized set) document vector and the seeker a query vector holding
+the weighted sub-scores of each possible candidate value. Their inner
+product therefore approximates the overall score. The vectors are stored
+on disk in an inverted-file (IVF) index per gender. A search returns the
+few hundred most promising candidates, which are then re-scored exactly.
+
+The index records when it was built and the highest profile id it holds,
+so profiles created or changed since are considered alongside its results.
+Every build is written to its own generation directory and published by
+atomically replacing the CURRENT pointer file; processes reload the index
+when the pointer changes, so they never mix files of two builds.
+
+Usage:
+    python -m src.ann [--nlist N]    # rebuild the index from the database
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import zlib
+
+import numpy as np
+
+from src.config import ANN_INDEX_DIR, ANN_INDEX_KEEP, ANN_CANDIDATES, ANN_NPROBE
+from src.matching import MBTI_SCORES, ZODIAC_SCORES, MBTI_SIZE, ZODIAC_SIZE
+from src.features import MISSING, GENDERS, COVERING_STYLES, LIVING_ARRANGEMENTS, ARRANGEMENT_TABLE, default_weights
+
+logger = logging.getLogger(__name__)
+
+def _difference_rows(size, step):
+    """Pairwise max(0, 100 - diff * step) scores of codes 0..size-1."""
+    return [[max(0, 100 - abs(a - b) * step) for b in range(size)] for a in range(size)]
+
+def _arrangement_rows():
+    """Living arrangement scores, with identical codes scoring 100."""
+    rows = [list(row) for row in ARRANGEMENT_TABLE]
+    for code in range(len(LIVING_ARRANGEMENTS)):
+        rows[code][code] = 100
+    return rows
+
+# Categorical factors: (record attribute, pairwise score rows, weight, factors
+# sharing that weight). Each gets one slot per code plus one for a missing value.
+CATEGORICAL_BLOCKS = (
+    ('religiosity', _difference_rows(3, 35), 'religious', 4),
+    ('prayer', _difference_rows(5, 25), 'religious', 4),
+    ('religious_education', _difference_rows(4, 33), 'religious', 4),
+    ('arrangement', _arrangement_rows(), 'family', 3),
+    ('family_size', _difference_rows(4, 33), 'family', 3),
+    ('education', _difference_rows(4, 25), 'lifestyle', 2),
+    ('personality', [list(MBTI_SCORES[i * MBTI_SIZE:(i + 1) * MBTI_SIZE]) for i in range(MBTI_SIZE)],
+     'personality', 1),
+    ('zodiac', [list(ZODIAC_SCORES[i * ZODIAC_SIZE:(i + 1) * ZODIAC_SIZE]) for i in range(ZODIAC_SIZE)],
+     'horoscope', 1)
+)
+
+# Set-valued factors: (record attribute, hashed dimensions, weight, factors
+# sharing that weight). Tokens are hashed so vectors do not depend on the
+# order in which a process's vocabularies saw them; one more slot marks an
+# empty set.
+SET_BLOCKS = (
+    ('practices', 16, 'religious', 4),
+    ('husband_roles', 8, 'family', 6),
+    ('wife_roles', 8, 'family', 6),
+    ('interests', 64, 'lifestyle', 2)
+)
+
+# Factors the exact score leaves out when a value is missing (the rest of the
+# factor group is averaged instead) are approximated by this sub-score
+NEUTRAL_SCORE = 70
+
+# Query weight of candidate values that are deal-breakers for the pair
+DEALBREAKER_PENALTY = -10000
+
+COVERING_SLOTS = len(COVERING_STYLES) + 1
+
+EMBEDDING_DIM = (sum(len(rows) + 1 for _, rows, _, _ in CATEGORICAL_BLOCKS) +
+                 sum(dims + 1 for _, dims, _, _ in SET_BLOCKS) +
+                 # Religiosity of strict candidates, personal covering, strict partner covering
+                 4 + 2 * COVERING_SLOTS)
+
+def _token_slot(token, dims):
+    """Stable hashed slot of a set token."""
+    return zlib.crc32(str(token).encode('utf-8')) % dims
+
+def _set_vector(features, attribute, vocabularies, dims):
+    """Unit-length vector of a record's hashed set tokens (zeros if empty)."""
+    vector = np.zeros(dims, dtype=np.float32)
+    for token in getattr(vocabularies, attribute).tokens(getattr(features, attribute)):
+        vector[_token_slot(token, dims)] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _one_hot(code, size):
+    """Vector with a 1 at code, or in the last (missing) slot."""
+    block = np.zeros(size, dtype=np.float32)
+    block[size - 1 if code == MISSING else min(code, size - 2)] = 1
+    return block
+
+def _religiosity_conflicts(level):
+    """Mask of the religiosity levels more than one step away from a level."""
+    return np.array([level != MISSING and abs(level - other) > 1 for other in range(3)] + [False])
+
+def _covering_conflicts(style):
+    """Mask of the known covering styles other than a style."""
+    return np.array([style != MISSING and style != other for other in range(len(COVERING_STYLES))] + [False])
+
+def embed_candidate(features, vocabularies):
+    """
+    Embed an encoded profile as a candidate (document) vector.
+
+    Args:
+        features: ProfileFeatures of the candidate
+        vocabularies: ProfileVocabularies the record was encoded with
+
+    Returns:
+        float32 vector of length EMBEDDING_DIM
+    """
+    blocks = [_one_hot(getattr(features, attribute), len(rows) + 1)
+              for attribute, rows, _, _ in CATEGORICAL_BLOCKS]
+    for attribute, dims, _, _ in SET_BLOCKS:
+        vector = _set_vector(features, attribute, vocabularies, dims)
+        blocks.append(np.append(vector, np.float32(not vector.any())))
+
+    blocks.append(_one_hot(features.religiosity if features.religious_strict else MISSING, 4))
+    blocks.append(_one_hot(features.personal_covering, COVERING_SLOTS))
+    blocks.append(_one_hot(features.partner_covering if features.covering_strict else MISSING, COVERING_SLOTS))
+    return np.concatenate(blocks)
+
+def embed_query(features, vocabularies, weights=None):
+    """
+    Embed an encoded profile as a seeker (query) vector.
+
+    The inner product with a candidate vector approximates the overall
+    compatibility score, up to a constant per seeker, and is strongly
+    negative for candidates with a deal-breaker.
+
+    Args:
+        features: ProfileFeatures of the seeker
+        vocabularies: ProfileVocabularies the record was encoded with
+        weights: Dictionary of weights for different compatibility factors
+
+    Returns:
+        float32 vector of length EMBEDDING_DIM
+    """
+    if weights is None:
+        weights = default_weights()
+
+    blocks = []
+    for attribute, rows, weight, factors in CATEGORICAL_BLOCKS:
+        code = getattr(features, attribute)
+        if code == MISSING:
+            # The factor is left out for every candidate
+            block = np.zeros(len(rows) + 1, dtype=np.float32)
+        else:
+            block = np.array(rows[min(code, len(rows) - 1)] + [NEUTRAL_SCORE], dtype=np.float32)
+        blocks.append(block * (weights[weight] / factors))
+    for attribute, dims, weight, factors in SET_BLOCKS:
+        vector = _set_vector(features, attribute, vocabularies, dims)
+        if vector.any():
+            block = np.append(vector * 100, np.float32(NEUTRAL_SCORE))
+        else:
+            block = np.zeros(dims + 1, dtype=np.float32)
+        blocks.append(block * (weights[weight] / factors))
+
+    # Religious level deal-breakers, from the seeker's settings and from strict candidates'
+    if features.religious_strict:
+        blocks[0][:-1][_religiosity_conflicts(features.religiosity)[:-1]] += DEALBREAKER_PENALTY
+    blocks.append(_religiosity_conflicts(features.religiosity) * np.float32(DEALBREAKER_PENALTY))
+
+    # Covering deal-breakers, from the seeker's preference and from strict candidates'
+    wanted = features.partner_covering if features.covering_strict else MISSING
+    blocks.append(_covering_conflicts(wanted) * np.float32(DEALBREAKER_PENALTY))
+    blocks.append(_covering_conflicts(features.personal_covering) * np.float32(DEALBREAKER_PENALTY))
+    return np.concatenate(blocks).astype(np.float32)
+
+def embed_candidates(records, vocabularies):
+    """Embed many encoded profiles as a (len(records), EMBEDDING_DIM) float32 matrix."""
+    vectors = np.zeros((len(records), EMBEDDING_DIM), dtype=np.float32)
+    for row, features in enumerate(records):
+        vectors[row] = embed_candidate(features, vocabularies)
+    return vectors
+
+def _nearest_centroids(vectors, centroids, batch_size=8192):
+    """Index of the closest (L2) centroid of every vector."""
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start:start + batch_size])
+        assignments[start:start + batch_size] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+def _kmeans(vectors, nlist, iterations, rng, sample_size=64):
+    """Train nlist centroids with Lloyd's algorithm on a sample of the vectors."""
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * sample_size), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        filled = counts > 0
+        # Empty clusters keep their previous centroid
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+class IVFIndex:
+    """Inverted-file index over candidate vectors for inner-product search."""
+
+    FILES = ('centroids', 'offsets', 'ids', 'vectors')
+
+    def __init__(self, centroids, offsets, ids, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, vectors, nlist=None, iterations=10, seed=0):
+        """
+        Cluster vectors into inverted lists.
+
+        Args:
+            ids: Integer id of each vector
+            vectors: float32 matrix of candidate vectors
+            nlist: Number of inverted lists (defaults to sqrt(n))
+            iterations: k-means iterations
+            seed: Random seed for centroid training
+
+        Returns:
+            IVFIndex
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return cls(np.zeros((0, EMBEDDING_DIM), np.float32), np.zeros(1, np.int64), ids,
+                       np.zeros((0, EMBEDDING_DIM), np.float32))
+
+        nlist = min(nlist or max(1, int(np.sqrt(len(ids)))), len(ids))
+        centroids = _kmeans(vectors, nlist, iterations, np.random.default_rng(seed))
+        assignments = _nearest_centroids(vectors, centroids)
+
+        # Store each list contiguously so a probe reads one slice
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=nlist)))).astype(np.int64)
+        return cls(centroids, offsets, ids[order], vectors[order])
+
+    def search(self, query, k, nprobe=ANN_NPROBE):
+        """
+        Return the k stored vectors with the largest inner product among the nprobe best lists.
+
+        Args:
+            query: Query vector
+            k: Number of results
+            nprobe: Number of inverted lists scanned
+
+        Returns:
+            Tuple of (ids, scores) arrays, best first
+        """
+        if not len(self.ids):
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        ids = np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+        scores = np.concatenate([self.vectors[self.offsets[c]:self.offsets[c + 1]] @ query for c in probe])
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return ids[top], scores[top]
+
+    def save(self, directory, prefix):
+        """Write the index as .npy files named <prefix>.<part>.npy."""
+        for name in self.FILES:
+            with open(os.path.join(directory, f"{prefix}.{name}.npy"), "wb") as output:
+                np.save(output, getattr(self, name))
+                output.flush()
+                os.fsync(output.fileno())
+
+    @classmethod
+    def load(cls, directory, prefix, mmap=True):
+        """Load an index saved by save(), memory-mapping the arrays by default."""
+        return cls(*(np.load(os.path.join(directory, f"{prefix}.{name}.npy"), mmap_mode='r' if mmap else None)
+                     for name in cls.FILES))
+
+class CandidateIndex:
+    """IVF indexes of candidate vectors partitioned by gender."""
+
+    def __init__(self, partitions, built_at, max_profile_id):
+        # Gender code -> IVFIndex
+        self.partitions = partitions
+        # Profiles created or saved after the build are missing or stale in the index
+        self.built_at = built_at
+        self.max_profile_id = max_profile_id
+
+    def __len__(self):
+        return sum(len(index) for index in self.partitions.values())
+
+    @classmethod
+    def build(cls, records, vocabularies, nlist=None, seed=0, built_at=None):
+        """
+        Build one partition per gender from encoded profiles.
+
+        Args:
+            records: ProfileFeatures of every candidate (records without a gender are skipped)
+            vocabularies: ProfileVocabularies the records were encoded with
+            nlist: Inverted lists per partition (defaults to sqrt(n))
+            seed: Random seed for centroid training
+            built_at: Time the records were read (defaults to utcnow)
+
+        Returns:
+            CandidateIndex
+        """
+        partitions = {}
+        for gender in range(len(GENDERS)):
+            members = [features for features in records if features.gender == gender]
+            partitions[gender] = IVFIndex.build(
+                [features.user_id for features in members], embed_candidates(members, vocabularies), nlist, seed=seed
+            )
+        profile_ids = [features.profile_id for features in records if features.profile_id is not None]
+        return cls(partitions, built_at or datetime.datetime.utcnow(), max(profile_ids, default=0))
+
+    def search(self, seeker, vocabularies, k=ANN_CANDIDATES, nprobe=ANN_NPROBE, weights=None):
+        """
+        Return the user ids of the candidates most likely to score highest for a seeker.
+
+        Only the opposite gender's partition is searched (every partition
+        when the seeker's gender is unknown).
+
+        Args:
+            seeker: ProfileFeatures of the user looking for matches
+            vocabularies: ProfileVocabularies the seeker was encoded with
+            k: Number of candidates to return
+            nprobe: Inverted lists scanned per partition
+            weights: Dictionary of weights for different compatibility factors
+
+        Returns:
+            List of user ids, best first
+        """
+        query = embed_query(seeker, vocabularies, weights)
+        if seeker.gender == MISSING:
+            genders = list(self.partitions)
+        else:
+            genders = [gender for gender in self.partitions if gender != seeker.gender]
+
+        results = [self.partitions[gender].search(query, k, nprobe) for gender in genders]
+        if not results:
+            return []
+        ids = np.concatenate([ids for ids, _ in results])
+        scores = np.concatenate([scores for _, scores in results])
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [int(user_id) for user_id in ids[order] if user_id != seeker.user_id]
+
+    def save(self, root, keep=ANN_INDEX_KEEP):
+        """
+        Write every partition and a metadata file as a new generation and publish it.
+
+        Args:
+            root: Directory holding the index generations
+            keep: Number of generations retained after publishing
+
+        Returns:
+            Generation number of the new index
+        """
+        os.makedirs(root, exist_ok=True)
+        generation = (current_generation(root) or 0) + 1
+        final = os.path.join(root, _generation_name(generation))
+        staging = final + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        for gender, index in self.partitions.items():
+            index.save(staging, GENDERS[gender].value)
+        with open(os.path.join(staging, "index.json"), "w") as metadata:
+            json.dump({"dim": EMBEDDING_DIM, "partitions": [GENDERS[gender].value for gender in self.partitions],
+                       "built_at": self.built_at.isoformat(), "max_profile_id": self.max_profile_id}, metadata)
+
+        # Publish: the directory rename and the pointer replace are both atomic
+        os.rename(staging, final)
+        pointer = os.path.join(root, "CURRENT.tmp")
+        with open(pointer, "w") as pointer_file:
+            pointer_file.write(_generation_name(generation))
+            pointer_file.flush()
+            os.fsync(pointer_file.fileno())
+        os.replace(pointer, os.path.join(root, "CURRENT"))
+
+        _prune(root, generation, keep)
+        return generation
+
+    @classmethod
+    def load(cls, root, generation=None, mmap=True):
+        """
+        Load an index generation written by save().
+
+        Args:
+            root: Directory holding the index generations
+            generation: Generation to load (defaults to the published one)
+            mmap: Memory-map the arrays instead of reading them
+
+        Returns:
+            CandidateIndex, or None if no index was published or it was
+            built with a different embedding layout or without a build time
+        """
+        generation = generation or current_generation(root)
+        if generation is None:
+            return None
+        directory = os.path.join(root, _generation_name(generation))
+        with open(os.path.join(directory, "index.json")) as metadata:
+            info = json.load(metadata)
+        if info["dim"] != EMBEDDING_DIM:
+            logger.warning("Ignoring candidate index in %s built for %d dimensions", directory, info["dim"])
+            return None
+        if "built_at" not in info:
+            logger.warning("Ignoring candidate index in %s without a build time; rebuild it", directory)
+            return None
+
+        codes = {gender.value: code for code, gender in enumerate(GENDERS)}
+        return cls({codes[name]: IVFIndex.load(directory, name, mmap) for name in info["partitions"]},
+                   datetime.datetime.fromisoformat(info["built_at"]), info["max_profile_id"])
+
+def _generation_name(generation):
+    """Directory name of an index generation."""
+    return f"g{generation:06d}"
+
+def current_generation(root=ANN_INDEX_DIR):
+    """Return the published index generation, or None if no index was built."""
+    try:
+        with open(os.path.join(root, "CURRENT")) as pointer:
+            return int(pointer.read().strip().lstrip("g"))
+    except FileNotFoundError:
+        return None
+
+def _prune(root, generation, keep):
+    """Remove generations older than the retained ones."""
+    oldest = generation - keep + 1
+    for name in os.listdir(root):
+        if name.startswith("g") and name[1:].isdigit() and int(name[1:]) < oldest:
+            # Processes that still map these files keep their pages until they reload
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+# Index used by candidate generation, and the generation it was loaded from
+_candidate_index = None
+_candidate_index_generation = None
+
+def get_candidate_index():
+    """Return the published candidate index, or None if none has been built; reloaded after a rebuild."""
+    global _candidate_index, _candidate_index_generation
+    generation = current_generation(ANN_INDEX_DIR)
+    if generation != _candidate_index_generation:
+        _candidate_index = CandidateIndex.load(ANN_INDEX_DIR, generation) if generation is not None else None
+        _candidate_index_generation = generation
+    return _candidate_index
+
+def build_candidate_index(session, directory=ANN_INDEX_DIR, nlist=None):
+    """
+    Embed every active profile and write a fresh candidate index.
+
+    Args:
+        session: Database session
+        directory: Directory the index generations are written to
+        nlist: Inverted lists per partition
+
+    Returns:
+        CandidateIndex
+    """
+    from sqlalchemy.orm import contains_eager, selectinload
+    from src.models import User, Profile, AccountStatus
+    from src.features import feature_store
+
+    global _candidate_index, _candidate_index_generation
+
+    # Taken before reading, so profiles saved during the build count as newer
+    built_at = datetime.datetime.utcnow()
+    profiles = session.query(Profile).join(User, User.id == Profile.user_id).options(
+        selectinload(Profile.interests), contains_eager(Profile.user).joinedload(User.settings)
+    ).filter(User.account_status == AccountStatus.ACTIVE).all()
+
+    index = CandidateIndex.build(feature_store.get_many(profiles), feature_store.vocabularies, nlist,
+                                 built_at=built_at)
+    generation = index.save(directory)
+    if os.path.abspath(directory) == os.path.abspath(ANN_INDEX_DIR):
+        _candidate_index, _candidate_index_generation = index, generation
+    return index
+
+def main():
+    """Rebuild the candidate index from the command line."""
+    parser = argparse.ArgumentParser(description="Build the approximate nearest-neighbour candidate index.")
+    parser.add_argument("--nlist", type=int, default=None, help="Inverted lists per gender partition")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    from src.database import init_db, get_session
+
+    init_db()
+    session = get_session()
+    try:
+        index = build_candidate_index(session, nlist=args.nlist)
+        logger.info("Indexed %d profiles in %s", len(index), ANN_INDEX_DIR)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Vectorized compatibility scoring for the Traditional Matchmaking Telegram Bot.
+
+Profiles are encoded into NumPy arrays of small integer codes and bitsets so
+that one seeker can be scored against many candidates in a single pass. The
+resulting scores are identical to calling calculate_overall_compatibility
+for every pair.
+"""
+
+import numpy as np
+
+from src.matching import MBTI_SCORES, ZODIAC_SCORES, MBTI_SIZE, ZODIAC_SIZE
+from src.features import (
+    MISSING, LIVING_ARRANGEMENTS, ARRANGEMENT_TABLE, ProfileVocabularies, encode_profile, default_weights
+)
+
+MBTI_MATRIX = np.array(MBTI_SCORES, dtype=np.int64).reshape(MBTI_SIZE, MBTI_SIZE)
+ZODIAC_MATRIX = np.array(ZODIAC_SCORES, dtype=np.int64).reshape(ZODIAC_SIZE, ZODIAC_SIZE)
+ARRANGEMENT_MATRIX = np.array(ARRANGEMENT_TABLE, dtype=np.int64)
+
+def _mask_words(masks, width):
+    """Convert Python integer bitmasks into an (N, width) uint64 array."""
+    words = np.zeros((len(masks), width), dtype=np.uint64)
+    for row, mask in enumerate(masks):
+        column = 0
+        while mask:
+            words[row, column] = mask & 0xFFFFFFFFFFFFFFFF
+            mask >>= 64
+            column += 1
+    return words
+
+def _popcount(words):
+    """Count set bits per row of a uint64 word array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1)
+    return bits.sum(axis=-1, dtype=np.int64)
+
+def _pad_words(words, width):
+    """Pad a word array with zero columns up to the given width."""
+    if words.shape[1] >= width:
+        return words
+    return np.pad(words, ((0, 0), (0, width - words.shape[1])))
+
+def _jaccard(words_a, words_b):
+    """Return overlap and union sizes of two broadcastable bitset arrays."""
+    width = max(words_a.shape[1], words_b.shape[1])
+    words_a = _pad_words(words_a, width)
+    words_b = _pad_words(words_b, width)
+    return _popcount(words_a & words_b), _popcount(words_a | words_b)
+
+class ProfileMatrix:
+    """Column-oriented NumPy encoding of a list of profiles."""
+
+    CODE_COLUMNS = (
+        'religiosity', 'prayer', 'religious_education', 'family_size', 'education',
+        'arrangement', 'personality', 'zodiac', 'gender', 'personal_covering',
+        'partner_covering'
+    )
+    FLAG_COLUMNS = ('has_roles', 'religious_strict', 'covering_strict')
+    MASK_COLUMNS = ('practices', 'interests', 'husband_roles', 'wife_roles')
+    DEALBREAKER_COLUMNS = ('offers', 'accepts')
+
+    def __init__(self, columns, vocabularies):
+        missing = [name for name in self.CODE_COLUMNS + self.FLAG_COLUMNS + self.MASK_COLUMNS +
+                   self.DEALBREAKER_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"Profile columns missing: {', '.join(missing)}")
+        self.vocabularies = vocabularies
+        for name, values in columns.items():
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(self.religiosity)
+
+    @classmethod
+    def from_features(cls, records, vocabularies):
+        """
+        Build column arrays from encoded profile records.
+
+        Args:
+            records: List of ProfileFeatures
+            vocabularies: ProfileVocabularies the records were encoded with
+
+        Returns:
+            ProfileMatrix
+        """
+        columns = {}
+        for name in cls.CODE_COLUMNS:
+            columns[name] = np.array([getattr(record, name) for record in records], dtype=np.int64)
+        for name in cls.FLAG_COLUMNS:
+            columns[name] = np.array([getattr(record, name) for record in records], dtype=bool)
+        for name in cls.DEALBREAKER_COLUMNS:
+            columns[name] = np.array([getattr(record, name) for record in records], dtype=np.int64)
+        for name in cls.MASK_COLUMNS:
+            width = max(1, (len(getattr(vocabularies, name)) + 63) // 64)
+            columns[name] = _mask_words([getattr(record, name) for record in records], width)
+
+        return cls(columns, vocabularies)
+
+    @classmethod
+    def from_profiles(cls, profiles, vocabularies=None):
+        """
+        Encode profiles into column arrays.
+
+        Args:
+            profiles: Iterable of Profile objects
+            vocabularies: ProfileVocabularies to share with other matrices
+
+        Returns:
+            ProfileMatrix
+        """
+        if vocabularies is None:
+            vocabularies = ProfileVocabularies()
+        records = [encode_profile(profile, vocabularies) for profile in profiles]
+        return cls.from_features(records, vocabularies)
+
+    def take(self, indices):
+        """Return a new matrix holding only the selected rows."""
+        columns = {}
+        for name in self.CODE_COLUMNS + self.FLAG_COLUMNS + self.MASK_COLUMNS + self.DEALBREAKER_COLUMNS:
+            columns[name] = getattr(self, name)[indices]
+        return ProfileMatrix(columns, self.vocabularies)
+
+def _difference_score(codes_a, codes_b, step, accumulator, max_accumulator):
+    """Add a max(0, 100 - diff * step) sub-score where both codes are present."""
+    present = (codes_a != MISSING) & (codes_b != MISSING)
+    value = np.maximum(0, 100 - np.abs(codes_a - codes_b) * step)
+    accumulator += np.where(present, value, 0)
+    max_accumulator += np.where(present, 100, 0)
+    return present
+
+def _set_overlap_score(words_a, words_b, accumulator, max_accumulator):
+    """Add a Jaccard overlap sub-score where both sets are non-empty."""
+    overlap, total = _jaccard(words_a, words_b)
+    present = (_popcount(words_a) > 0) & (_popcount(words_b) > 0)
+    value = np.divide(overlap, total, out=np.zeros(overlap.shape), where=present) * 100
+    accumulator += np.where(present, value, 0)
+    max_accumulator += np.where(present, 100, 0)
+
+def _finalize(accumulator, max_accumulator):
+    """Normalize accumulated sub-scores, defaulting to 50 when nothing was compared."""
+    ratio = np.divide(accumulator, max_accumulator, out=np.zeros(accumulator.shape),
+                      where=max_accumulator > 0)
+    return np.where(max_accumulator > 0, ratio * 100, 50.0)
+
+def batch_religious_compatibility(seeker, candidates):
+    """Vectorized calculate_religious_compatibility for one seeker row."""
+    shape = np.broadcast(seeker.religiosity, candidates.religiosity).shape
+    score = np.zeros(shape)
+    max_score = np.zeros(shape)
+
+    _difference_score(seeker.religiosity, candidates.religiosity, 35, score, max_score)
+    _difference_score(seeker.prayer, candidates.prayer, 25, score, max_score)
+    _difference_score(seeker.religious_education, candidates.religious_education, 33, score, max_score)
+    _set_overlap_score(seeker.practices, candidates.practices, score, max_score)
+
+    return _finalize(score, max_score)
+
+def batch_family_values_compatibility(seeker, candidates):
+    """Vectorized calculate_family_values_compatibility for one seeker row."""
+    shape = np.broadcast(seeker.arrangement, candidates.arrangement).shape
+    score = np.zeros(shape)
+    max_score = np.zeros(shape)
+
+    # Living arrangement: identical values always score 100, unknown pairs 50
+    known = len(LIVING_ARRANGEMENTS)
+    present = (seeker.arrangement != MISSING) & (candidates.arrangement != MISSING)
+    lookup = ARRANGEMENT_MATRIX[np.minimum(np.maximum(seeker.arrangement, 0), known),
+                                np.minimum(np.maximum(candidates.arrangement, 0), known)]
+    value = np.where(seeker.arrangement == candidates.arrangement, 100, lookup)
+    score += np.where(present, value, 0)
+    max_score += np.where(present, 100, 0)
+
+    _difference_score(seeker.family_size, candidates.family_size, 33, score, max_score)
+
+    # Role expectations: average of husband and wife role overlap
+    present = seeker.has_roles & candidates.has_roles
+    role_scores = []
+    for name in ('husband_roles', 'wife_roles'):
+        overlap, total = _jaccard(getattr(seeker, name), getattr(candidates, name))
+        ratio = np.divide(overlap, total, out=np.zeros(overlap.shape), where=total > 0)
+        role_scores.append(np.where(total > 0, ratio * 100, 50))
+    value = (role_scores[0] + role_scores[1]) / 2
+    score += np.where(present, value, 0)
+    max_score += np.where(present, 100, 0)
+
+    return _finalize(score, max_score)
+
+def batch_lifestyle_compatibility(seeker, candidates):
+    """Vectorized calculate_lifestyle_compatibility for one seeker row."""
+    shape = np.broadcast(seeker.education, candidates.education).shape
+    score = np.zeros(shape)
+    max_score = np.zeros(shape)
+
+    _difference_score(seeker.education, candidates.education, 25, score, max_score)
+    _set_overlap_score(seeker.interests, candidates.interests, score, max_score)
+
+    return _finalize(score, max_score)
+
+def _pair_lookup(matrix, codes_a, codes_b):
+    """Look up a pair matrix, defaulting to 50 when either code is missing."""
+    present = (codes_a != MISSING) & (codes_b != MISSING)
+    value = matrix[np.maximum(codes_a, 0), np.maximum(codes_b, 0)]
+    return np.where(present, value, 50)
+
+def batch_dealbreakers(seeker, candidates):
+    """
+    Vectorized has_dealbreakers for one seeker row.
+
+    Returns:
+        Boolean array, True where the pair is blocked
+    """
+    return (((seeker.offers & candidates.accepts) != seeker.offers) |
+            ((candidates.offers & seeker.accepts) != candidates.offers))
+
+def batch_overall_compatibility(seeker, candidates, weights=None):
+    """
+    Score one encoded seeker against many encoded candidates.
+
+    Args:
+        seeker: ProfileMatrix holding exactly one row
+        candidates: ProfileMatrix of candidate profiles
+        weights: Dictionary of weights for different compatibility factors
+
+    Returns:
+        NumPy float array of overall compatibility scores (0-100)
+    """
+    # Deal-breakers are checked first so blocked candidates are not scored
+    blocked = batch_dealbreakers(seeker, candidates)
+    if blocked.any():
+        scores = np.zeros(len(candidates))
+        allowed = np.flatnonzero(~blocked)
+        if len(allowed):
+            scores[allowed] = batch_overall_compatibility(seeker, candidates.take(allowed), weights)
+        return scores
+
+    if weights is None:
+        weights = default_weights()
+
+    religious_score = batch_religious_compatibility(seeker, candidates)
+    family_score = batch_family_values_compatibility(seeker, candidates)
+    lifestyle_score = batch_lifestyle_compatibility(seeker, candidates)
+    personality_score = _pair_lookup(MBTI_MATRIX, seeker.personality, candidates.personality)
+    horoscope_score = _pair_lookup(ZODIAC_MATRIX, seeker.zodiac, candidates.zodiac)
+
+    # Same summation order as calculate_overall_compatibility
+    return (
+        religious_score * weights['religious'] +
+        personality_score * weights['personality'] +
+        family_score * weights['family'] +
+        lifestyle_score * weights['lifestyle'] +
+        horoscope_score * weights['horoscope']
+    )
+
+def calculate_batch_compatibility(seeker_profile, candidate_profiles, weights=None):
+    """
+    Calculate overall compatibility between one user and many candidates.
+
+    Args:
+        seeker_profile: Profile of the user looking for matches
+        candidate_profiles: List of candidate profiles
+        weights: Dictionary of weights for different compatibility factors
+
+    Returns:
+        NumPy float array with one score (0-100) per candidate, identical to
+        calculate_overall_compatibility(seeker_profile, candidate)
+    """
+    candidate_profiles = list(candidate_profiles)
+    if not candidate_profiles:
+        return np.zeros(0)
+
+    matrix = ProfileMatrix.from_profiles([seeker_profile] + candidate_profiles)
+    seeker = matrix.take(slice(0, 1))
+    candidates = matrix.take(slice(1, None))
+
+    return batch_overall_compatibility(seeker, candidates, weights)
+
+def calculate_batch_features_compatibility(seeker_features, candidate_features, vocabularies, weights=None):
+    """
+    Calculate overall compatibility between one encoded user and many encoded candidates.
+
+    Args:
+        seeker_features: ProfileFeatures of the user looking for matches
+        candidate_features: List of candidate ProfileFeatures
+        vocabularies: ProfileVocabularies all records were encoded with
+        weights: Dictionary of weights for different compatibility factors
+
+    Returns:
+        NumPy float array with one score (0-100) per candidate
+    """
+    if not candidate_features:
+        return np.zeros(0)
+
+    seeker = ProfileMatrix.from_features([seeker_features], vocabularies)
+    candidates = ProfileMatrix.from_features(candidate_features, vocabularies)
+
+    return batch_overall_compatibility(seeker, candidates, weights)
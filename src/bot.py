@@ -10,19 +10,16 @@ from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
     ConversationHandler, ContextTypes, filters
 )
-from sqlalchemy.orm import Session
 
-from src.config import BOT_TOKEN, DEFAULT_LANGUAGE
-from src.database import init_db, get_session
-from src.models import (
-    User, Profile, Match, Conversation, Message, UserSettings,
-    Gender, ReligiosityLevel, CoveringStyle, MatchStatus
-)
+from src.config import BOT_TOKEN, BOT_WORKERS, DEFAULT_LANGUAGE, WEBHOOK_URL
+from src.database import init_db, run_db
 from src.translations import get_text, load_translations
-from src.matching import (
-    calculate_overall_compatibility, score_personality_test,
-    determine_zodiac_sign
-)
+from src.matching import score_personality_test, determine_zodiac_sign
+from src import repository
+from src.persistence import SQLPersistence
+from src.sender import reply_text, edit_message_text
+from src.notifications import start_delivery, stop_delivery
+from src.keyboards import get_keyboard, LANGUAGE_KEYBOARD
 
 # Enable logging
 logging.basicConfig(
@@ -63,49 +60,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     # Initialize user data
     context.user_data.clear()
     
-    # Check if user exists in database
-    session = get_session()
-    db_user = session.query(User).filter(User.telegram_id == str(user.id)).first()
-    
-    if db_user:
-        # User exists, load their language preference
-        if db_user.settings:
-            context.user_data['language'] = db_user.settings.language_preference
-        else:
-            context.user_data['language'] = DEFAULT_LANGUAGE
-        
-        # Check if user has completed profile
-        if db_user.profile:
-            # User has a profile, go to main menu
-            await send_main_menu(update, context)
-            session.close()
-            return MATCHING
-    else:
-        # New user, create record
-        new_user = User(
-            telegram_id=str(user.id),
-            username=user.username,
-            first_name=user.first_name,
-            language_code=user.language_code or DEFAULT_LANGUAGE
-        )
-        session.add(new_user)
-        session.commit()
-        
-        # Set default language
-        context.user_data['language'] = user.language_code or DEFAULT_LANGUAGE
+    # Load the user's state, registering them if they are new
+    state = await run_db(
+        repository.get_or_create_user,
+        user.id, user.username, user.first_name, user.language_code
+    )
+    context.user_data['language'] = state['language']
     
-    session.close()
+    # Check if user has completed profile
+    if state['has_profile']:
+        # User has a profile, go to main menu
+        await send_main_menu(update, context)
+        return MATCHING
     
     # Ask for language preference
-    keyboard = [
-        [
-            InlineKeyboardButton("English", callback_data="lang_en"),
-            InlineKeyboardButton("العربية", callback_data="lang_ar")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = LANGUAGE_KEYBOARD
     
-    await update.message.reply_text(
+    await reply_text(update.message,
         "Welcome to the Traditional Matchmaking Bot for Saudi Arabia and GCC nationals.\n\n"
         "مرحبًا بك في روبوت التوفيق التقليدي للسعوديين ومواطني دول مجلس التعاون الخليجي.\n\n"
         "Please select your preferred language / يرجى اختيار لغتك المفضلة:",
@@ -124,40 +95,12 @@ async def language_selection(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data['language'] = language
     
     # Update user's language preference in database
-    session = get_session()
-    user = session.query(User).filter(User.telegram_id == str(query.from_user.id)).first()
-    
-    if user:
-        if not user.settings:
-            # Create settings if they don't exist
-            settings = UserSettings(user_id=user.id, language_preference=language)
-            session.add(settings)
-        else:
-            # Update existing settings
-            user.settings.language_preference = language
-        
-        session.commit()
-    
-    session.close()
+    await run_db(repository.save_language_preference, query.from_user.id, language)
     
     # Show terms and conditions
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("accept", lang=language),
-                callback_data="terms_accept"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("decline", lang=language),
-                callback_data="terms_decline"
-            )
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_keyboard("terms", language)
     
-    await query.edit_message_text(
+    await edit_message_text(query,
         get_text("terms_acceptance", lang=language) + "\n\n" +
         "Terms and Conditions: [Link to Terms]\n" +
         "Privacy Policy: [Link to Privacy Policy]",
@@ -174,7 +117,7 @@ async def terms_acceptance(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
     if query.data == "terms_decline":
-        await query.edit_message_text(
+        await edit_message_text(query,
             get_text("thank_you", lang=language) + "\n\n" +
             "You must accept the Terms and Conditions to use this service. "
             "Type /start to try again."
@@ -182,21 +125,9 @@ async def terms_acceptance(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return ConversationHandler.END
     
     # Terms accepted, verify age
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("yes", lang=language),
-                callback_data="age_yes"
-            ),
-            InlineKeyboardButton(
-                get_text("no", lang=language),
-                callback_data="age_no"
-            )
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_keyboard("age", language)
     
-    await query.edit_message_text(
+    await edit_message_text(query,
         get_text("age_verification", lang=language),
         reply_markup=reply_markup
     )
@@ -211,18 +142,18 @@ async def age_verification(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
     if query.data == "age_no":
-        await query.edit_message_text(
+        await edit_message_text(query,
             get_text("under_18_message", lang=language)
         )
         return ConversationHandler.END
     
     # Age verified, start profile setup
-    await query.edit_message_text(
+    await edit_message_text(query,
         get_text("basic_info_prompt", lang=language)
     )
     
     # Ask for name
-    await query.message.reply_text(
+    await reply_text(query.message,
         get_text("name_prompt", lang=language)
     )
     
@@ -248,14 +179,14 @@ async def basic_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         
         if photos.total_count == 0:
             # User doesn't have a profile photo, request one
-            await update.message.reply_text(
+            await reply_text(update.message,
                 "A profile photo is mandatory. Please set a profile photo in your Telegram settings and then continue.\n\n"
                 "في التلغرام الخاص بك وثم استمر. الصورة الشخصية إلزامية. يرجى تعيين صورة شخصية"
             )
             return BASIC_INFO
         
         # Ask for age
-        await update.message.reply_text(
+        await reply_text(update.message,
             get_text("age_prompt", lang=language)
         )
         context.user_data['basic_info_state'] = AGE
@@ -266,7 +197,7 @@ async def basic_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         try:
             age = int(update.message.text)
             if age < 18 or age > 100:
-                await update.message.reply_text(
+                await reply_text(update.message,
                     "Please enter a valid age between 18 and 100."
                 )
                 return BASIC_INFO
@@ -274,21 +205,9 @@ async def basic_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             context.user_data['age'] = age
             
             # Ask for gender
-            keyboard = [
-                [
-                    InlineKeyboardButton(
-                        get_text("male", lang=language),
-                        callback_data="gender_male"
-                    ),
-                    InlineKeyboardButton(
-                        get_text("female", lang=language),
-                        callback_data="gender_female"
-                    )
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = get_keyboard("gender", language)
             
-            await update.message.reply_text(
+            await reply_text(update.message,
                 get_text("gender_prompt", lang=language),
                 reply_markup=reply_markup
             )
@@ -297,7 +216,7 @@ async def basic_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             return BASIC_INFO
             
         except ValueError:
-            await update.message.reply_text(
+            await reply_text(update.message,
                 "Please enter a valid number for your age."
             )
             return BASIC_INFO
@@ -319,7 +238,7 @@ async def gender_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     context.user_data['gender'] = gender
     
     # Ask for nationality
-    await query.edit_message_text(
+    await edit_message_text(query,
         get_text("nationality_prompt", lang=language)
     )
     
@@ -331,76 +250,21 @@ async def save_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     user_id = update.effective_user.id
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
-    session = get_session()
-    user = session.query(User).filter(User.telegram_id == str(user_id)).first()
+    saved = await run_db(repository.save_profile_data, user_id, dict(context.user_data))
     
-    if not user:
+    if not saved:
         # This shouldn't happen, but just in case
-        await update.message.reply_text(
+        await reply_text(update.message,
             "An error occurred. Please restart with /start"
         )
-        session.close()
         return ConversationHandler.END
     
-    # Check if user already has a profile
-    if not user.profile:
-        # Create new profile
-        profile = Profile(
-            user_id=user.id,
-            age=context.user_data.get('age'),
-            gender=Gender.MALE if context.user_data.get('gender') == 'male' else Gender.FEMALE,
-            nationality=context.user_data.get('nationality'),
-            city=context.user_data.get('city'),
-            education_level=context.user_data.get('education'),
-            profession=context.user_data.get('profession'),
-            religiosity_level=ReligiosityLevel(context.user_data.get('religiosity', 'moderate')),
-            prayer_habits=context.user_data.get('prayer_habits'),
-            personal_covering=CoveringStyle(context.user_data.get('covering', 'none')) if context.user_data.get('gender') == 'female' else None,
-            personality_type=context.user_data.get('personality_type'),
-            personality_details=context.user_data.get('personality_details'),
-            birth_date=context.user_data.get('birth_date'),
-            birth_time=context.user_data.get('birth_time'),
-            birth_location=context.user_data.get('birth_location'),
-            zodiac_sign=context.user_data.get('zodiac_sign')
-        )
-        session.add(profile)
-    else:
-        # Update existing profile
-        profile = user.profile
-        profile.age = context.user_data.get('age', profile.age)
-        profile.gender = Gender.MALE if context.user_data.get('gender') == 'male' else Gender.FEMALE
-        profile.nationality = context.user_data.get('nationality', profile.nationality)
-        profile.city = context.user_data.get('city', profile.city)
-        profile.education_level = context.user_data.get('education', profile.education_level)
-        profile.profession = context.user_data.get('profession', profile.profession)
-        
-        if 'religiosity' in context.user_data:
-            profile.religiosity_level = ReligiosityLevel(context.user_data.get('religiosity'))
-        
-        profile.prayer_habits = context.user_data.get('prayer_habits', profile.prayer_habits)
-        
-        if context.user_data.get('gender') == 'female' and 'covering' in context.user_data:
-            profile.personal_covering = CoveringStyle(context.user_data.get('covering'))
-        
-        if 'personality_type' in context.user_data:
-            profile.personality_type = context.user_data.get('personality_type')
-            profile.personality_details = context.user_data.get('personality_details')
-        
-        if 'birth_date' in context.user_data:
-            profile.birth_date = context.user_data.get('birth_date')
-            profile.birth_time = context.user_data.get('birth_time')
-            profile.birth_location = context.user_data.get('birth_location')
-            profile.zodiac_sign = context.user_data.get('zodiac_sign')
-    
-    session.commit()
-    session.close()
-    
     # Clear user data
     context.user_data.clear()
     context.user_data['language'] = language
     
     # Send confirmation and go to main menu
-    await update.message.reply_text(
+    await reply_text(update.message,
         get_text("profile_complete", lang=language)
     )
     
@@ -411,53 +275,15 @@ async def send_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send the main menu."""
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("view_matches", lang=language),
-                callback_data="menu_matches"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("conversations", lang=language),
-                callback_data="menu_conversations"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("profile_setup", lang=language),
-                callback_data="menu_profile"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("family_involvement", lang=language),
-                callback_data="menu_family"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("settings", lang=language),
-                callback_data="menu_settings"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("help", lang=language),
-                callback_data="menu_help"
-            )
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_keyboard("main_menu", language)
     
     if update.message:
-        await update.message.reply_text(
+        await reply_text(update.message,
             get_text("main_menu", lang=language),
             reply_markup=reply_markup
         )
     elif update.callback_query:
-        await update.callback_query.edit_message_text(
+        await edit_message_text(update.callback_query,
             get_text("main_menu", lang=language),
             reply_markup=reply_markup
         )
@@ -482,14 +308,14 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     elif selection == "profile":
         # Go to profile setup
-        await query.edit_message_text(
+        await edit_message_text(query,
             get_text("basic_info_prompt", lang=language)
         )
         return BASIC_INFO
     
     elif selection == "family":
         # Family involvement features
-        await query.edit_message_text(
+        await edit_message_text(query,
             get_text("family_invitation", lang=language)
         )
         return MATCHING
@@ -501,7 +327,7 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     elif selection == "help":
         # Help information
-        await query.edit_message_text(
+        await edit_message_text(query,
             "Help and support information will be displayed here.\n\n"
             "To return to the main menu, use /start"
         )
@@ -515,71 +341,44 @@ async def show_potential_matches(update: Update, context: ContextTypes.DEFAULT_T
     user_id = query.from_user.id
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
-    session = get_session()
-    user = session.query(User).filter(User.telegram_id == str(user_id)).first()
+    # Load the next ranked candidate; the cursor in user_data pages through
+    # the user's slate without rescoring
+    match = await run_db(repository.load_next_match, user_id, context.user_data.get('match_index', 0))
     
-    if not user or not user.profile:
-        await query.edit_message_text(
+    if match['status'] == 'no_profile':
+        await edit_message_text(query,
             "Please complete your profile first."
         )
-        session.close()
         return
     
-    # Find potential matches
-    # This is a simplified version - in a real implementation, you would:
-    # 1. Filter by gender preference
-    # 2. Filter by age range
-    # 3. Filter by other criteria
-    # 4. Calculate compatibility scores
-    # 5. Sort by compatibility
-    
-    # For demo purposes, just get users of opposite gender
-    opposite_gender = Gender.FEMALE if user.profile.gender == Gender.MALE else Gender.MALE
-    
-    potential_matches = session.query(User).join(Profile).filter(
-        Profile.gender == opposite_gender,
-        User.id != user.id
-    ).limit(5).all()
-    
-    if not potential_matches:
-        await query.edit_message_text(
+    if match['status'] == 'no_matches':
+        await edit_message_text(query,
             get_text("No potential matches found at this time. Please check back later.", lang=language) +
             "\n\n" + get_text("Return to main menu with /start", lang=language)
         )
-        session.close()
         return
     
-    # Show the first potential match
-    match_index = context.user_data.get('match_index', 0)
-    if match_index >= len(potential_matches):
-        match_index = 0
-    
-    current_match = potential_matches[match_index]
-    
-    # Calculate compatibility score
-    compatibility_score = calculate_overall_compatibility(user.profile, current_match.profile)
-    
     # Create match display
     match_text = (
         f"{get_text('match_found', lang=language)}\n\n"
-        f"Name: {current_match.first_name}\n"
-        f"Age: {current_match.profile.age}\n"
-        f"Nationality: {current_match.profile.nationality}\n"
-        f"City: {current_match.profile.city}\n"
-        f"Education: {current_match.profile.education_level}\n"
-        f"Profession: {current_match.profile.profession}\n\n"
-        f"{get_text('compatibility_score', lang=language, score=int(compatibility_score))}"
+        f"Name: {match['first_name']}\n"
+        f"Age: {match['age']}\n"
+        f"Nationality: {match['nationality']}\n"
+        f"City: {match['city']}\n"
+        f"Education: {match['education']}\n"
+        f"Profession: {match['profession']}\n\n"
+        f"{get_text('compatibility_score', lang=language, score=int(match['score']))}"
     )
     
     keyboard = [
         [
             InlineKeyboardButton(
                 get_text("interested", lang=language),
-                callback_data=f"match_yes_{current_match.id}"
+                callback_data=f"match_yes_{match['candidate_id']}"
             ),
             InlineKeyboardButton(
                 get_text("not_interested", lang=language),
-                callback_data=f"match_no_{current_match.id}"
+                callback_data=f"match_no_{match['candidate_id']}"
             )
         ],
         [
@@ -591,15 +390,17 @@ async def show_potential_matches(update: Update, context: ContextTypes.DEFAULT_T
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(
+    await edit_message_text(query,
         match_text,
         reply_markup=reply_markup
     )
     
-    # Update match index for next time
-    context.user_data['match_index'] = match_index + 1
-    
-    session.close()
+    # Update match index for next time, and keep the scores shown so a
+    # response stores them without scoring the pair again
+    context.user_data['match_index'] = match['index'] + 1
+    context.user_data['shown_scores'] = {
+        match['candidate_id']: {'score': match['score'], 'sub_scores': match['sub_scores']}
+    }
 
 async def match_response(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle user response to a potential match."""
@@ -612,76 +413,36 @@ async def match_response(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     response, match_id = query.data.split('_')[1:3]
     match_id = int(match_id)
     
-    session = get_session()
-    user = session.query(User).filter(User.telegram_id == str(user_id)).first()
+    shown_scores = context.user_data.get('shown_scores', {})
+    result = await run_db(repository.record_match_response, user_id, response, match_id, shown_scores.get(match_id))
     
-    if not user:
-        await query.edit_message_text(
+    if result['status'] == 'error':
+        await edit_message_text(query,
             "An error occurred. Please restart with /start"
         )
-        session.close()
         return MATCHING
     
-    if response == "yes":
-        # User is interested in the match
-        # Check if there's already a match in the opposite direction
-        existing_match = session.query(Match).filter(
-            Match.sender_id == match_id,
-            Match.receiver_id == user.id,
-            Match.status == MatchStatus.PENDING
-        ).first()
-        
-        if existing_match:
-            # Mutual match! Update status and create conversation
-            existing_match.status = MatchStatus.ACCEPTED
-            
-            # Create a new conversation
-            conversation = Conversation(match_id=existing_match.id)
-            conversation.participants.append(user)
-            conversation.participants.append(existing_match.sender)
-            
-            session.add(conversation)
-            session.commit()
-            
-            # Notify the other user (in a real bot, you would send them a message)
-            
-            # Notify current user
-            match_user = session.query(User).filter(User.id == match_id).first()
-            
-            await query.edit_message_text(
-                get_text("mutual_match", lang=language, name=match_user.first_name) + "\n\n" +
-                get_text("group_created", lang=language, name=match_user.first_name) + "\n\n" +
-                get_text("conversation_starters", lang=language) + "\n" +
-                "1. " + get_text("topic_1", lang=language) + "\n" +
-                "2. " + get_text("topic_2", lang=language) + "\n" +
-                "3. " + get_text("topic_3", lang=language) + "\n" +
-                "4. " + get_text("topic_4", lang=language)
-            )
-            
-            session.close()
-            return CONVERSATION
-        else:
-            # Create a new match
-            new_match = Match(
-                sender_id=user.id,
-                receiver_id=match_id,
-                status=MatchStatus.PENDING,
-                compatibility_score=75  # This would be calculated properly in a real implementation
-            )
-            
-            session.add(new_match)
-            session.commit()
-            
-            # Show next match
-            await show_potential_matches(update, context)
-    else:
-        # User is not interested
-        # In a real implementation, you might want to record this to avoid showing the same match again
+    if match_id in shown_scores:
+        # The answered candidate left the ranking, so the next one moved up
+        context.user_data['match_index'] = max(context.user_data.get('match_index', 1) - 1, 0)
+    
+    if result['status'] == 'mutual':
+        # The other user is notified from the outbox
         
-        # Show next match
-        await show_potential_matches(update, context)
+        # Notify current user
+        await edit_message_text(query,
+            get_text("mutual_match", lang=language, name=result['name']) + "\n\n" +
+            get_text("group_created", lang=language, name=result['name']) + "\n\n" +
+            get_text("conversation_starters", lang=language) + "\n" +
+            "1. " + get_text("topic_1", lang=language) + "\n" +
+            "2. " + get_text("topic_2", lang=language) + "\n" +
+            "3. " + get_text("topic_3", lang=language) + "\n" +
+            "4. " + get_text("topic_4", lang=language)
+        )
+        return CONVERSATION
     
-    session.close()
+    # Show next match
+    await show_potential_matches(update, context)
     return MATCHING
 
 async def show_conversations(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -690,41 +451,32 @@ async def show_conversations(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = query.from_user.id
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
-    session = get_session()
-    user = session.query(User).filter(User.telegram_id == str(user_id)).first()
+    # Get user's conversations
+    conversations = await run_db(repository.load_conversations, user_id)
     
-    if not user:
-        await query.edit_message_text(
+    if conversations is None:
+        await edit_message_text(query,
             "An error occurred. Please restart with /start"
         )
-        session.close()
         return
     
-    # Get user's conversations
-    conversations = user.conversations
-    
     if not conversations:
-        await query.edit_message_text(
+        await edit_message_text(query,
             "You don't have any active conversations yet.\n\n"
             "Return to main menu with /start"
         )
-        session.close()
         return
     
     # Create list of conversations
     keyboard = []
     
-    for conversation in conversations:
-        # Find the other participant
-        other_participant = next((p for p in conversation.participants if p.id != user.id), None)
-        
-        if other_participant:
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"Chat with {other_participant.first_name}",
-                    callback_data=f"conv_{conversation.id}"
-                )
-            ])
+    for conversation_id, other_name in conversations:
+        keyboard.append([
+            InlineKeyboardButton(
+                f"Chat with {other_name}",
+                callback_data=f"conv_{conversation_id}"
+            )
+        ])
     
     keyboard.append([
         InlineKeyboardButton(
@@ -735,47 +487,19 @@ async def show_conversations(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(
+    await edit_message_text(query,
         get_text("conversations", lang=language),
         reply_markup=reply_markup
     )
-    
-    session.close()
 
 async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show settings menu."""
     query = update.callback_query
     language = context.user_data.get('language', DEFAULT_LANGUAGE)
     
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                "Change Language",
-                callback_data="settings_language"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                "Privacy Settings",
-                callback_data="settings_privacy"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                "Matching Preferences",
-                callback_data="settings_matching"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                "Return to Main Menu",
-                callback_data="return_main"
-            )
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_keyboard("settings", language)
     
-    await query.edit_message_text(
+    await edit_message_text(query,
         get_text("settings", lang=language),
         reply_markup=reply_markup
     )
@@ -793,22 +517,32 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.message.from_user
     logger.info("User %s canceled the conversation.", user.first_name)
     
-    await update.message.reply_text(
+    await reply_text(update.message,
         "Conversation ended. Type /start to begin again."
     )
     
     return ConversationHandler.END
 
-def main() -> None:
-    """Run the bot."""
-    # Initialize database
-    init_db()
-    
-    # Load translations
-    load_translations()
-    
-    # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+def build_application(persistence=None, updater=True) -> Application:
+    """
+    Create the Application with every handler registered.
+    
+    Args:
+        persistence: Optional persistence backend; conversation states are
+            stored in it when given
+        updater: Whether the application fetches its own updates (worker
+            processes are fed updates by the ingress process instead)
+    
+    Returns:
+        Application
+    """
+    # Notifications to other users are sent from the outbox in the background
+    builder = Application.builder().token(BOT_TOKEN).post_init(start_delivery).post_stop(stop_delivery)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    if not updater:
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Add conversation handler
     conv_handler = ConversationHandler(
@@ -850,13 +584,36 @@ def main() -> None:
                 CallbackQueryHandler(return_to_main_menu, pattern=r"^return_main$")
             ]
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="main",
+        persistent=persistence is not None
     )
     
     application.add_handler(conv_handler)
+    return application
+
+def main() -> None:
+    """Run the bot."""
+    if WEBHOOK_URL:
+        # Telegram pushes updates to a local ASGI server
+        from src.webhook import run_webhook
+        run_webhook()
+        return
+    
+    if BOT_WORKERS > 1:
+        # One ingress process feeding sharded worker processes
+        from src.workers import run_workers
+        run_workers(BOT_WORKERS)
+        return
+    
+    # Initialize database
+    init_db()
+    
+    # Load translations
+    load_translations()
     
-    # Start the Bot
-    application.run_polling()
+    # Start the Bot; conversation state survives restarts
+    build_application(persistence=SQLPersistence()).run_polling()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,210 @@
+"""
+Candidate generation for the Traditional Matchmaking Telegram Bot.
+
+Hard constraints (gender, account status, age range, nationality preferences,
+previous match decisions, recently seen or declined candidates and
+expressible deal-breakers) are pushed into SQL so
+that only a small, eligible candidate set reaches the Python scoring stage.
+When a nearest-neighbour index has been built (see src/ann.py), the query is
+further restricted to the candidates it ranks highest and the profiles
+created or saved since it was built. If too few of them pass the
+constraints, every eligible user is considered instead.
+"""
+
+import datetime
+
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import aliased, contains_eager
+
+from src.config import MAX_CANDIDATE_POOL, ANN_CANDIDATES, ANN_OVERFETCH
+from src.ann import get_candidate_index
+from src.features import feature_store
+from src.models import (
+    User, Profile, Match, UserSettings, SeenPair,
+    Gender, ReligiosityLevel, AccountStatus, MatchStatus
+)
+
+# Religiosity levels more than one step apart (see has_dealbreakers)
+OPPOSITE_RELIGIOSITY = {
+    ReligiosityLevel.CONSERVATIVE: ReligiosityLevel.PROGRESSIVE,
+    ReligiosityLevel.PROGRESSIVE: ReligiosityLevel.CONSERVATIVE
+}
+
+def _is_strict(importance):
+    """Check whether an importance setting (1-5 scale) makes a factor a deal-breaker."""
+    return importance is not None and importance > 4
+
+def build_candidate_query(session, user, limit=None, candidate_filter=None):
+    """
+    Build a query for the users eligible to be shown to a user as matches.
+
+    Args:
+        session: Database session
+        user: User looking for matches (must have a profile)
+        limit: Maximum number of candidates to return (lowest user ids
+            first), or None for no limit
+        candidate_filter: Optional condition on User and Profile the
+            candidates are restricted to
+
+    Returns:
+        SQLAlchemy query over User, with each candidate's profile and
+        interests loaded for scoring
+    """
+    profile = user.profile
+    settings = user.settings
+    candidate_settings = aliased(UserSettings)
+
+    opposite_gender = Gender.FEMALE if profile.gender == Gender.MALE else Gender.MALE
+
+    query = session.query(User).join(Profile, Profile.user_id == User.id).outerjoin(
+        candidate_settings, candidate_settings.user_id == User.id
+    ).options(
+        # Scoring reads every candidate's profile, interests and settings
+        contains_eager(User.profile).selectinload(Profile.interests),
+        contains_eager(User.settings.of_type(candidate_settings))
+    ).filter(
+        User.id != user.id,
+        User.account_status == AccountStatus.ACTIVE,
+        Profile.gender == opposite_gender
+    )
+
+    if candidate_filter is not None:
+        query = query.filter(candidate_filter)
+
+    # The user's own matching preferences
+    if settings:
+        if settings.age_range_min is not None:
+            query = query.filter(Profile.age >= settings.age_range_min)
+        if settings.age_range_max is not None:
+            query = query.filter(Profile.age <= settings.age_range_max)
+        if settings.preferred_nationalities:
+            query = query.filter(Profile.nationality.in_(settings.preferred_nationalities))
+
+    # The candidate's matching preferences must accept the user as well
+    if profile.age is not None:
+        query = query.filter(
+            or_(candidate_settings.age_range_min.is_(None), candidate_settings.age_range_min <= profile.age),
+            or_(candidate_settings.age_range_max.is_(None), candidate_settings.age_range_max >= profile.age)
+        )
+
+    # Skip anyone the user already responded to, and anyone who already
+    # rejected or matched with the user
+    query = query.filter(
+        ~exists().where(and_(Match.sender_id == user.id, Match.receiver_id == User.id)),
+        ~exists().where(and_(
+            Match.sender_id == User.id,
+            Match.receiver_id == user.id,
+            Match.status.in_([MatchStatus.REJECTED, MatchStatus.ACCEPTED])
+        ))
+    )
+
+    # Skip candidates offered to or declined by the user recently, and anyone
+    # who recently declined the user (see src/seen_pairs.py)
+    now = datetime.datetime.utcnow()
+    query = query.filter(
+        ~exists().where(and_(
+            SeenPair.user_id == user.id, SeenPair.candidate_id == User.id, SeenPair.expires_at > now
+        )),
+        ~exists().where(and_(
+            SeenPair.user_id == User.id, SeenPair.candidate_id == user.id,
+            SeenPair.rejected.is_(True), SeenPair.expires_at > now
+        ))
+    )
+
+    # Religious level deal-breaker
+    opposite_level = OPPOSITE_RELIGIOSITY.get(profile.religiosity_level)
+    if opposite_level is not None:
+        level_compatible = or_(Profile.religiosity_level.is_(None), Profile.religiosity_level != opposite_level)
+        if settings and settings.religious_dealbreaker:
+            query = query.filter(level_compatible)
+        else:
+            query = query.filter(or_(level_compatible, candidate_settings.religious_dealbreaker.isnot(True)))
+
+    # Covering preference deal-breakers
+    if profile.partner_covering_preference and _is_strict(profile.covering_importance):
+        query = query.filter(or_(
+            Profile.personal_covering.is_(None),
+            Profile.personal_covering == profile.partner_covering_preference
+        ))
+    if profile.personal_covering:
+        query = query.filter(or_(
+            Profile.partner_covering_preference.is_(None),
+            Profile.covering_importance.is_(None),
+            Profile.covering_importance <= 4,
+            Profile.partner_covering_preference == profile.personal_covering
+        ))
+
+    if limit is not None:
+        # A deterministic cut, whatever order the engine scans in
+        query = query.order_by(User.id).limit(limit)
+
+    return query
+
+def find_candidates(session, user, limit=MAX_CANDIDATE_POOL):
+    """
+    Return the users that pass every hard constraint for a user.
+
+    If a candidate index exists, only the users it retrieves for the user's
+    profile and those saved since it was built are considered, unless fewer
+    than ANN_CANDIDATES of them pass; otherwise every eligible user is.
+
+    Args:
+        session: Database session
+        user: User looking for matches (must have a profile)
+        limit: Maximum number of the index's candidates to return, or None
+            for no limit; without an index every eligible user is returned
+
+    Returns:
+        List of User objects
+    """
+    index_filter = _index_filter(user)
+    if index_filter is not None:
+        candidates = build_candidate_query(session, user, limit, index_filter).all()
+        if _enough_candidates(candidates, limit):
+            return candidates
+    return build_candidate_query(session, user).all()
+
+def find_candidate_ids(session, user, limit=MAX_CANDIDATE_POOL):
+    """
+    Return the ids of the users that pass every hard constraint for a user.
+
+    Like find_candidates, without loading the candidates' rows.
+
+    Args:
+        session: Database session
+        user: User looking for matches (must have a profile)
+        limit: Maximum number of the index's candidates to return, or None
+            for no limit; without an index every eligible user is returned
+
+    Returns:
+        List of user ids
+    """
+    index_filter = _index_filter(user)
+    if index_filter is not None:
+        query = build_candidate_query(session, user, limit, index_filter)
+        candidate_ids = [row.id for row in query.with_entities(User.id)]
+        if _enough_candidates(candidate_ids, limit):
+            return candidate_ids
+    query = build_candidate_query(session, user)
+    return [row.id for row in query.with_entities(User.id)]
+
+def _index_filter(user):
+    """
+    Condition keeping the users the candidate index retrieves for a user and
+    the profiles it does not know yet, or None without an index.
+    """
+    index = get_candidate_index()
+    if index is None:
+        return None
+    # Over-fetched, as the constraints drop part of the results
+    candidate_ids = index.search(feature_store.get(user.profile), feature_store.vocabularies,
+                                 ANN_CANDIDATES * ANN_OVERFETCH)
+    return or_(
+        User.id.in_(candidate_ids),
+        Profile.id > index.max_profile_id,
+        Profile.updated_at > index.built_at
+    )
+
+def _enough_candidates(candidates, limit):
+    """Whether the index left enough eligible candidates to skip the full query."""
+    return len(candidates) >= min(ANN_CANDIDATES, limit if limit is not None else ANN_CANDIDATES)
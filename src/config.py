@@ -11,6 +11,46 @@ BOT_TOKEN = os.environ.get("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")  # Replace with a
 # Database Configuration
 DB_PATH = Path(__file__).parent.parent / "data" / "matchmaking.db"
 DB_URI = f"sqlite:///{DB_PATH}"
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", 8))  # Threads running blocking queries
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", DB_EXECUTOR_WORKERS))  # Connections kept open
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 4))  # Extra connections allowed under burst
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"  # Check connections before use
+
+# SQLite Tuning (applied on every new connection)
+SQLITE_JOURNAL_MODE = "WAL"  # Readers no longer block the writer
+SQLITE_SYNCHRONOUS = "NORMAL"  # Safe with WAL, avoids an fsync per commit
+SQLITE_CACHE_SIZE_KB = 65536  # Page cache per connection
+SQLITE_MMAP_SIZE = 268435456  # Bytes of the database file memory-mapped for reads
+SQLITE_BUSY_TIMEOUT_MS = 30000  # Wait for the write lock instead of failing with "database is locked"
+
+# Worker Mode
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 1))  # Worker processes; more than 1 shards updates by user
+WORKER_QUEUE_SIZE = int(os.environ.get("WORKER_QUEUE_SIZE", 1000))  # Updates buffered per worker
+PERSISTENCE_UPDATE_INTERVAL = 5  # Seconds between conversation state writes
+PERSISTENCE_FLUSH_DELAY = 0.5  # Seconds changed state is buffered so it is written in one batch
+
+# Webhook Mode
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")  # Public HTTPS URL; setting it enables webhook mode
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")  # Path updates are POSTed to
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")  # Secret token header value (random when unset)
+WEBHOOK_QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", 1000))  # Updates buffered before requests wait
+WEBHOOK_CONCURRENCY = int(os.environ.get("WEBHOOK_CONCURRENCY", 8))  # Updates processed at the same time
+WEBHOOK_ENQUEUE_TIMEOUT = 5  # Seconds a request waits for queue room before a 503
+
+# Outbound Messages
+SEND_RATE = 30  # Messages per second across all chats (Telegram's broadcast limit)
+SEND_CHAT_RATE = 1  # Messages per second to one chat
+SEND_CHAT_BURST = 3  # Messages to one chat sent at once before SEND_CHAT_RATE applies
+SEND_MAX_RETRIES = 3  # Flood control errors tolerated per message before it fails
+OUTBOX_BATCH_SIZE = 100  # Notification events claimed per delivery batch
+OUTBOX_POLL_INTERVAL = 2  # Seconds between outbox polls when it is empty
+OUTBOX_LEASE_SECONDS = 60  # Seconds a claimed batch is reserved before another worker may take it
+OUTBOX_RETRY_SECONDS = 30  # Delay before the first redelivery, doubled per failed attempt
+OUTBOX_MAX_ATTEMPTS = 5  # Failed deliveries before an event is given up
 
 # Feature Flags
 ENABLE_PERSONALITY_TEST = True
@@ -28,7 +68,19 @@ HOROSCOPE_COMPATIBILITY_WEIGHT = 0.10
 # User Interface Settings
 DEFAULT_LANGUAGE = "en"  # 'en' for English, 'ar' for Arabic
 MAX_DAILY_MATCHES = 5
+MAX_CANDIDATE_POOL = 1000  # Candidates fetched per ranking when the candidate index restricts the query
+MATCH_CACHE_SIZE = 100  # Ranked candidates kept per user
+MATCH_CACHE_TTL_HOURS = 24  # Age after which a user's ranking is rebuilt
+SEEN_PAIR_TTL_DAYS = 14  # Days before a candidate offered in a daily slate may be offered again
+REJECTED_PAIR_TTL_DAYS = 90  # Days before a declined candidate may be offered again
+ANN_CANDIDATES = 300  # Eligible candidates wanted from the nearest-neighbour index per ranking
+ANN_OVERFETCH = 3  # Index results retrieved per wanted candidate, as the SQL filters drop some
+ANN_NPROBE = 64  # Inverted lists scanned per nearest-neighbour search
+SCORE_CACHE_SIZE = 200000  # Pair scores kept in memory per process
+SCORE_CACHE_SHARED = os.environ.get("SCORE_CACHE_SHARED", "0") == "1"  # Share pair scores through the database
 MAX_ACTIVE_CONVERSATIONS = 10
+USER_CACHE_SIZE = 100000  # Users whose id, language and profile state are kept in memory
+USER_CACHE_TTL = 300  # Seconds before a cached user state is reloaded
 
 # Security Settings
 PROFILE_PHOTO_ENCRYPTION = True
@@ -43,3 +95,7 @@ MODERATION_REVIEW_THRESHOLD = 2  # Number of reports before admin review
 # Path Settings
 TRANSLATION_PATH = Path(__file__).parent / "translations"
 RESOURCES_PATH = Path(__file__).parent / "resources"
+ANN_INDEX_DIR = Path(__file__).parent.parent / "data" / "ann"  # Built with `python -m src.ann`
+ANN_INDEX_KEEP = 2  # Index generations retained after publishing a new one
+SNAPSHOT_DIR = Path(__file__).parent.parent / "data" / "snapshots"  # Exported with `python -m src.snapshot`
+SNAPSHOT_KEEP = 2  # Snapshot versions retained after publishing a new one
@@ -3,31 +3,115 @@ Database initialization and connection management for the Traditional Matchmakin
 """
 
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.ext.declarative import declarative_base
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
-from src.config import DB_URI
+from src.config import (
+    DB_URI, DB_EXECUTOR_WORKERS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS,
+    SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT_MS
+)
 from src.models import Base
+from src.migrations import migrate
 
 # Create directory for database if it doesn't exist
 os.makedirs(os.path.dirname(DB_URI.replace('sqlite:///', '')), exist_ok=True)
 
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """
+    Tune a new SQLite connection for concurrent readers and a single writer.
+
+    WAL lets readers proceed while a write is in progress, busy_timeout makes
+    writers wait for the lock instead of raising "database is locked", and the
+    cache and mmap sizes keep hot pages in memory.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def create_db_engine(db_uri=DB_URI):
+    """
+    Create an engine with a bounded connection pool.
+
+    File-based SQLite databases get a QueuePool shared across threads and the
+    pragmas of apply_sqlite_pragmas on every connect. In-memory SQLite uses a
+    single static connection, since each new connection would be a new database.
+
+    Args:
+        db_uri: Database URI
+
+    Returns:
+        SQLAlchemy Engine
+    """
+    url = make_url(db_uri)
+
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING
+        )
+
+    if url.database in (None, "", ":memory:"):
+        return create_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    )
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
 # Create database engine
-engine = create_engine(DB_URI)
+engine = create_db_engine(DB_URI)
 
-# Create session factory
+# Create session factory. Sessions are not thread- or task-scoped: each unit
+# of work opens its own session and closes it, returning the connection to the pool.
 session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory)
+
+# Bounded pool of threads that run blocking database work for async handlers
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
 
 def init_db():
-    """Initialize the database by creating all tables."""
-    Base.metadata.create_all(engine)
+    """Initialize the database by creating all tables and missing indexes."""
+    migrate(engine)
 
 def get_session():
     """Get a new database session."""
-    return Session()
+    return session_factory()
 
 def close_session(session):
     """Close a database session."""
     session.close()
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking database function without blocking the event loop.
+
+    Args:
+        func: Function that opens, uses and closes its own session
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,478 @@
+"""
+Compact profile feature store for the Traditional Matchmaking Telegram Bot.
+
+Each Profile is encoded once, when it is saved, into a ProfileFeatures record
+holding small integer codes and integer bitmasks. Matching code scores these
+records instead of live ORM objects, so ranking never triggers lazy loads or
+re-derives numeric values from strings.
+"""
+
+from src.models import CoveringStyle, Gender
+from src.matching import (
+    MBTI_SCORES, ZODIAC_SCORES, MBTI_SIZE, ZODIAC_SIZE,
+    LIVING_ARRANGEMENT_COMPATIBILITY, personality_code, zodiac_code, religiosity_level_value,
+    prayer_habits_value, religious_education_value, family_size_value, education_level_value
+)
+
+# Code used for a missing (falsy) profile field
+MISSING = -1
+
+COVERING_STYLES = list(CoveringStyle)
+GENDERS = list(Gender)
+
+# Known living arrangements get the first codes; anything else is appended
+LIVING_ARRANGEMENTS = sorted({pair[0] for pair in LIVING_ARRANGEMENT_COMPATIBILITY} |
+                             {pair[1] for pair in LIVING_ARRANGEMENT_COMPATIBILITY})
+
+def _build_arrangement_table():
+    """Build the living arrangement table with an extra row/column for unknown values."""
+    size = len(LIVING_ARRANGEMENTS)
+    rows = [[50] * (size + 1) for _ in range(size + 1)]
+    for (arrangement_a, arrangement_b), value in LIVING_ARRANGEMENT_COMPATIBILITY.items():
+        i = LIVING_ARRANGEMENTS.index(arrangement_a)
+        j = LIVING_ARRANGEMENTS.index(arrangement_b)
+        # Scalar lookup tries the pair first and then its reverse
+        rows[i][j] = value
+        if (arrangement_b, arrangement_a) not in LIVING_ARRANGEMENT_COMPATIBILITY:
+            rows[j][i] = value
+    return rows
+
+ARRANGEMENT_TABLE = _build_arrangement_table()
+
+class FeatureVocabulary:
+    """Assigns stable bit positions (or codes) to set-valued profile features."""
+
+    def __init__(self, tokens=()):
+        self.positions = {}
+        self._tokens = []
+        for token in tokens:
+            self.code(token)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def code(self, token):
+        """Return the code for a token, assigning the next free one if needed."""
+        position = self.positions.get(token)
+        if position is None:
+            position = len(self.positions)
+            self.positions[token] = position
+            self._tokens.append(token)
+        return position
+
+    def mask(self, tokens):
+        """Return an integer bitmask with one bit set per distinct token."""
+        mask = 0
+        for token in tokens:
+            mask |= 1 << self.code(token)
+        return mask
+
+    def token(self, code):
+        """Return the token a code was assigned to."""
+        return self._tokens[code]
+
+    def tokens(self, mask):
+        """Return the tokens whose bits are set in a mask."""
+        tokens = []
+        while mask:
+            low_bit = mask & -mask
+            tokens.append(self.token(low_bit.bit_length() - 1))
+            mask ^= low_bit
+        return tokens
+
+class ProfileVocabularies:
+    """Vocabularies shared by every record that is scored together."""
+
+    def __init__(self):
+        self.practices = FeatureVocabulary()
+        self.interests = FeatureVocabulary()
+        self.husband_roles = FeatureVocabulary()
+        self.wife_roles = FeatureVocabulary()
+        self.arrangements = FeatureVocabulary(LIVING_ARRANGEMENTS)
+
+class ProfileFeatures:
+    """Encoded matching features of a single profile."""
+
+    __slots__ = (
+        'profile_id', 'user_id', 'version',
+        # Digest of the user's settings the record depends on (settings carry no version)
+        'settings_digest',
+        # Small integer codes (MISSING when the field is empty)
+        'religiosity', 'prayer', 'religious_education', 'family_size', 'education',
+        'arrangement', 'personality', 'zodiac', 'gender', 'personal_covering',
+        'partner_covering',
+        # Flags
+        'has_roles', 'religious_strict', 'covering_strict',
+        # Deal-breaker bitmasks (see dealbreaker_masks)
+        'offers', 'accepts',
+        # Integer bitmasks
+        'practices', 'interests', 'husband_roles', 'wife_roles'
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def __repr__(self):
+        return f"<ProfileFeatures(profile_id={self.profile_id}, user_id={self.user_id})>"
+
+def _enum_code(value, members):
+    """Return the index of an enum value (or its string value) in members."""
+    if not value:
+        return MISSING
+    for index, member in enumerate(members):
+        if value is member or value == member.value:
+            return index
+    return MISSING
+
+def _profile_settings(profile):
+    """UserSettings of a profile's user (kept on User; plain test objects carry their own)."""
+    if hasattr(profile, 'user'):
+        return profile.user.settings if profile.user is not None else None
+    return getattr(profile, 'settings', None)
+
+def _religious_strict(profile):
+    """Whether the profile's user opted into religious compatibility as a deal-breaker."""
+    return getattr(_profile_settings(profile), 'religious_dealbreaker', None) is True
+
+def _settings_digest(profile):
+    """Small integer identifying the settings values encode_profile reads."""
+    return int(_religious_strict(profile))
+
+def _covering_strict(profile):
+    """Whether the profile treats covering preference as a deal-breaker."""
+    importance = getattr(profile, 'covering_importance', None)
+    return isinstance(importance, int) and importance > 4
+
+# Deal-breaker bits. A profile "offers" the traits another profile may object
+# to and "accepts" the traits it tolerates; a pair is blocked unless each
+# profile accepts everything the other offers.
+RELIGIOSITY_LEVELS = 3
+RELIGIOSITY_BIT = 0  # Religiosity level of a profile that is not strict about it
+STRICT_RELIGIOSITY_BIT = RELIGIOSITY_BIT + RELIGIOSITY_LEVELS  # ... of a strict profile
+COVERING_BIT = STRICT_RELIGIOSITY_BIT + RELIGIOSITY_LEVELS  # Covering style, per gender (or missing gender)
+ACCEPT_ALL = (1 << (COVERING_BIT + (len(GENDERS) + 1) * len(COVERING_STYLES))) - 1
+
+def dealbreaker_masks(religiosity, religious_strict, gender, personal_covering, partner_covering, covering_strict):
+    """
+    Compute a profile's deal-breaker masks from its encoded fields.
+
+    Religiosity levels more than one step apart block a pair if either
+    profile is strict about it; a strict covering preference blocks other
+    covering styles of a profile of a different gender.
+
+    Returns:
+        Tuple of (offers, accepts) bitmasks
+    """
+    offers = 0
+    accepts = ACCEPT_ALL
+
+    if religiosity != MISSING:
+        offers |= 1 << ((STRICT_RELIGIOSITY_BIT if religious_strict else RELIGIOSITY_BIT) + religiosity)
+        for level in range(RELIGIOSITY_LEVELS):
+            if abs(level - religiosity) > 1:
+                accepts &= ~(1 << (STRICT_RELIGIOSITY_BIT + level))
+                if religious_strict:
+                    accepts &= ~(1 << (RELIGIOSITY_BIT + level))
+
+    # A missing gender is its own slot, different from both genders
+    slot = gender if gender != MISSING else len(GENDERS)
+    if personal_covering != MISSING:
+        offers |= 1 << (COVERING_BIT + slot * len(COVERING_STYLES) + personal_covering)
+    if covering_strict and partner_covering != MISSING:
+        for other_slot in range(len(GENDERS) + 1):
+            if other_slot == slot:
+                continue
+            for style in range(len(COVERING_STYLES)):
+                if style != partner_covering:
+                    accepts &= ~(1 << (COVERING_BIT + other_slot * len(COVERING_STYLES) + style))
+
+    return offers, accepts
+
+def profile_dealbreaker_masks(profile):
+    """Deal-breaker masks of an unencoded Profile, as stored by encode_profile."""
+    return dealbreaker_masks(
+        religiosity_level_value(profile.religiosity_level) if profile.religiosity_level else MISSING,
+        _religious_strict(profile),
+        _enum_code(profile.gender, GENDERS),
+        _enum_code(getattr(profile, 'personal_covering', None), COVERING_STYLES),
+        _enum_code(getattr(profile, 'partner_covering_preference', None), COVERING_STYLES),
+        _covering_strict(profile)
+    )
+
+def encode_profile(profile, vocabularies):
+    """
+    Encode a profile into a ProfileFeatures record.
+
+    Args:
+        profile: Profile to encode
+        vocabularies: ProfileVocabularies used for set-valued fields
+
+    Returns:
+        ProfileFeatures record
+    """
+    role_expectations = profile.role_expectations
+    has_roles = bool(role_expectations and 'husband_role' in role_expectations and
+                     'wife_role' in role_expectations)
+
+    # Invalid MBTI types and zodiac signs raise ValueError, as in the scalar path
+    record = ProfileFeatures(
+        profile_id=getattr(profile, 'id', None),
+        user_id=getattr(profile, 'user_id', None),
+        version=getattr(profile, 'version', None) or 0,
+        settings_digest=_settings_digest(profile),
+        religiosity=religiosity_level_value(profile.religiosity_level) if profile.religiosity_level else MISSING,
+        prayer=prayer_habits_value(profile.prayer_habits) if profile.prayer_habits else MISSING,
+        religious_education=(religious_education_value(profile.religious_education)
+                             if profile.religious_education else MISSING),
+        family_size=family_size_value(profile.family_size) if profile.family_size else MISSING,
+        education=education_level_value(profile.education_level) if profile.education_level else MISSING,
+        arrangement=(vocabularies.arrangements.code(profile.living_arrangement)
+                     if profile.living_arrangement else MISSING),
+        personality=personality_code(profile.personality_type) if profile.personality_type else MISSING,
+        zodiac=zodiac_code(profile.zodiac_sign) if profile.zodiac_sign else MISSING,
+        gender=_enum_code(profile.gender, GENDERS),
+        personal_covering=_enum_code(getattr(profile, 'personal_covering', None), COVERING_STYLES),
+        partner_covering=_enum_code(getattr(profile, 'partner_covering_preference', None), COVERING_STYLES),
+        has_roles=has_roles,
+        religious_strict=_religious_strict(profile),
+        covering_strict=_covering_strict(profile),
+        practices=vocabularies.practices.mask(profile.religious_practices or ()),
+        interests=vocabularies.interests.mask(interest.id for interest in (profile.interests or ())),
+        husband_roles=vocabularies.husband_roles.mask(role_expectations['husband_role']) if has_roles else 0,
+        wife_roles=vocabularies.wife_roles.mask(role_expectations['wife_role']) if has_roles else 0
+    )
+    record.offers, record.accepts = dealbreaker_masks(
+        record.religiosity, record.religious_strict, record.gender,
+        record.personal_covering, record.partner_covering, record.covering_strict
+    )
+    return record
+
+class ProfileFeatureStore:
+    """In-process store of encoded profiles keyed by profile id."""
+
+    def __init__(self, vocabularies=None):
+        self.vocabularies = vocabularies or ProfileVocabularies()
+        self._records = {}
+        # Profile id of each user with a stored record
+        self._user_profiles = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, profile_id):
+        return profile_id in self._records
+
+    def update(self, profile):
+        """Encode a profile and replace its stored record."""
+        record = encode_profile(profile, self.vocabularies)
+        if record.profile_id is not None:
+            self._records[record.profile_id] = record
+            if record.user_id is not None:
+                self._user_profiles[record.user_id] = record.profile_id
+        return record
+
+    def get(self, profile):
+        """
+        Return the stored record for a profile, encoding it on first use.
+
+        A record of an older profile version (saved through another worker
+        or session) or of different settings is encoded again.
+        """
+        record = self._records.get(getattr(profile, 'id', None))
+        version = getattr(profile, 'version', None)
+        if (record is None or (version is not None and version != record.version) or
+                _settings_digest(profile) != record.settings_digest):
+            record = self.update(profile)
+        return record
+
+    def get_many(self, profiles):
+        """Return records for a list of profiles, in order."""
+        return [self.get(profile) for profile in profiles]
+
+    def find_user(self, user_id):
+        """Return the stored record of a user's profile, or None if it was never encoded."""
+        return self._records.get(self._user_profiles.get(user_id))
+
+    def discard(self, profile_id):
+        """Remove a profile's record from the store."""
+        record = self._records.pop(profile_id, None)
+        if record is not None:
+            self._user_profiles.pop(record.user_id, None)
+
+    def clear(self):
+        """Remove every stored record."""
+        self._records.clear()
+        self._user_profiles.clear()
+
+# Process-wide feature store shared by the bot handlers
+feature_store = ProfileFeatureStore()
+
+# Scoring on encoded records
+
+if hasattr(int, 'bit_count'):
+    _bit_count = int.bit_count
+else:
+    def _bit_count(mask):
+        return bin(mask).count('1')
+
+def _difference_score(code_a, code_b, step):
+    """Return max(0, 100 - diff * step), or None if either code is missing."""
+    if code_a == MISSING or code_b == MISSING:
+        return None
+    return max(0, 100 - (abs(code_a - code_b) * step))
+
+def _overlap_score(mask_a, mask_b):
+    """Return the Jaccard overlap of two bitmasks (0-100), or None if either is empty."""
+    if not mask_a or not mask_b:
+        return None
+    return (_bit_count(mask_a & mask_b) / _bit_count(mask_a | mask_b)) * 100
+
+def _combine(sub_scores):
+    """Average the available sub-scores, defaulting to 50 when none are available."""
+    score = 0
+    max_score = 0
+    for sub_score in sub_scores:
+        if sub_score is not None:
+            score += sub_score
+            max_score += 100
+    return score / max_score * 100 if max_score > 0 else 50
+
+def features_religious_compatibility(features_a, features_b):
+    """calculate_religious_compatibility on encoded records."""
+    return _combine((
+        _difference_score(features_a.religiosity, features_b.religiosity, 35),
+        _difference_score(features_a.prayer, features_b.prayer, 25),
+        _difference_score(features_a.religious_education, features_b.religious_education, 33),
+        _overlap_score(features_a.practices, features_b.practices)
+    ))
+
+def _role_overlap_score(mask_a, mask_b):
+    """Return the Jaccard overlap of two role bitmasks, 50 if both are empty."""
+    total = _bit_count(mask_a | mask_b)
+    return (_bit_count(mask_a & mask_b) / total) * 100 if total > 0 else 50
+
+def features_family_values_compatibility(features_a, features_b):
+    """calculate_family_values_compatibility on encoded records."""
+    arrangement_score = None
+    if features_a.arrangement != MISSING and features_b.arrangement != MISSING:
+        if features_a.arrangement == features_b.arrangement:
+            arrangement_score = 100
+        else:
+            known = len(LIVING_ARRANGEMENTS)
+            arrangement_score = ARRANGEMENT_TABLE[min(features_a.arrangement, known)][
+                min(features_b.arrangement, known)]
+
+    role_score = None
+    if features_a.has_roles and features_b.has_roles:
+        role_score = (_role_overlap_score(features_a.husband_roles, features_b.husband_roles) +
+                      _role_overlap_score(features_a.wife_roles, features_b.wife_roles)) / 2
+
+    return _combine((
+        arrangement_score,
+        _difference_score(features_a.family_size, features_b.family_size, 33),
+        role_score
+    ))
+
+def features_lifestyle_compatibility(features_a, features_b):
+    """calculate_lifestyle_compatibility on encoded records."""
+    return _combine((
+        _difference_score(features_a.education, features_b.education, 25),
+        _overlap_score(features_a.interests, features_b.interests)
+    ))
+
+def features_personality_compatibility(features_a, features_b):
+    """Personality sub-score on encoded records (50 if either type is missing)."""
+    if features_a.personality == MISSING or features_b.personality == MISSING:
+        return 50
+    return MBTI_SCORES[features_a.personality * MBTI_SIZE + features_b.personality]
+
+def features_horoscope_compatibility(features_a, features_b):
+    """Horoscope sub-score on encoded records (50 if either sign is missing)."""
+    if features_a.zodiac == MISSING or features_b.zodiac == MISSING:
+        return 50
+    return ZODIAC_SCORES[features_a.zodiac * ZODIAC_SIZE + features_b.zodiac]
+
+def features_have_dealbreakers(features_a, features_b):
+    """has_dealbreakers on encoded records: two ANDs of the precomputed masks."""
+    return ((features_a.offers & features_b.accepts) != features_a.offers or
+            (features_b.offers & features_a.accepts) != features_b.offers)
+
+def calculate_features_compatibility(features_a, features_b, weights=None):
+    """
+    Calculate overall compatibility between two encoded profiles.
+
+    Args:
+        features_a: ProfileFeatures of first user
+        features_b: ProfileFeatures of second user
+        weights: Dictionary of weights for different compatibility factors
+
+    Returns:
+        Overall compatibility score (0-100), identical to
+        calculate_overall_compatibility on the source profiles
+    """
+    # Blocked pairs are not scored at all
+    if features_have_dealbreakers(features_a, features_b):
+        return 0
+
+    if weights is None:
+        weights = default_weights()
+
+    return (
+        features_religious_compatibility(features_a, features_b) * weights['religious'] +
+        features_personality_compatibility(features_a, features_b) * weights['personality'] +
+        features_family_values_compatibility(features_a, features_b) * weights['family'] +
+        features_lifestyle_compatibility(features_a, features_b) * weights['lifestyle'] +
+        features_horoscope_compatibility(features_a, features_b) * weights['horoscope']
+    )
+
+def features_compatibility_breakdown(features_a, features_b, weights=None):
+    """
+    Score two encoded profiles and keep the sub-scores of every factor.
+
+    Args:
+        features_a: ProfileFeatures of first user
+        features_b: ProfileFeatures of second user
+        weights: Dictionary of weights for different compatibility factors
+
+    Returns:
+        Dictionary with the overall 'score', identical to
+        calculate_features_compatibility, and one sub-score (0-100) per
+        weight key
+    """
+    if weights is None:
+        weights = default_weights()
+
+    breakdown = {
+        'religious': features_religious_compatibility(features_a, features_b),
+        'personality': features_personality_compatibility(features_a, features_b),
+        'family': features_family_values_compatibility(features_a, features_b),
+        'lifestyle': features_lifestyle_compatibility(features_a, features_b),
+        'horoscope': features_horoscope_compatibility(features_a, features_b)
+    }
+    breakdown['score'] = 0 if features_have_dealbreakers(features_a, features_b) else (
+        breakdown['religious'] * weights['religious'] +
+        breakdown['personality'] * weights['personality'] +
+        breakdown['family'] * weights['family'] +
+        breakdown['lifestyle'] * weights['lifestyle'] +
+        breakdown['horoscope'] * weights['horoscope']
+    )
+    return breakdown
+
+def default_weights():
+    """Return the configured compatibility weights."""
+    from src.config import (
+        RELIGIOUS_COMPATIBILITY_WEIGHT,
+        PERSONALITY_COMPATIBILITY_WEIGHT,
+        FAMILY_VALUES_WEIGHT,
+        LIFESTYLE_COMPATIBILITY_WEIGHT,
+        HOROSCOPE_COMPATIBILITY_WEIGHT
+    )
+
+    return {
+        'religious': RELIGIOUS_COMPATIBILITY_WEIGHT,
+        'personality': PERSONALITY_COMPATIBILITY_WEIGHT,
+        'family': FAMILY_VALUES_WEIGHT,
+        'lifestyle': LIFESTYLE_COMPATIBILITY_WEIGHT,
+        'horoscope': HOROSCOPE_COMPATIBILITY_WEIGHT
+    }
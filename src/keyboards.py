@@ -0,0 +1,75 @@
+"""
+Prebuilt inline keyboards for the Traditional Matchmaking Telegram Bot.
+
+Static menus are built once per language from their layouts and reused for
+every render; PTB's Telegram objects are immutable, so one markup can be
+sent any number of times. The cache is dropped whenever the translations
+are reloaded.
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from src import translations
+from src.translations import get_text
+
+# Layouts: rows of (translation key, callback data). Labels without a
+# translation are shown as their key.
+LAYOUTS = {
+    'main_menu': (
+        (("view_matches", "menu_matches"),),
+        (("conversations", "menu_conversations"),),
+        (("profile_setup", "menu_profile"),),
+        (("family_involvement", "menu_family"),),
+        (("settings", "menu_settings"),),
+        (("help", "menu_help"),),
+    ),
+    'settings': (
+        (("Change Language", "settings_language"),),
+        (("Privacy Settings", "settings_privacy"),),
+        (("Matching Preferences", "settings_matching"),),
+        (("Return to Main Menu", "return_main"),),
+    ),
+    'terms': (
+        (("accept", "terms_accept"),),
+        (("decline", "terms_decline"),),
+    ),
+    'age': (
+        (("yes", "age_yes"), ("no", "age_no")),
+    ),
+    'gender': (
+        (("male", "gender_male"), ("female", "gender_female")),
+    ),
+}
+
+# Language choice shown before a language is known
+LANGUAGE_KEYBOARD = InlineKeyboardMarkup([[
+    InlineKeyboardButton("English", callback_data="lang_en"),
+    InlineKeyboardButton("العربية", callback_data="lang_ar")
+]])
+
+_keyboards = {}
+_generation = None
+
+def get_keyboard(name, language):
+    """
+    Return the cached markup of a static menu.
+
+    Args:
+        name: Key of LAYOUTS
+        language: Language code of the labels
+
+    Returns:
+        InlineKeyboardMarkup
+    """
+    global _generation
+    if _generation != translations.catalog_generation:
+        _keyboards.clear()
+        _generation = translations.catalog_generation
+
+    markup = _keyboards.get((name, language))
+    if markup is None:
+        markup = _keyboards[(name, language)] = InlineKeyboardMarkup([
+            [InlineKeyboardButton(get_text(label, lang=language), callback_data=data) for label, data in row]
+            for row in LAYOUTS[name]
+        ])
+    return markup
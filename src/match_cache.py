@@ -0,0 +1,90 @@
+"""
+Persistent ranked match cache for the Traditional Matchmaking Telegram Bot.
+
+Each user's top-K candidates are scored once and stored in the match_cache
+table, so paging through potential matches is a cheap read. Entries are
+invalidated per user when a profile or matching settings change.
+"""
+
+import datetime
+
+from src.config import MATCH_CACHE_SIZE, MATCH_CACHE_TTL_HOURS
+from src.models import MatchCacheEntry
+from src.candidates import find_candidates
+from src.features import feature_store
+from src.score_cache import cached_top_k
+
+def build_match_cache(session, user, size=MATCH_CACHE_SIZE):
+    """
+    Score a user's candidates and store the top ranked ones.
+
+    Args:
+        session: Database session
+        user: User looking for matches (must have a profile)
+        size: Number of ranked candidates to keep
+
+    Returns:
+        List of MatchCacheEntry ordered by rank
+    """
+    session.query(MatchCacheEntry).filter(MatchCacheEntry.user_id == user.id).delete()
+
+    candidates = find_candidates(session, user)
+    entries = []
+
+    if candidates:
+        # Best first; deal-breaker pairs score 0 and are never shown
+        selected = cached_top_k(
+            feature_store.get(user.profile),
+            feature_store.get_many([candidate.profile for candidate in candidates]),
+            size
+        )
+        created_at = datetime.datetime.utcnow()
+        entries = [MatchCacheEntry(user_id=user.id, rank=rank, candidate_id=candidates[index].id,
+                                   score=score, created_at=created_at)
+                   for rank, (index, score) in enumerate(selected)]
+        if entries:
+            # Inserted through the table, so the commit does not expire the returned entries
+            session.execute(MatchCacheEntry.__table__.insert(), [
+                {'user_id': entry.user_id, 'rank': entry.rank, 'candidate_id': entry.candidate_id,
+                 'score': entry.score, 'created_at': entry.created_at}
+                for entry in entries
+            ])
+
+    session.commit()
+    return entries
+
+def get_ranked_matches(session, user):
+    """
+    Return a user's ranked candidates, rebuilding the cache when it is empty or stale.
+
+    Args:
+        session: Database session
+        user: User looking for matches (must have a profile)
+
+    Returns:
+        List of MatchCacheEntry ordered by rank
+    """
+    entries = session.query(MatchCacheEntry).filter(
+        MatchCacheEntry.user_id == user.id
+    ).order_by(MatchCacheEntry.rank).all()
+
+    expiry = datetime.datetime.utcnow() - datetime.timedelta(hours=MATCH_CACHE_TTL_HOURS)
+    if not entries or entries[0].created_at < expiry:
+        entries = build_match_cache(session, user)
+
+    return entries
+
+def invalidate_user(session, user_id):
+    """
+    Drop cache entries affected by a change to a user's profile or settings.
+
+    The user's own ranking is rebuilt on next access, and the user is removed
+    from every other ranking that contains them with a now-stale score.
+
+    Args:
+        session: Database session
+        user_id: Internal id of the user whose data changed
+    """
+    session.query(MatchCacheEntry).filter(
+        (MatchCacheEntry.user_id == user_id) | (MatchCacheEntry.candidate_id == user_id)
+    ).delete(synchronize_session=False)
@@ -40,7 +40,8 @@ class ZodiacSign(Enum):
     PISCES = "Pisces"
 
 # MBTI Compatibility Matrix (0-100 scale)
-# Based on complementary cognitive functions and observed compatibility patterns
+# Based on complementary cognitive functions and observed compatibility patterns.
+# Every pair is listed and the matrix is symmetric (check with `python -m src.matching`).
 MBTI_COMPATIBILITY = {
     PersonalityType.INTJ: {
         PersonalityType.INTJ: 65, PersonalityType.INTP: 75, PersonalityType.ENTJ: 80, PersonalityType.ENTP: 85,
@@ -54,11 +55,95 @@ MBTI_COMPATIBILITY = {
         PersonalityType.ISTJ: 65, PersonalityType.ISFJ: 60, PersonalityType.ESTJ: 70, PersonalityType.ESFJ: 55,
         PersonalityType.ISTP: 75, PersonalityType.ISFP: 65, PersonalityType.ESTP: 70, PersonalityType.ESFP: 60
     },
-    # Additional personality types omitted for brevity
+    PersonalityType.ENTJ: {
+        PersonalityType.INTJ: 80, PersonalityType.INTP: 85, PersonalityType.ENTJ: 65, PersonalityType.ENTP: 75,
+        PersonalityType.INFJ: 75, PersonalityType.INFP: 85, PersonalityType.ENFJ: 70, PersonalityType.ENFP: 65,
+        PersonalityType.ISTJ: 65, PersonalityType.ISFJ: 50, PersonalityType.ESTJ: 60, PersonalityType.ESFJ: 55,
+        PersonalityType.ISTP: 65, PersonalityType.ISFP: 55, PersonalityType.ESTP: 70, PersonalityType.ESFP: 60
+    },
+    PersonalityType.ENTP: {
+        PersonalityType.INTJ: 85, PersonalityType.INTP: 80, PersonalityType.ENTJ: 75, PersonalityType.ENTP: 65,
+        PersonalityType.INFJ: 85, PersonalityType.INFP: 75, PersonalityType.ENFJ: 65, PersonalityType.ENFP: 70,
+        PersonalityType.ISTJ: 65, PersonalityType.ISFJ: 55, PersonalityType.ESTJ: 70, PersonalityType.ESFJ: 60,
+        PersonalityType.ISTP: 65, PersonalityType.ISFP: 50, PersonalityType.ESTP: 60, PersonalityType.ESFP: 55
+    },
+    PersonalityType.INFJ: {
+        PersonalityType.INTJ: 70, PersonalityType.INTP: 75, PersonalityType.ENTJ: 75, PersonalityType.ENTP: 85,
+        PersonalityType.INFJ: 65, PersonalityType.INFP: 75, PersonalityType.ENFJ: 80, PersonalityType.ENFP: 85,
+        PersonalityType.ISTJ: 55, PersonalityType.ISFJ: 60, PersonalityType.ESTJ: 50, PersonalityType.ESFJ: 65,
+        PersonalityType.ISTP: 60, PersonalityType.ISFP: 70, PersonalityType.ESTP: 55, PersonalityType.ESFP: 65
+    },
+    PersonalityType.INFP: {
+        PersonalityType.INTJ: 65, PersonalityType.INTP: 70, PersonalityType.ENTJ: 85, PersonalityType.ENTP: 75,
+        PersonalityType.INFJ: 75, PersonalityType.INFP: 65, PersonalityType.ENFJ: 85, PersonalityType.ENFP: 80,
+        PersonalityType.ISTJ: 60, PersonalityType.ISFJ: 70, PersonalityType.ESTJ: 55, PersonalityType.ESFJ: 65,
+        PersonalityType.ISTP: 55, PersonalityType.ISFP: 60, PersonalityType.ESTP: 50, PersonalityType.ESFP: 65
+    },
+    PersonalityType.ENFJ: {
+        PersonalityType.INTJ: 75, PersonalityType.INTP: 85, PersonalityType.ENTJ: 70, PersonalityType.ENTP: 65,
+        PersonalityType.INFJ: 80, PersonalityType.INFP: 85, PersonalityType.ENFJ: 65, PersonalityType.ENFP: 75,
+        PersonalityType.ISTJ: 50, PersonalityType.ISFJ: 65, PersonalityType.ESTJ: 55, PersonalityType.ESFJ: 60,
+        PersonalityType.ISTP: 55, PersonalityType.ISFP: 65, PersonalityType.ESTP: 60, PersonalityType.ESFP: 70
+    },
+    PersonalityType.ENFP: {
+        PersonalityType.INTJ: 85, PersonalityType.INTP: 75, PersonalityType.ENTJ: 65, PersonalityType.ENTP: 70,
+        PersonalityType.INFJ: 85, PersonalityType.INFP: 80, PersonalityType.ENFJ: 75, PersonalityType.ENFP: 65,
+        PersonalityType.ISTJ: 55, PersonalityType.ISFJ: 65, PersonalityType.ESTJ: 60, PersonalityType.ESFJ: 70,
+        PersonalityType.ISTP: 50, PersonalityType.ISFP: 65, PersonalityType.ESTP: 55, PersonalityType.ESFP: 60
+    },
+    PersonalityType.ISTJ: {
+        PersonalityType.INTJ: 60, PersonalityType.INTP: 65, PersonalityType.ENTJ: 65, PersonalityType.ENTP: 65,
+        PersonalityType.INFJ: 55, PersonalityType.INFP: 60, PersonalityType.ENFJ: 50, PersonalityType.ENFP: 55,
+        PersonalityType.ISTJ: 65, PersonalityType.ISFJ: 70, PersonalityType.ESTJ: 80, PersonalityType.ESFJ: 75,
+        PersonalityType.ISTP: 75, PersonalityType.ISFP: 65, PersonalityType.ESTP: 85, PersonalityType.ESFP: 85
+    },
+    PersonalityType.ISFJ: {
+        PersonalityType.INTJ: 55, PersonalityType.INTP: 60, PersonalityType.ENTJ: 50, PersonalityType.ENTP: 55,
+        PersonalityType.INFJ: 60, PersonalityType.INFP: 70, PersonalityType.ENFJ: 65, PersonalityType.ENFP: 65,
+        PersonalityType.ISTJ: 70, PersonalityType.ISFJ: 65, PersonalityType.ESTJ: 75, PersonalityType.ESFJ: 80,
+        PersonalityType.ISTP: 65, PersonalityType.ISFP: 75, PersonalityType.ESTP: 85, PersonalityType.ESFP: 85
+    },
+    PersonalityType.ESTJ: {
+        PersonalityType.INTJ: 65, PersonalityType.INTP: 70, PersonalityType.ENTJ: 60, PersonalityType.ENTP: 70,
+        PersonalityType.INFJ: 50, PersonalityType.INFP: 55, PersonalityType.ENFJ: 55, PersonalityType.ENFP: 60,
+        PersonalityType.ISTJ: 80, PersonalityType.ISFJ: 75, PersonalityType.ESTJ: 65, PersonalityType.ESFJ: 70,
+        PersonalityType.ISTP: 85, PersonalityType.ISFP: 85, PersonalityType.ESTP: 75, PersonalityType.ESFP: 65
+    },
+    PersonalityType.ESFJ: {
+        PersonalityType.INTJ: 50, PersonalityType.INTP: 55, PersonalityType.ENTJ: 55, PersonalityType.ENTP: 60,
+        PersonalityType.INFJ: 65, PersonalityType.INFP: 65, PersonalityType.ENFJ: 60, PersonalityType.ENFP: 70,
+        PersonalityType.ISTJ: 75, PersonalityType.ISFJ: 80, PersonalityType.ESTJ: 70, PersonalityType.ESFJ: 65,
+        PersonalityType.ISTP: 85, PersonalityType.ISFP: 85, PersonalityType.ESTP: 65, PersonalityType.ESFP: 75
+    },
+    PersonalityType.ISTP: {
+        PersonalityType.INTJ: 70, PersonalityType.INTP: 75, PersonalityType.ENTJ: 65, PersonalityType.ENTP: 65,
+        PersonalityType.INFJ: 60, PersonalityType.INFP: 55, PersonalityType.ENFJ: 55, PersonalityType.ENFP: 50,
+        PersonalityType.ISTJ: 75, PersonalityType.ISFJ: 65, PersonalityType.ESTJ: 85, PersonalityType.ESFJ: 85,
+        PersonalityType.ISTP: 65, PersonalityType.ISFP: 70, PersonalityType.ESTP: 80, PersonalityType.ESFP: 75
+    },
+    PersonalityType.ISFP: {
+        PersonalityType.INTJ: 60, PersonalityType.INTP: 65, PersonalityType.ENTJ: 55, PersonalityType.ENTP: 50,
+        PersonalityType.INFJ: 70, PersonalityType.INFP: 60, PersonalityType.ENFJ: 65, PersonalityType.ENFP: 65,
+        PersonalityType.ISTJ: 65, PersonalityType.ISFJ: 75, PersonalityType.ESTJ: 85, PersonalityType.ESFJ: 85,
+        PersonalityType.ISTP: 70, PersonalityType.ISFP: 65, PersonalityType.ESTP: 75, PersonalityType.ESFP: 80
+    },
+    PersonalityType.ESTP: {
+        PersonalityType.INTJ: 65, PersonalityType.INTP: 70, PersonalityType.ENTJ: 70, PersonalityType.ENTP: 60,
+        PersonalityType.INFJ: 55, PersonalityType.INFP: 50, PersonalityType.ENFJ: 60, PersonalityType.ENFP: 55,
+        PersonalityType.ISTJ: 85, PersonalityType.ISFJ: 85, PersonalityType.ESTJ: 75, PersonalityType.ESFJ: 65,
+        PersonalityType.ISTP: 80, PersonalityType.ISFP: 75, PersonalityType.ESTP: 65, PersonalityType.ESFP: 70
+    },
+    PersonalityType.ESFP: {
+        PersonalityType.INTJ: 55, PersonalityType.INTP: 60, PersonalityType.ENTJ: 60, PersonalityType.ENTP: 55,
+        PersonalityType.INFJ: 65, PersonalityType.INFP: 65, PersonalityType.ENFJ: 70, PersonalityType.ENFP: 60,
+        PersonalityType.ISTJ: 85, PersonalityType.ISFJ: 85, PersonalityType.ESTJ: 65, PersonalityType.ESFJ: 75,
+        PersonalityType.ISTP: 75, PersonalityType.ISFP: 80, PersonalityType.ESTP: 70, PersonalityType.ESFP: 65
+    }
 }
 
 # Zodiac Compatibility Matrix (0-100 scale)
-# Based on traditional astrological compatibility between elements and qualities
+# Based on traditional astrological compatibility between elements and qualities.
+# Every pair is listed and the matrix is symmetric (check with `python -m src.matching`).
 ZODIAC_COMPATIBILITY = {
     ZodiacSign.ARIES: {
         ZodiacSign.ARIES: 70, ZodiacSign.TAURUS: 55, ZodiacSign.GEMINI: 75, ZodiacSign.CANCER: 60,
@@ -70,9 +155,120 @@ ZODIAC_COMPATIBILITY = {
         ZodiacSign.LEO: 65, ZodiacSign.VIRGO: 90, ZodiacSign.LIBRA: 70, ZodiacSign.SCORPIO: 85,
         ZodiacSign.SAGITTARIUS: 55, ZodiacSign.CAPRICORN: 90, ZodiacSign.AQUARIUS: 60, ZodiacSign.PISCES: 80
     },
-    # Additional zodiac signs omitted for brevity
+    ZodiacSign.GEMINI: {
+        ZodiacSign.ARIES: 75, ZodiacSign.TAURUS: 60, ZodiacSign.GEMINI: 70, ZodiacSign.CANCER: 55,
+        ZodiacSign.LEO: 75, ZodiacSign.VIRGO: 60, ZodiacSign.LIBRA: 90, ZodiacSign.SCORPIO: 60,
+        ZodiacSign.SAGITTARIUS: 80, ZodiacSign.CAPRICORN: 60, ZodiacSign.AQUARIUS: 90, ZodiacSign.PISCES: 60
+    },
+    ZodiacSign.CANCER: {
+        ZodiacSign.ARIES: 60, ZodiacSign.TAURUS: 85, ZodiacSign.GEMINI: 55, ZodiacSign.CANCER: 70,
+        ZodiacSign.LEO: 55, ZodiacSign.VIRGO: 75, ZodiacSign.LIBRA: 60, ZodiacSign.SCORPIO: 90,
+        ZodiacSign.SAGITTARIUS: 60, ZodiacSign.CAPRICORN: 80, ZodiacSign.AQUARIUS: 60, ZodiacSign.PISCES: 90
+    },
+    ZodiacSign.LEO: {
+        ZodiacSign.ARIES: 90, ZodiacSign.TAURUS: 65, ZodiacSign.GEMINI: 75, ZodiacSign.CANCER: 55,
+        ZodiacSign.LEO: 70, ZodiacSign.VIRGO: 55, ZodiacSign.LIBRA: 75, ZodiacSign.SCORPIO: 60,
+        ZodiacSign.SAGITTARIUS: 90, ZodiacSign.CAPRICORN: 60, ZodiacSign.AQUARIUS: 80, ZodiacSign.PISCES: 60
+    },
+    ZodiacSign.VIRGO: {
+        ZodiacSign.ARIES: 65, ZodiacSign.TAURUS: 90, ZodiacSign.GEMINI: 60, ZodiacSign.CANCER: 75,
+        ZodiacSign.LEO: 55, ZodiacSign.VIRGO: 70, ZodiacSign.LIBRA: 55, ZodiacSign.SCORPIO: 75,
+        ZodiacSign.SAGITTARIUS: 60, ZodiacSign.CAPRICORN: 90, ZodiacSign.AQUARIUS: 60, ZodiacSign.PISCES: 80
+    },
+    ZodiacSign.LIBRA: {
+        ZodiacSign.ARIES: 80, ZodiacSign.TAURUS: 70, ZodiacSign.GEMINI: 90, ZodiacSign.CANCER: 60,
+        ZodiacSign.LEO: 75, ZodiacSign.VIRGO: 55, ZodiacSign.LIBRA: 70, ZodiacSign.SCORPIO: 55,
+        ZodiacSign.SAGITTARIUS: 75, ZodiacSign.CAPRICORN: 60, ZodiacSign.AQUARIUS: 90, ZodiacSign.PISCES: 60
+    },
+    ZodiacSign.SCORPIO: {
+        ZodiacSign.ARIES: 60, ZodiacSign.TAURUS: 85, ZodiacSign.GEMINI: 60, ZodiacSign.CANCER: 90,
+        ZodiacSign.LEO: 60, ZodiacSign.VIRGO: 75, ZodiacSign.LIBRA: 55, ZodiacSign.SCORPIO: 70,
+        ZodiacSign.SAGITTARIUS: 55, ZodiacSign.CAPRICORN: 75, ZodiacSign.AQUARIUS: 60, ZodiacSign.PISCES: 90
+    },
+    ZodiacSign.SAGITTARIUS: {
+        ZodiacSign.ARIES: 85, ZodiacSign.TAURUS: 55, ZodiacSign.GEMINI: 80, ZodiacSign.CANCER: 60,
+        ZodiacSign.LEO: 90, ZodiacSign.VIRGO: 60, ZodiacSign.LIBRA: 75, ZodiacSign.SCORPIO: 55,
+        ZodiacSign.SAGITTARIUS: 70, ZodiacSign.CAPRICORN: 55, ZodiacSign.AQUARIUS: 75, ZodiacSign.PISCES: 60
+    },
+    ZodiacSign.CAPRICORN: {
+        ZodiacSign.ARIES: 55, ZodiacSign.TAURUS: 90, ZodiacSign.GEMINI: 60, ZodiacSign.CANCER: 80,
+        ZodiacSign.LEO: 60, ZodiacSign.VIRGO: 90, ZodiacSign.LIBRA: 60, ZodiacSign.SCORPIO: 75,
+        ZodiacSign.SAGITTARIUS: 55, ZodiacSign.CAPRICORN: 70, ZodiacSign.AQUARIUS: 55, ZodiacSign.PISCES: 75
+    },
+    ZodiacSign.AQUARIUS: {
+        ZodiacSign.ARIES: 75, ZodiacSign.TAURUS: 60, ZodiacSign.GEMINI: 90, ZodiacSign.CANCER: 60,
+        ZodiacSign.LEO: 80, ZodiacSign.VIRGO: 60, ZodiacSign.LIBRA: 90, ZodiacSign.SCORPIO: 60,
+        ZodiacSign.SAGITTARIUS: 75, ZodiacSign.CAPRICORN: 55, ZodiacSign.AQUARIUS: 70, ZodiacSign.PISCES: 55
+    },
+    ZodiacSign.PISCES: {
+        ZodiacSign.ARIES: 65, ZodiacSign.TAURUS: 80, ZodiacSign.GEMINI: 60, ZodiacSign.CANCER: 90,
+        ZodiacSign.LEO: 60, ZodiacSign.VIRGO: 80, ZodiacSign.LIBRA: 60, ZodiacSign.SCORPIO: 90,
+        ZodiacSign.SAGITTARIUS: 60, ZodiacSign.CAPRICORN: 75, ZodiacSign.AQUARIUS: 55, ZodiacSign.PISCES: 70
+    }
+}
+
+# Living arrangement compatibility (0-100 scale)
+# Pairs not listed here fall back to a neutral score of 50
+LIVING_ARRANGEMENT_COMPATIBILITY = {
+    ("With husband's family", "With husband's family"): 100,
+    ("With wife's family", "With wife's family"): 100,
+    ("With husband's family", "Independent home near family"): 70,
+    ("With wife's family", "Independent home near family"): 70,
+    ("Independent home near family", "Independent home near family"): 100,
+    ("Completely independent", "Completely independent"): 100,
+    ("Independent home near family", "Completely independent"): 80,
+    ("With husband's family", "With wife's family"): 40,
+    ("With husband's family", "Completely independent"): 50,
+    ("With wife's family", "Completely independent"): 50
 }
 
+# Compiled lookup tables
+# Each matrix is flattened at import into a row-major tuple, so a score is a
+# single index: SCORES[code_a * SIZE + code_b]. Codes follow enum order and
+# are looked up from either the enum member or its string value.
+
+PERSONALITY_TYPES = list(PersonalityType)
+ZODIAC_SIGNS = list(ZodiacSign)
+MBTI_SIZE = len(PERSONALITY_TYPES)
+ZODIAC_SIZE = len(ZODIAC_SIGNS)
+
+def _compile_codes(members):
+    """Map each enum member and its value to its position."""
+    codes = {member: code for code, member in enumerate(members)}
+    codes.update({member.value: code for code, member in enumerate(members)})
+    return codes
+
+def _compile_scores(members, table, default=50):
+    """Flatten a nested enum-keyed compatibility table into a row-major tuple."""
+    return tuple(table.get(member_a, {}).get(member_b, default) for member_a in members for member_b in members)
+
+PERSONALITY_CODES = _compile_codes(PERSONALITY_TYPES)
+ZODIAC_CODES = _compile_codes(ZODIAC_SIGNS)
+MBTI_SCORES = _compile_scores(PERSONALITY_TYPES, MBTI_COMPATIBILITY)
+ZODIAC_SCORES = _compile_scores(ZODIAC_SIGNS, ZODIAC_COMPATIBILITY)
+
+def personality_code(personality_type):
+    """Return the table code of an MBTI type (string or PersonalityType enum)."""
+    try:
+        return PERSONALITY_CODES[personality_type]
+    except KeyError:
+        raise ValueError(f"{personality_type!r} is not a valid PersonalityType") from None
+
+def zodiac_code(sign):
+    """Return the table code of a zodiac sign (string or ZodiacSign enum)."""
+    try:
+        return ZODIAC_CODES[sign]
+    except KeyError:
+        raise ValueError(f"{sign!r} is not a valid ZodiacSign") from None
+
+def personality_compatibility_by_code(code_a, code_b):
+    """Personality compatibility of two pre-encoded MBTI types (see personality_code)."""
+    return MBTI_SCORES[code_a * MBTI_SIZE + code_b]
+
+def zodiac_compatibility_by_code(code_a, code_b):
+    """Zodiac compatibility of two pre-encoded signs (see zodiac_code)."""
+    return ZODIAC_SCORES[code_a * ZODIAC_SIZE + code_b]
+
 def calculate_personality_compatibility(personality_type_a, personality_type_b):
     """
     Calculate compatibility score between two MBTI personality types.
@@ -84,18 +280,15 @@ def calculate_personality_compatibility(personality_type_a, personality_type_b):
     Returns:
         Compatibility score (0-100)
     """
-    # Convert string types to enum if needed
-    if isinstance(personality_type_a, str):
-        personality_type_a = PersonalityType(personality_type_a)
-    if isinstance(personality_type_b, str):
-        personality_type_b = PersonalityType(personality_type_b)
+    # Invalid type strings raise ValueError; other unknown values score neutral
+    code_a = (personality_code(personality_type_a) if isinstance(personality_type_a, str)
+              else PERSONALITY_CODES.get(personality_type_a))
+    code_b = (personality_code(personality_type_b) if isinstance(personality_type_b, str)
+              else PERSONALITY_CODES.get(personality_type_b))
     
-    # Get compatibility score from matrix
-    try:
-        return MBTI_COMPATIBILITY.get(personality_type_a, {}).get(personality_type_b, 50)
-    except Exception:
-        # Default to neutral compatibility if types are invalid
+    if code_a is None or code_b is None:
         return 50
+    return MBTI_SCORES[code_a * MBTI_SIZE + code_b]
 
 def calculate_zodiac_compatibility(sign_a, sign_b):
     """
@@ -108,18 +301,43 @@ def calculate_zodiac_compatibility(sign_a, sign_b):
     Returns:
         Compatibility score (0-100)
     """
-    # Convert string signs to enum if needed
-    if isinstance(sign_a, str):
-        sign_a = ZodiacSign(sign_a)
-    if isinstance(sign_b, str):
-        sign_b = ZodiacSign(sign_b)
+    # Invalid sign strings raise ValueError; other unknown values score neutral
+    code_a = zodiac_code(sign_a) if isinstance(sign_a, str) else ZODIAC_CODES.get(sign_a)
+    code_b = zodiac_code(sign_b) if isinstance(sign_b, str) else ZODIAC_CODES.get(sign_b)
     
-    # Get compatibility score from matrix
-    try:
-        return ZODIAC_COMPATIBILITY.get(sign_a, {}).get(sign_b, 50)
-    except Exception:
-        # Default to neutral compatibility if signs are invalid
+    if code_a is None or code_b is None:
         return 50
+    return ZODIAC_SCORES[code_a * ZODIAC_SIZE + code_b]
+
+def calculate_profile_personality_compatibility(user_a, user_b):
+    """
+    Calculate the personality sub-score of two profiles.
+    
+    Args:
+        user_a: Profile of first user
+        user_b: Profile of second user
+        
+    Returns:
+        Compatibility score (0-100), 50 unless both users completed the test
+    """
+    if user_a.personality_type and user_b.personality_type:
+        return calculate_personality_compatibility(user_a.personality_type, user_b.personality_type)
+    return 50
+
+def calculate_profile_horoscope_compatibility(user_a, user_b):
+    """
+    Calculate the horoscope sub-score of two profiles.
+    
+    Args:
+        user_a: Profile of first user
+        user_b: Profile of second user
+        
+    Returns:
+        Compatibility score (0-100), 50 unless both users provided birth information
+    """
+    if user_a.zodiac_sign and user_b.zodiac_sign:
+        return calculate_zodiac_compatibility(user_a.zodiac_sign, user_b.zodiac_sign)
+    return 50
 
 def calculate_religious_compatibility(user_a, user_b):
     """
@@ -197,18 +415,7 @@ def calculate_family_values_compatibility(user_a, user_b):
             score += 100
         else:
             # Some arrangements are more compatible than others
-            arrangement_compatibility = {
-                ("With husband's family", "With husband's family"): 100,
-                ("With wife's family", "With wife's family"): 100,
-                ("With husband's family", "Independent home near family"): 70,
-                ("With wife's family", "Independent home near family"): 70,
-                ("Independent home near family", "Independent home near family"): 100,
-                ("Completely independent", "Completely independent"): 100,
-                ("Independent home near family", "Completely independent"): 80,
-                ("With husband's family", "With wife's family"): 40,
-                ("With husband's family", "Completely independent"): 50,
-                ("With wife's family", "Completely independent"): 50
-            }
+            arrangement_compatibility = LIVING_ARRANGEMENT_COMPATIBILITY
             
             arrangement_pair = (user_a.living_arrangement, user_b.living_arrangement)
             reverse_pair = (user_b.living_arrangement, user_a.living_arrangement)
@@ -326,44 +533,35 @@ def calculate_overall_compatibility(user_a, user_b, weights=None):
             'horoscope': HOROSCOPE_COMPATIBILITY_WEIGHT
         }
     
+    # Blocked pairs are not scored at all
+    if has_dealbreakers(user_a, user_b):
+        return 0
+    
     # Calculate individual compatibility scores
     religious_score = calculate_religious_compatibility(user_a, user_b)
     family_score = calculate_family_values_compatibility(user_a, user_b)
     lifestyle_score = calculate_lifestyle_compatibility(user_a, user_b)
     
-    # Calculate personality score if both users have completed the test
-    personality_score = 50  # Default neutral score
-    if user_a.personality_type and user_b.personality_type:
-        personality_score = calculate_personality_compatibility(
-            user_a.personality_type, user_b.personality_type
-        )
-    
-    # Calculate horoscope score if both users have provided birth information
-    horoscope_score = 50  # Default neutral score
-    if user_a.zodiac_sign and user_b.zodiac_sign:
-        horoscope_score = calculate_zodiac_compatibility(
-            user_a.zodiac_sign, user_b.zodiac_sign
-        )
+    personality_score = calculate_profile_personality_compatibility(user_a, user_b)
+    horoscope_score = calculate_profile_horoscope_compatibility(user_a, user_b)
     
     # Calculate weighted average
-    total_score = (
+    return (
         religious_score * weights['religious'] +
         personality_score * weights['personality'] +
         family_score * weights['family'] +
         lifestyle_score * weights['lifestyle'] +
         horoscope_score * weights['horoscope']
     )
-    
-    # Check for deal-breakers
-    if has_dealbreakers(user_a, user_b):
-        return 0
-    
-    return total_score
 
 def has_dealbreakers(user_a, user_b):
     """
     Check if there are any deal-breakers between two users.
     
+    Each profile is reduced to "offers" and "accepts" bitmasks (see
+    features.dealbreaker_masks); the pair is blocked unless each profile
+    accepts everything the other offers.
+    
     Args:
         user_a: Profile of first user
         user_b: Profile of second user
@@ -371,42 +569,11 @@ def has_dealbreakers(user_a, user_b):
     Returns:
         True if there are deal-breakers, False otherwise
     """
-    # Religious level incompatibility
-    if (user_a.religiosity_level and user_b.religiosity_level and
-        abs(religiosity_level_value(user_a.religiosity_level) - 
-            religiosity_level_value(user_b.religiosity_level)) > 1):
-        
-        # Check if this is a high-importance factor for either user
-        if (hasattr(user_a, 'settings') and user_a.settings and 
-            user_a.settings.religious_compatibility_importance > 4):
-            return True
-        
-        if (hasattr(user_b, 'settings') and user_b.settings and 
-            user_b.settings.religious_compatibility_importance > 4):
-            return True
+    from src.features import profile_dealbreaker_masks
     
-    # Covering preference mismatch (for male-female matches)
-    try:
-        if (user_a.gender != user_b.gender and  # Only check for opposite gender matches
-            hasattr(user_a, 'partner_covering_preference') and user_a.partner_covering_preference and
-            hasattr(user_b, 'personal_covering') and user_b.personal_covering and
-            user_a.partner_covering_preference != user_b.personal_covering and
-            hasattr(user_a, 'covering_importance') and 
-            (isinstance(user_a.covering_importance, int) and user_a.covering_importance > 4)):
-            return True
-        
-        if (user_a.gender != user_b.gender and  # Only check for opposite gender matches
-            hasattr(user_b, 'partner_covering_preference') and user_b.partner_covering_preference and
-            hasattr(user_a, 'personal_covering') and user_a.personal_covering and
-            user_b.partner_covering_preference != user_a.personal_covering and
-            hasattr(user_b, 'covering_importance') and 
-            (isinstance(user_b.covering_importance, int) and user_b.covering_importance > 4)):
-            return True
-    except (TypeError, AttributeError):
-        # If there's any error in comparison, don't treat it as a dealbreaker
-        pass
-    
-    return False
+    offers_a, accepts_a = profile_dealbreaker_masks(user_a)
+    offers_b, accepts_b = profile_dealbreaker_masks(user_b)
+    return (offers_a & accepts_b) != offers_a or (offers_b & accepts_a) != offers_b
 
 # Helper functions for value conversion
 
@@ -600,3 +767,44 @@ def determine_zodiac_sign(birth_date):
         return ZodiacSign.AQUARIUS
     else:
         return ZodiacSign.PISCES
+
+# Table validation
+
+def validate_compatibility_tables():
+    """
+    Check the MBTI and zodiac tables for completeness, range and symmetry.
+    
+    Returns:
+        List of problem descriptions (empty if the tables are valid)
+    """
+    problems = []
+    for name, members, table in (
+        ("MBTI_COMPATIBILITY", PERSONALITY_TYPES, MBTI_COMPATIBILITY),
+        ("ZODIAC_COMPATIBILITY", ZODIAC_SIGNS, ZODIAC_COMPATIBILITY)
+    ):
+        for member_a in members:
+            row = table.get(member_a)
+            if row is None:
+                problems.append(f"{name}: missing row {member_a.value}")
+                continue
+            for member_b in members:
+                if member_b not in row:
+                    problems.append(f"{name}: missing {member_a.value} -> {member_b.value}")
+                    continue
+                score = row[member_b]
+                if not isinstance(score, int) or not 0 <= score <= 100:
+                    problems.append(f"{name}: {member_a.value} -> {member_b.value} = {score!r} is not an integer in 0-100")
+                reverse = table.get(member_b, {}).get(member_a)
+                if reverse is not None and reverse != score:
+                    problems.append(f"{name}: {member_a.value} -> {member_b.value} = {score} "
+                                    f"but {member_b.value} -> {member_a.value} = {reverse}")
+    return problems
+
+if __name__ == "__main__":
+    import sys
+
+    problems = validate_compatibility_tables()
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problem(s) found" if problems else "Compatibility tables are complete and symmetric")
+    sys.exit(1 if problems else 0)
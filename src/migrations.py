@@ -0,0 +1,152 @@
+"""
+Schema migrations for the Traditional Matchmaking Telegram Bot.
+
+Base.metadata.create_all only creates missing tables, so indexes added to
+existing tables are applied here. Every step is idempotent and safe to run
+on each start-up.
+
+Usage:
+    python -m src.migrations
+"""
+
+import logging
+
+from sqlalchemy import inspect, text
+
+from src.models import Base
+
+logger = logging.getLogger(__name__)
+
+def deduplicate_matches(connection):
+    """
+    Remove duplicate match rows so the (sender_id, receiver_id) unique index can be built.
+
+    The oldest row of each pair is kept and conversations pointing at a
+    removed duplicate are moved to it.
+
+    Args:
+        connection: Database connection inside a transaction
+
+    Returns:
+        Number of rows removed
+    """
+    duplicates = connection.execute(text(
+        "SELECT m.id, k.keep_id FROM matches m "
+        "JOIN (SELECT sender_id, receiver_id, MIN(id) AS keep_id FROM matches "
+        "      GROUP BY sender_id, receiver_id HAVING COUNT(*) > 1) k "
+        "ON m.sender_id = k.sender_id AND m.receiver_id = k.receiver_id "
+        "WHERE m.id != k.keep_id"
+    )).fetchall()
+
+    for duplicate_id, keep_id in duplicates:
+        connection.execute(
+            text("UPDATE conversations SET match_id = :keep_id WHERE match_id = :duplicate_id"),
+            {"keep_id": keep_id, "duplicate_id": duplicate_id}
+        )
+        connection.execute(text("DELETE FROM matches WHERE id = :id"), {"id": duplicate_id})
+
+    if duplicates:
+        logger.warning("Removed %d duplicate match rows", len(duplicates))
+
+    return len(duplicates)
+
+def apply_columns(engine):
+    """
+    Add every column declared on the models that is missing from its table.
+
+    Added columns must be nullable or have a server default, so existing
+    rows get a value.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        List of "table.column" names of the columns that were added
+    """
+    added = []
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                definition = f"{column.name} {column.type.compile(dialect=connection.dialect)}"
+                if column.server_default is not None:
+                    definition += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    definition += " NOT NULL"
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+                added.append(f"{table.name}.{column.name}")
+                logger.info("Added column %s to %s", column.name, table.name)
+
+    return added
+
+def apply_indexes(engine):
+    """
+    Create every index declared on the models that is missing from the database.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        List of names of the indexes that were created
+    """
+    created = []
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing_indexes:
+                    continue
+
+                if table.name == 'matches' and index.unique:
+                    deduplicate_matches(connection)
+
+                index.create(connection)
+                created.append(index.name)
+                logger.info("Created index %s on %s", index.name, table.name)
+
+    return created
+
+def drop_indexes(engine):
+    """
+    Drop every index declared on the models (used by benchmarks to compare plans).
+
+    Args:
+        engine: SQLAlchemy engine
+    """
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    index.drop(connection)
+
+def migrate(engine):
+    """Bring an existing database up to date with the models."""
+    Base.metadata.create_all(engine)
+    apply_columns(engine)
+    return apply_indexes(engine)
+
+if __name__ == "__main__":
+    from src.database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    created_indexes = migrate(engine)
+    print(f"Created {len(created_indexes)} indexes")
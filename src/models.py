@@ -3,8 +3,8 @@ Database models for the Traditional Matchmaking Telegram Bot.
 """
 
 from sqlalchemy import (
-    Column, Integer, String, Float, Boolean, 
-    DateTime, ForeignKey, Table, Text, JSON, Enum
+    Column, Integer, BigInteger, String, Float, Boolean, 
+    Date, DateTime, ForeignKey, Table, Text, JSON, Enum, Index, LargeBinary, false
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -17,7 +17,9 @@ Base = declarative_base()
 user_interests = Table(
     'user_interests', Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id')),
-    Column('interest_id', Integer, ForeignKey('interests.id'))
+    Column('interest_id', Integer, ForeignKey('interests.id')),
+    Index('ix_user_interests_user_id', 'user_id', 'interest_id'),
+    Index('ix_user_interests_interest_id', 'interest_id')
 )
 
 user_family_members = Table(
@@ -63,6 +65,10 @@ class VerificationLevel(enum.Enum):
 # Main models
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # telegram_id lookups are served by its unique constraint
+        Index('ix_users_account_status', 'account_status'),
+    )
     
     id = Column(Integer, primary_key=True)
     telegram_id = Column(String(50), unique=True, nullable=False)
@@ -87,6 +93,10 @@ class User(Base):
 
 class Profile(Base):
     __tablename__ = 'profiles'
+    __table_args__ = (
+        # Candidate generation filters on gender and age range
+        Index('ix_profiles_gender_age', 'gender', 'age'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), unique=True)
@@ -113,7 +123,11 @@ class Profile(Base):
     family_size = Column(String(100), nullable=True)
     
     # Personal Interests (many-to-many)
-    interests = relationship("Interest", secondary=user_interests, back_populates="users")
+    interests = relationship(
+        "Interest", secondary=user_interests, back_populates="users",
+        primaryjoin="Profile.user_id == foreign(user_interests.c.user_id)",
+        secondaryjoin="Interest.id == foreign(user_interests.c.interest_id)"
+    )
     
     # Covering Preferences (for women)
     personal_covering = Column(Enum(CoveringStyle), nullable=True)
@@ -134,6 +148,11 @@ class Profile(Base):
     verified = Column(Boolean, default=False)
     verification_level = Column(Enum(VerificationLevel), default=VerificationLevel.NONE)
     
+    # Bumped on every save; cached pairwise scores are keyed by it
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # Profiles saved after the candidate index was built are considered besides its results
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
     # Relationships
     user = relationship("User", back_populates="profile")
     
@@ -148,7 +167,11 @@ class Interest(Base):
     category = Column(String(50), nullable=True)
     
     # Relationships
-    users = relationship("Profile", secondary=user_interests, back_populates="interests")
+    users = relationship(
+        "Profile", secondary=user_interests, back_populates="interests",
+        primaryjoin="Interest.id == foreign(user_interests.c.interest_id)",
+        secondaryjoin="Profile.user_id == foreign(user_interests.c.user_id)"
+    )
     
     def __repr__(self):
         return f"<Interest(id={self.id}, name={self.name}, category={self.category})>"
@@ -164,18 +187,29 @@ class FamilyMember(Base):
     
     # Relationships
     users = relationship("User", secondary=user_family_members)
-    conversations = relationship("Conversation", secondary="family_conversation_access")
+    conversations = relationship("Conversation", secondary="family_conversation_access", back_populates="family_supervisors")
     
     def __repr__(self):
         return f"<FamilyMember(id={self.id}, relation={self.relation}, name={self.name})>"
 
 class Match(Base):
     __tablename__ = 'matches'
+    __table_args__ = (
+        # One match row per direction; also serves sender-first lookups
+        Index('uq_matches_sender_receiver', 'sender_id', 'receiver_id', unique=True),
+        Index('ix_matches_receiver_status', 'receiver_id', 'status'),
+    )
     
     id = Column(Integer, primary_key=True)
     sender_id = Column(Integer, ForeignKey('users.id'))
     receiver_id = Column(Integer, ForeignKey('users.id'))
     compatibility_score = Column(Float, nullable=False)
+    # Sub-scores (0-100) of the score the sender was shown
+    religious_score = Column(Float, nullable=True)
+    personality_score = Column(Float, nullable=True)
+    family_score = Column(Float, nullable=True)
+    lifestyle_score = Column(Float, nullable=True)
+    horoscope_score = Column(Float, nullable=True)
     status = Column(Enum(MatchStatus), default=MatchStatus.PENDING)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -203,7 +237,7 @@ class Conversation(Base):
     match = relationship("Match", back_populates="conversation")
     participants = relationship("User", secondary="conversation_participants", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
-    family_supervisors = relationship("FamilyMember", secondary="family_conversation_access")
+    family_supervisors = relationship("FamilyMember", secondary="family_conversation_access", back_populates="conversations")
     
     def __repr__(self):
         return f"<Conversation(id={self.id}, match_id={self.match_id}, stage={self.stage})>"
@@ -212,7 +246,9 @@ class Conversation(Base):
 conversation_participants = Table(
     'conversation_participants', Base.metadata,
     Column('conversation_id', Integer, ForeignKey('conversations.id')),
-    Column('user_id', Integer, ForeignKey('users.id'))
+    Column('user_id', Integer, ForeignKey('users.id')),
+    Index('ix_conversation_participants_user_id', 'user_id', 'conversation_id'),
+    Index('ix_conversation_participants_conversation_id', 'conversation_id', 'user_id')
 )
 
 # Association table for family conversation access
@@ -224,6 +260,9 @@ family_conversation_access = Table(
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        Index('ix_messages_conversation_sent_at', 'conversation_id', 'sent_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey('conversations.id'))
@@ -294,6 +333,9 @@ class UserSettings(Base):
     religious_compatibility_importance = Column(Integer, default=5)  # 1-5 scale
     family_background_importance = Column(Integer, default=3)  # 1-5 scale
     
+    # Deal-breakers the user opted into
+    religious_dealbreaker = Column(Boolean, nullable=False, default=False, server_default=false())  # Block distant religiosity levels
+    
     # Feature Toggles
     enable_personality_matching = Column(Boolean, default=True)
     enable_horoscope = Column(Boolean, default=True)
@@ -310,3 +352,115 @@ class UserSettings(Base):
     
     def __repr__(self):
         return f"<UserSettings(id={self.id}, user_id={self.user_id})>"
+
+class MatchCacheEntry(Base):
+    __tablename__ = 'match_cache'
+    __table_args__ = (
+        # Invalidation removes a changed user from every other user's list
+        Index('ix_match_cache_candidate_id', 'candidate_id'),
+    )
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    candidate_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<MatchCacheEntry(user_id={self.user_id}, rank={self.rank}, candidate_id={self.candidate_id}, score={self.score})>"
+
+class PairScore(Base):
+    __tablename__ = 'pair_scores'
+    
+    # Directed pair (seeker, candidate) scored with one set of weights
+    profile_id = Column(Integer, primary_key=True)
+    candidate_profile_id = Column(Integer, primary_key=True)
+    weights_key = Column(String(32), primary_key=True)
+    # Entries whose versions or settings digests differ from the profiles' current ones are stale
+    profile_version = Column(Integer, nullable=False)
+    candidate_version = Column(Integer, nullable=False)
+    profile_settings = Column(Integer, nullable=False, default=0, server_default='0')
+    candidate_settings = Column(Integer, nullable=False, default=0, server_default='0')
+    score = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<PairScore(profile_id={self.profile_id}, candidate_profile_id={self.candidate_profile_id}, score={self.score})>"
+
+class SeenPair(Base):
+    __tablename__ = 'seen_pairs'
+    __table_args__ = (
+        # Expired pairs are deleted in bulk
+        Index('ix_seen_pairs_expires_at', 'expires_at'),
+    )
+    
+    # Candidates are not offered to the user again until the pair expires
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    candidate_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    rejected = Column(Boolean, nullable=False, default=False)  # Declined rather than only offered
+    answered_at = Column(DateTime, nullable=True)  # When the user liked or declined; counts against the daily quota
+    expires_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<SeenPair(user_id={self.user_id}, candidate_id={self.candidate_id}, rejected={self.rejected})>"
+
+class DailySlate(Base):
+    __tablename__ = 'daily_slates'
+    
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    slate_date = Column(Date, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    candidate_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    score = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<DailySlate(user_id={self.user_id}, slate_date={self.slate_date}, rank={self.rank}, candidate_id={self.candidate_id})>"
+
+class PipelineCheckpoint(Base):
+    __tablename__ = 'pipeline_checkpoints'
+    
+    run_date = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    completed_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<PipelineCheckpoint(run_date={self.run_date}, user_id={self.user_id})>"
+
+class PersistedState(Base):
+    __tablename__ = 'persisted_state'
+    __table_args__ = (
+        # Each worker process loads the entries of its own shard of users
+        Index('ix_persisted_state_owner_id', 'kind', 'owner_id'),
+    )
+    
+    kind = Column(String(100), primary_key=True)  # 'user', 'chat' or 'conversation:<name>'
+    key = Column(String(100), primary_key=True)
+    owner_id = Column(BigInteger)  # Telegram user id the entry belongs to
+    data = Column(LargeBinary, nullable=False)  # Pickled value
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<PersistedState(kind={self.kind}, key={self.key})>"
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # Delivery workers scan undelivered events that are due, oldest first
+        Index('ix_outbox_events_pending', 'delivered_at', 'failed_at', 'next_attempt_at'),
+        Index('ix_outbox_events_claimed_by', 'claimed_by'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # 'mutual_match', 'new_like' or 'conversation_created'
+    recipient_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    payload = Column(JSON, nullable=True)
+    dedup_key = Column(String(200), unique=True, nullable=False)  # Enqueuing the same event twice is a no-op
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow)
+    claimed_by = Column(String(50), nullable=True)  # Delivery batch currently sending the event
+    claimed_until = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    delivered_at = Column(DateTime, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # Set once attempts are exhausted
+    
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, kind={self.kind}, recipient_id={self.recipient_id})>"
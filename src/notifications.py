@@ -0,0 +1,255 @@
+"""
+Notification outbox for the Traditional Matchmaking Telegram Bot.
+
+Handlers never message other users directly. Instead, the unit of work that
+changes a match adds OutboxEvent rows in the same transaction (see
+enqueue_event), so a notification exists exactly when the change it
+announces was committed. A background loop in every bot process claims due
+events in batches, merges each recipient's events into one message, sends it
+through the outbound send queue as a bulk notification and marks the events
+delivered. Failed deliveries are retried with exponential backoff.
+
+Every event has a unique dedup key, so enqueuing it twice is harmless, and a
+claimed batch is leased to one delivery loop, so running several bot
+processes does not send an event twice. In worker mode each worker only
+claims the events of recipients in its own shard, so every chat is sent to
+by one process and its per-chat rate limit holds.
+"""
+
+import asyncio
+import datetime
+import logging
+import uuid
+
+from sqlalchemy import BigInteger, cast, or_
+
+from src.config import (
+    DEFAULT_LANGUAGE, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE_SECONDS,
+    OUTBOX_RETRY_SECONDS, OUTBOX_MAX_ATTEMPTS
+)
+from src.database import get_session, run_db
+from src.models import OutboxEvent, User, UserSettings
+from src.sender import notify
+from src.translations import get_text
+
+logger = logging.getLogger(__name__)
+
+# Event kinds, in the order they appear in a combined message
+MUTUAL_MATCH = 'mutual_match'
+CONVERSATION_CREATED = 'conversation_created'
+NEW_LIKE = 'new_like'
+EVENT_KINDS = (MUTUAL_MATCH, CONVERSATION_CREATED, NEW_LIKE)
+
+# (shard, shards) of the recipients this process delivers to
+_delivery_shard = (0, 1)
+
+def set_delivery_shard(shard, shards):
+    """
+    Deliver only to recipients whose Telegram id maps to a shard.
+
+    Args:
+        shard: Index of this worker
+        shards: Number of workers
+    """
+    global _delivery_shard
+    _delivery_shard = (shard, shards)
+
+def enqueue_event(session, kind, recipient_id, dedup_key, payload=None):
+    """
+    Add a notification to the outbox as part of the caller's transaction.
+
+    Nothing is committed here; the event is stored together with the
+    caller's changes or not at all.
+
+    Args:
+        session: Session of the unit of work announcing the change
+        kind: One of EVENT_KINDS
+        recipient_id: Internal id of the user to notify
+        dedup_key: Unique key of the event; an existing event with the same
+            key is kept instead
+        payload: JSON-serialisable details, e.g. {'name': ...}
+    """
+    if session.query(OutboxEvent.id).filter(OutboxEvent.dedup_key == dedup_key).first() is None:
+        session.add(OutboxEvent(kind=kind, recipient_id=recipient_id, dedup_key=dedup_key, payload=payload))
+
+def _due(now):
+    """Filter of events that are waiting for delivery and not leased."""
+    return (
+        OutboxEvent.delivered_at.is_(None),
+        OutboxEvent.failed_at.is_(None),
+        OutboxEvent.next_attempt_at <= now,
+        or_(OutboxEvent.claimed_until.is_(None), OutboxEvent.claimed_until < now)
+    )
+
+def claim_events(limit=OUTBOX_BATCH_SIZE, lease=OUTBOX_LEASE_SECONDS):
+    """
+    Lease a batch of due events of this process's shard to the caller.
+
+    Args:
+        limit: Maximum number of events
+        lease: Seconds before unfinished events may be claimed again
+
+    Returns:
+        Event dictionaries with 'id', 'kind', 'payload', the recipient's
+        'telegram_id' and 'language', oldest first
+    """
+    session = get_session()
+    try:
+        now = datetime.datetime.utcnow()
+        token = uuid.uuid4().hex
+        query = session.query(OutboxEvent.id).filter(*_due(now))
+        shard, shards = _delivery_shard
+        if shards > 1:
+            # Chats are sent to by the worker owning them (see workers.shard_for)
+            query = query.join(User, User.id == OutboxEvent.recipient_id).filter(
+                cast(User.telegram_id, BigInteger) % shards == shard
+            )
+        ids = [event_id for event_id, in query.order_by(OutboxEvent.id).limit(limit)]
+        if not ids:
+            return []
+
+        # Re-checking the filter keeps two processes from claiming the same event
+        session.query(OutboxEvent).filter(OutboxEvent.id.in_(ids), *_due(now)).update(
+            {OutboxEvent.claimed_by: token,
+             OutboxEvent.claimed_until: now + datetime.timedelta(seconds=lease)},
+            synchronize_session=False
+        )
+        session.commit()
+
+        rows = session.query(
+            OutboxEvent.id, OutboxEvent.kind, OutboxEvent.payload,
+            User.telegram_id, UserSettings.language_preference
+        ).join(User, User.id == OutboxEvent.recipient_id).outerjoin(
+            UserSettings, UserSettings.user_id == User.id
+        ).filter(OutboxEvent.claimed_by == token).order_by(OutboxEvent.id)
+
+        return [{
+            'id': event_id,
+            'kind': kind,
+            'payload': payload or {},
+            'telegram_id': telegram_id,
+            'language': language or DEFAULT_LANGUAGE
+        } for event_id, kind, payload, telegram_id, language in rows]
+    finally:
+        session.close()
+
+def mark_delivered(event_ids):
+    """Record that events were sent, so they are never sent again."""
+    session = get_session()
+    try:
+        session.query(OutboxEvent).filter(OutboxEvent.id.in_(event_ids)).update(
+            {OutboxEvent.delivered_at: datetime.datetime.utcnow(), OutboxEvent.claimed_until: None},
+            synchronize_session=False
+        )
+        session.commit()
+    finally:
+        session.close()
+
+def mark_failed(event_ids):
+    """Schedule failed events for another attempt, or give up after OUTBOX_MAX_ATTEMPTS."""
+    session = get_session()
+    try:
+        now = datetime.datetime.utcnow()
+        for event in session.query(OutboxEvent).filter(OutboxEvent.id.in_(event_ids)):
+            event.attempts = (event.attempts or 0) + 1
+            event.claimed_until = None
+            if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                event.failed_at = now
+            else:
+                event.next_attempt_at = now + datetime.timedelta(
+                    seconds=OUTBOX_RETRY_SECONDS * 2 ** (event.attempts - 1)
+                )
+        session.commit()
+    finally:
+        session.close()
+
+def render_notification(events, language):
+    """
+    Combine one recipient's events into a single message.
+
+    Repeated events (several new likes, the same match twice) appear once.
+
+    Args:
+        events: Event dictionaries of one recipient
+        language: Recipient's language code
+
+    Returns:
+        Message text
+    """
+    lines = []
+    for kind in EVENT_KINDS:
+        names = []
+        for event in events:
+            if event['kind'] == kind and event['payload'].get('name') not in names:
+                names.append(event['payload'].get('name'))
+        if kind == NEW_LIKE and names:
+            # Likes are anonymous until they are mutual
+            names = [None]
+        for name in names:
+            key = "group_created" if kind == CONVERSATION_CREATED else kind
+            lines.append(get_text(key, lang=language, name=name) if name else get_text(key, lang=language))
+    return "\n\n".join(lines)
+
+async def deliver_pending(bot, limit=OUTBOX_BATCH_SIZE):
+    """
+    Claim one batch of due events and send one message per recipient.
+
+    Args:
+        bot: Bot sending the notifications
+        limit: Maximum number of events in the batch
+
+    Returns:
+        Number of events claimed
+    """
+    events = await run_db(claim_events, limit)
+    if not events:
+        return 0
+
+    recipients = {}
+    for event in events:
+        recipients.setdefault(event['telegram_id'], []).append(event)
+
+    async def deliver(telegram_id, recipient_events):
+        text = render_notification(recipient_events, recipient_events[0]['language'])
+        await notify(bot, int(telegram_id), text)
+
+    results = await asyncio.gather(*(deliver(telegram_id, recipient_events)
+                                     for telegram_id, recipient_events in recipients.items()),
+                                   return_exceptions=True)
+
+    delivered, failed = [], []
+    for (telegram_id, recipient_events), result in zip(recipients.items(), results):
+        ids = [event['id'] for event in recipient_events]
+        if isinstance(result, Exception):
+            logger.warning("Notification to %s failed: %s", telegram_id, result)
+            failed.extend(ids)
+        else:
+            delivered.extend(ids)
+
+    if delivered:
+        await run_db(mark_delivered, delivered)
+    if failed:
+        await run_db(mark_failed, failed)
+    return len(events)
+
+async def run_delivery(bot, interval=OUTBOX_POLL_INTERVAL, limit=OUTBOX_BATCH_SIZE):
+    """Deliver outbox events until cancelled, polling every `interval` seconds when idle."""
+    while True:
+        try:
+            claimed = await deliver_pending(bot, limit)
+        except Exception:
+            logger.exception("Delivering notifications failed")
+            claimed = 0
+        if claimed < limit:
+            await asyncio.sleep(interval)
+
+async def start_delivery(application):
+    """post_init hook starting the delivery loop of an application."""
+    application.bot_data['outbox_delivery'] = asyncio.create_task(run_delivery(application.bot))
+
+async def stop_delivery(application):
+    """post_stop hook cancelling the delivery loop; unsent events stay in the outbox."""
+    task = application.bot_data.pop('outbox_delivery', None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
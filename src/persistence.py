@@ -0,0 +1,199 @@
+"""
+Database-backed conversation persistence for the Traditional Matchmaking Telegram Bot.
+
+Stores user data, chat data and ConversationHandler states in the
+persisted_state table, so a user's conversation survives restarts and can be
+served by whichever worker process owns the user's shard.
+
+Writes are batched behind the handlers: changed values are collected in
+memory and written together in one transaction shortly afterwards, and
+values whose pickled form did not change since they were last stored are
+never written again.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.config import PERSISTENCE_UPDATE_INTERVAL, PERSISTENCE_FLUSH_DELAY
+from src.database import get_session, run_db
+from src.models import PersistedState
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = 'user'
+CHAT_DATA = 'chat'
+CONVERSATION_PREFIX = 'conversation:'
+
+def _digest(data):
+    """Short fingerprint of a pickled value, used to detect changes."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class SQLPersistence(BasePersistence):
+    """
+    Persistence backend storing pickled state in the database.
+
+    With shards > 1 only the entries of users whose Telegram id maps to the
+    given shard are loaded; each worker process is the only writer of its
+    shard, so stored values never have to be refreshed from the database.
+    Bot data and callback data are not stored.
+    """
+
+    def __init__(self, shard=0, shards=1, session_factory=None, update_interval=PERSISTENCE_UPDATE_INTERVAL,
+                 flush_delay=PERSISTENCE_FLUSH_DELAY):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.shard = shard
+        self.shards = shards
+        self.session_factory = session_factory or get_session
+        self.flush_delay = flush_delay
+        # (kind, key) -> digest of the stored value
+        self._stored = {}
+        # (kind, key) -> (owner id, pickled value or None to delete), not yet written
+        self._pending = {}
+        self._flush_task = None
+        self.stats = {'batches': 0, 'written': 0, 'unchanged': 0}
+
+    # Blocking database work, run through run_db
+
+    def _load(self, kind):
+        """Return {key: pickled value} of every entry of a kind in this shard."""
+        session = self.session_factory()
+        try:
+            query = session.query(PersistedState.key, PersistedState.data).filter(PersistedState.kind == kind)
+            if self.shards > 1:
+                query = query.filter(PersistedState.owner_id % self.shards == self.shard)
+            return {key: data for key, data in query}
+        finally:
+            session.close()
+
+    def _write_batch(self, batch):
+        """Replace or delete every entry of a batch in one transaction."""
+        session = self.session_factory()
+        try:
+            kinds = {}
+            for (kind, key), change in batch.items():
+                kinds.setdefault(kind, {})[key] = change
+            now = datetime.datetime.utcnow()
+            for kind, changes in kinds.items():
+                session.query(PersistedState).filter(
+                    PersistedState.kind == kind, PersistedState.key.in_(list(changes))
+                ).delete(synchronize_session=False)
+                rows = [{"kind": kind, "key": key, "owner_id": owner_id, "data": data, "updated_at": now}
+                        for key, (owner_id, data) in changes.items() if data is not None]
+                if rows:
+                    session.execute(PersistedState.__table__.insert(), rows)
+            session.commit()
+        finally:
+            session.close()
+
+    # Write-behind buffer
+
+    async def _get(self, kind):
+        """Load a kind and remember what is stored, so unchanged values are not rewritten."""
+        entries = await run_db(self._load, kind)
+        for key, data in entries.items():
+            self._stored[(kind, key)] = _digest(data)
+        return {key: pickle.loads(data) for key, data in entries.items()}
+
+    def _set(self, kind, key, owner_id, value):
+        """Queue a value (None deletes it) unless it matches what is already stored."""
+        data = None if value is None else pickle.dumps(value)
+        digest = None if data is None else _digest(data)
+        entry = (kind, key)
+        if entry not in self._pending and self._stored.get(entry) == digest:
+            self.stats['unchanged'] += 1
+            return
+        self._pending[entry] = (owner_id, data)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self._write_pending()
+        except Exception:
+            logger.exception("Writing conversation state failed; retrying with the next change")
+
+    async def _write_pending(self):
+        """Write every queued change in one batch."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await run_db(self._write_batch, batch)
+        except Exception:
+            # Keep the failed changes unless a newer value was queued meanwhile
+            for entry, change in batch.items():
+                self._pending.setdefault(entry, change)
+            raise
+        for entry, (_, data) in batch.items():
+            if data is None:
+                self._stored.pop(entry, None)
+            else:
+                self._stored[entry] = _digest(data)
+        self.stats['batches'] += 1
+        self.stats['written'] += len(batch)
+
+    # BasePersistence interface
+
+    async def get_user_data(self):
+        return {int(key): value for key, value in (await self._get(USER_DATA)).items()}
+
+    async def get_chat_data(self):
+        return {int(key): value for key, value in (await self._get(CHAT_DATA)).items()}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        entries = await self._get(CONVERSATION_PREFIX + name)
+        return {tuple(json.loads(key)): state for key, state in entries.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        # Conversation keys end with the user id when the handler tracks users
+        self._set(CONVERSATION_PREFIX + name, json.dumps(list(key)), key[-1], new_state)
+
+    async def update_user_data(self, user_id, data):
+        self._set(USER_DATA, str(user_id), user_id, dict(data))
+
+    async def update_chat_data(self, chat_id, data):
+        # Private chats share the user's id
+        self._set(CHAT_DATA, str(chat_id), chat_id, dict(data))
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._set(USER_DATA, str(user_id), user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._set(CHAT_DATA, str(chat_id), chat_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write every queued change now (called by the application on shutdown)."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_pending()
@@ -0,0 +1,250 @@
+"""
+Nightly match generation pipeline for the Traditional Matchmaking Telegram Bot.
+
+Streams active users in chunks, scores each user's candidates in a pool of
+worker processes and stores a daily slate of at most MAX_DAILY_MATCHES
+matches per user. A checkpoint is written with each user's slate, so an
+interrupted run resumes where it stopped.
+
+Usage:
+    python generate_matches.py [--date YYYY-MM-DD] [--workers N] [--chunk-size N]
+"""
+
+import argparse
+import datetime
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+from sqlalchemy import exists, and_
+from sqlalchemy.orm import sessionmaker, joinedload, selectinload
+
+from src.config import DB_URI, MAX_DAILY_MATCHES
+from src.models import User, Profile, DailySlate, PipelineCheckpoint, AccountStatus
+from src.candidates import find_candidates, find_candidate_ids
+from src.features import feature_store
+from src.score_cache import cached_top_k, score_cache
+from src.snapshot import get_profile_snapshot
+from src.seen_pairs import record_seen_pairs, expire_seen_pairs, utc_today
+
+logger = logging.getLogger(__name__)
+
+# Session factory of a worker process, set by _init_worker
+_worker_session_factory = None
+
+def _init_worker(db_uri):
+    """Give each worker process its own engine and session factory."""
+    from src.database import create_db_engine
+
+    global _worker_session_factory
+    _worker_session_factory = sessionmaker(bind=create_db_engine(db_uri))
+
+def select_slate(session, user, quota=MAX_DAILY_MATCHES):
+    """
+    Pick a user's best candidates for the day.
+
+    Candidates are scored from the shared profile snapshot when one has been
+    exported, otherwise from their loaded profiles.
+
+    Args:
+        session: Database session
+        user: User to build the slate for (must have a profile)
+        quota: Maximum number of matches in the slate
+
+    Returns:
+        List of (candidate_id, score) tuples, best first
+    """
+    snapshot = get_profile_snapshot()
+    if snapshot is not None:
+        candidate_ids, scores = snapshot.score(
+            feature_store.get(user.profile), feature_store.vocabularies, find_candidate_ids(session, user)
+        )
+        # The snapshot scores every candidate in one matrix pass; deal-breaker
+        # pairs score 0 and are never offered
+        return [(int(candidate_ids[index]), float(scores[index]))
+                for index in np.argsort(-scores, kind='stable')[:quota] if scores[index] > 0]
+
+    candidates = find_candidates(session, user)
+    if not candidates:
+        return []
+    selected = cached_top_k(
+        feature_store.get(user.profile),
+        feature_store.get_many([candidate.profile for candidate in candidates]),
+        quota
+    )
+    return [(candidates[index].id, score) for index, score in selected]
+
+def score_chunk(user_ids, session_factory=None):
+    """
+    Build slates for a chunk of users.
+
+    Args:
+        user_ids: Internal ids of the users in the chunk
+        session_factory: Session factory (defaults to the worker's own)
+
+    Returns:
+        List of (user_id, slate) tuples
+    """
+    session = (session_factory or _worker_session_factory)()
+    try:
+        users = session.query(User).options(
+            joinedload(User.profile).selectinload(Profile.interests), joinedload(User.settings)
+        ).filter(User.id.in_(user_ids)).order_by(User.id).all()
+        results = [(user.id, select_slate(session, user)) for user in users if user.profile]
+        # Cumulative for this process: each worker keeps its own cache
+        logger.info("Scored %d users; score cache hit rate %.1f%% (%d hits, %d shared hits, %d misses, %d evictions)",
+                    len(results), score_cache.hit_rate * 100, score_cache.stats['hits'],
+                    score_cache.stats['shared_hits'], score_cache.stats['misses'], score_cache.stats['evictions'])
+        return results
+    finally:
+        session.close()
+
+def pending_user_chunks(session, run_date, chunk_size):
+    """
+    Yield ids of active users with a profile and no checkpoint for the run, in chunks.
+
+    Each chunk is read by keyset (ids after the previous chunk's last) when
+    it is requested, so the pending ids are never all held in memory.
+
+    Args:
+        session: Database session
+        run_date: Date the slates are generated for
+        chunk_size: Number of user ids per chunk
+
+    Yields:
+        Lists of user ids
+    """
+    last_id = 0
+    while True:
+        ids = [row.id for row in session.query(User.id).join(Profile, Profile.user_id == User.id).filter(
+            User.id > last_id,
+            User.account_status == AccountStatus.ACTIVE,
+            ~exists().where(and_(
+                PipelineCheckpoint.run_date == run_date,
+                PipelineCheckpoint.user_id == User.id
+            ))
+        ).order_by(User.id).limit(chunk_size)]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+def write_slates(session, run_date, results):
+    """
+    Store slates and their checkpoints in a single transaction.
+
+    Every slate candidate is also recorded as seen, so later slates offer
+    other candidates until the pair expires.
+
+    Args:
+        session: Database session
+        run_date: Date the slates are generated for
+        results: List of (user_id, slate) tuples
+    """
+    user_ids = [user_id for user_id, _ in results]
+    if not user_ids:
+        return
+
+    session.query(DailySlate).filter(
+        DailySlate.slate_date == run_date, DailySlate.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+
+    rows = [
+        {"user_id": user_id, "slate_date": run_date, "rank": rank,
+         "candidate_id": candidate_id, "score": score}
+        for user_id, slate in results
+        for rank, (candidate_id, score) in enumerate(slate)
+    ]
+    if rows:
+        session.execute(DailySlate.__table__.insert(), rows)
+        record_seen_pairs(session, [(row["user_id"], row["candidate_id"]) for row in rows])
+
+    session.execute(PipelineCheckpoint.__table__.insert(), [
+        {"run_date": run_date, "user_id": user_id, "completed_at": datetime.datetime.utcnow()}
+        for user_id in user_ids
+    ])
+    session.commit()
+
+def generate_daily_slates(session_factory, run_date=None, workers=1, chunk_size=500, db_uri=DB_URI):
+    """
+    Generate the daily slate of every active user that does not have one yet.
+
+    Args:
+        session_factory: Session factory used for reading chunks and writing results
+        run_date: Date the slates are generated for (defaults to today, UTC)
+        workers: Number of worker processes; 1 scores in this process
+        chunk_size: Number of users per work item
+        db_uri: Database URI the worker processes connect to
+
+    Returns:
+        Dictionary with the number of users and slate entries written
+    """
+    run_date = run_date or utc_today()
+    session = session_factory()
+    # Chunks are read lazily, by the pool's task thread when there are workers, so they get their own session
+    reader = session_factory()
+    stats = {'users': 0, 'matches': 0}
+
+    try:
+        expire_seen_pairs(session)
+        chunks = pending_user_chunks(reader, run_date, chunk_size)
+        logger.info("Generating slates for %s in chunks of %d users", run_date, chunk_size)
+
+        if workers > 1:
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(db_uri,)) as pool:
+                for results in pool.imap_unordered(score_chunk, chunks):
+                    write_slates(session, run_date, results)
+                    stats['users'] += len(results)
+                    stats['matches'] += sum(len(slate) for _, slate in results)
+        else:
+            for chunk in chunks:
+                results = score_chunk(chunk, session_factory)
+                write_slates(session, run_date, results)
+                stats['users'] += len(results)
+                stats['matches'] += sum(len(slate) for _, slate in results)
+    finally:
+        reader.close()
+        session.close()
+
+    return stats
+
+def get_daily_slate(session, user_id, slate_date=None):
+    """
+    Return a user's precomputed slate for a day.
+
+    Args:
+        session: Database session
+        user_id: Internal id of the user
+        slate_date: Date of the slate (defaults to today, UTC)
+
+    Returns:
+        List of DailySlate ordered by rank (empty if none was generated)
+    """
+    return session.query(DailySlate).filter(
+        DailySlate.user_id == user_id,
+        DailySlate.slate_date == (slate_date or utc_today())
+    ).order_by(DailySlate.rank).all()
+
+def main():
+    """Run the pipeline from the command line."""
+    parser = argparse.ArgumentParser(description="Generate daily match slates.")
+    parser.add_argument("--date", type=datetime.date.fromisoformat, default=None,
+                        help="Slate date (YYYY-MM-DD), defaults to today (UTC)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Users per work item")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    from src.database import init_db, session_factory
+
+    init_db()
+    start = time.perf_counter()
+    stats = generate_daily_slates(session_factory, args.date, args.workers, args.chunk_size)
+    logger.info("Wrote %d matches for %d users in %.1fs",
+                stats['matches'], stats['users'], time.perf_counter() - start)
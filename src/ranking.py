@@ -0,0 +1,162 @@
+"""
+Bounded top-K ranking for the Traditional Matchmaking Telegram Bot.
+
+Picking the best MAX_DAILY_MATCHES of thousands of candidates does not need
+an exact score for every candidate. Each sub-score is at most 100, so after
+some factors of a pair have been scored the overall score is bounded by the
+weighted sum so far plus 100 times the weights still outstanding. Factors are
+evaluated cheapest first (deal-breakers, then the table lookups, then the
+set overlaps), and a candidate is dropped as soon as its bound falls below the
+K-th best score in a min-heap of the current selection.
+
+Candidates that survive are scored with the same summation order as
+calculate_overall_compatibility, so the selection and its scores are exactly
+those of an exhaustive ranking.
+"""
+
+import heapq
+
+from src.config import MAX_DAILY_MATCHES
+from src.matching import (
+    calculate_religious_compatibility, calculate_family_values_compatibility,
+    calculate_lifestyle_compatibility, calculate_profile_personality_compatibility,
+    calculate_profile_horoscope_compatibility, has_dealbreakers
+)
+from src.features import (
+    features_religious_compatibility, features_family_values_compatibility,
+    features_lifestyle_compatibility, features_personality_compatibility,
+    features_horoscope_compatibility, features_have_dealbreakers, default_weights
+)
+
+# (weight key, sub-score function), cheapest first
+PROFILE_FACTORS = (
+    ('horoscope', calculate_profile_horoscope_compatibility),
+    ('personality', calculate_profile_personality_compatibility),
+    ('lifestyle', calculate_lifestyle_compatibility),
+    ('religious', calculate_religious_compatibility),
+    ('family', calculate_family_values_compatibility)
+)
+FEATURE_FACTORS = (
+    ('horoscope', features_horoscope_compatibility),
+    ('personality', features_personality_compatibility),
+    ('lifestyle', features_lifestyle_compatibility),
+    ('religious', features_religious_compatibility),
+    ('family', features_family_values_compatibility)
+)
+
+# Slack on the bound, so float rounding never prunes a candidate that ties
+BOUND_EPSILON = 1e-9
+
+def _overall(scores, weights):
+    """Weighted sum in the order of calculate_overall_compatibility."""
+    return (
+        scores['religious'] * weights['religious'] +
+        scores['personality'] * weights['personality'] +
+        scores['family'] * weights['family'] +
+        scores['lifestyle'] * weights['lifestyle'] +
+        scores['horoscope'] * weights['horoscope']
+    )
+
+def rank_top_k(seeker, candidates, k, weights, factors, dealbreakers, stats=None, scored=None):
+    """
+    Select the k best-scoring candidates, pruning those that cannot make the cut.
+
+    Args:
+        seeker: Profile or record of the user looking for matches
+        candidates: Sequence of candidate profiles or records
+        k: Number of candidates to select
+        weights: Dictionary of weights for the compatibility factors
+        factors: Ordered (weight key, sub-score function) pairs
+        dealbreakers: Function returning True for a blocked pair
+        stats: Optional dictionary receiving 'scored', 'pruned' and 'blocked' counts
+        scored: Optional list receiving (candidate index, score) of every
+            candidate whose exact score was computed, blocked pairs scoring 0
+
+    Returns:
+        List of (candidate index, score) tuples, best first; ties keep the
+        candidates' order and blocked pairs are left out
+    """
+    counts = {'scored': 0, 'pruned': 0, 'blocked': 0}
+    if k <= 0:
+        if stats is not None:
+            stats.update(counts)
+        return []
+
+    # Upper bound still available after each factor (negative weights add at most 0)
+    remaining = [0.0] * (len(factors) + 1)
+    for position in range(len(factors) - 1, -1, -1):
+        remaining[position] = remaining[position + 1] + max(weights[factors[position][0]], 0) * 100
+
+    # Min-heap of (score, -index): the root is the K-th best, the later candidate losing ties
+    heap = []
+
+    for index, candidate in enumerate(candidates):
+        if dealbreakers(seeker, candidate):
+            counts['blocked'] += 1
+            if scored is not None:
+                scored.append((index, 0))
+            continue
+
+        threshold = heap[0][0] - BOUND_EPSILON if len(heap) == k else None
+        scores = {}
+        partial = 0.0
+        for position, (key, score_function) in enumerate(factors):
+            if threshold is not None and partial + remaining[position] < threshold:
+                break
+            scores[key] = score_function(seeker, candidate)
+            partial += scores[key] * weights[key]
+        else:
+            counts['scored'] += 1
+            score = _overall(scores, weights)
+            if scored is not None:
+                scored.append((index, score))
+            # Blocked pairs score 0 in an exhaustive ranking and are never shown
+            if score <= 0:
+                continue
+            entry = (score, -index)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            continue
+        counts['pruned'] += 1
+
+    if stats is not None:
+        stats.update(counts)
+    return [(-negative_index, score) for score, negative_index in sorted(heap, reverse=True)]
+
+def top_k_matches(seeker_profile, candidate_profiles, k=MAX_DAILY_MATCHES, weights=None, stats=None):
+    """
+    Rank profiles by calculate_overall_compatibility and return the k best.
+
+    Args:
+        seeker_profile: Profile of the user looking for matches
+        candidate_profiles: List of candidate profiles
+        k: Number of candidates to select
+        weights: Dictionary of weights for different compatibility factors
+        stats: Optional dictionary receiving pruning counts
+
+    Returns:
+        List of (candidate index, score) tuples, best first
+    """
+    return rank_top_k(seeker_profile, candidate_profiles, k, weights or default_weights(),
+                      PROFILE_FACTORS, has_dealbreakers, stats)
+
+def top_k_features(seeker_features, candidate_features, k=MAX_DAILY_MATCHES, weights=None, stats=None,
+                   scored=None):
+    """
+    Rank encoded records by calculate_features_compatibility and return the k best.
+
+    Args:
+        seeker_features: ProfileFeatures of the user looking for matches
+        candidate_features: List of candidate ProfileFeatures
+        k: Number of candidates to select
+        weights: Dictionary of weights for different compatibility factors
+        stats: Optional dictionary receiving pruning counts
+        scored: Optional list receiving every exactly scored (candidate index, score)
+
+    Returns:
+        List of (candidate index, score) tuples, best first
+    """
+    return rank_top_k(seeker_features, candidate_features, k, weights or default_weights(),
+                      FEATURE_FACTORS, features_have_dealbreakers, stats, scored)
@@ -0,0 +1,433 @@
+"""
+Data access for the bot handlers of the Traditional Matchmaking Telegram Bot.
+
+Every function here is a self-contained unit of work: it opens a session,
+does its queries, commits if needed and closes the session before returning
+plain Python values. Handlers run them through database.run_db so that
+blocking queries never stall the event loop.
+"""
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+
+from src.config import DEFAULT_LANGUAGE, MAX_DAILY_MATCHES
+from src.database import get_session
+from src.models import (
+    User, Profile, Match, Conversation, UserSettings, MatchCacheEntry, DailySlate,
+    Gender, ReligiosityLevel, CoveringStyle, MatchStatus
+)
+from src.features import feature_store, features_compatibility_breakdown
+from src.snapshot import record_profile_change
+from src.match_cache import get_ranked_matches, invalidate_user
+from src.pipeline import get_daily_slate
+from src.notifications import enqueue_event, MUTUAL_MATCH, CONVERSATION_CREATED, NEW_LIKE
+from src.user_cache import user_cache, load_user_state, remember_user
+from src.seen_pairs import record_seen_pairs, count_answered_today, utc_today
+
+# Relationships each view reads, loaded with the user instead of lazily one
+# round-trip at a time
+ACCOUNT_OPTIONS = (joinedload(User.profile), joinedload(User.settings))
+MATCHING_OPTIONS = (joinedload(User.profile).selectinload(Profile.interests), joinedload(User.settings))
+CONVERSATION_OPTIONS = (selectinload(Conversation.participants),)
+
+def get_user_by_telegram_id(session, telegram_id, options=()):
+    """
+    Return the User with the given Telegram id, or None.
+
+    Args:
+        session: Database session
+        telegram_id: Telegram user id
+        options: Loader options for the relationships the caller will read
+    """
+    return session.query(User).options(*options).filter(User.telegram_id == str(telegram_id)).first()
+
+def get_or_create_user(telegram_id, username, first_name, language_code):
+    """
+    Load a user's language and profile state, registering new users.
+
+    Args:
+        telegram_id: Telegram user id
+        username: Telegram username
+        first_name: Telegram first name
+        language_code: Telegram client language
+
+    Returns:
+        Dictionary with 'language' and 'has_profile'
+    """
+    # Returning users are usually answered from the cache without a query
+    state = user_cache.get(telegram_id)
+    if state is not None:
+        return {'language': state.language, 'has_profile': state.has_profile}
+
+    session = get_session()
+    try:
+        state = load_user_state(session, telegram_id)
+
+        if state:
+            # User exists, load their language preference
+            return {'language': state.language, 'has_profile': state.has_profile}
+
+        # New user, create record
+        session.add(User(
+            telegram_id=str(telegram_id),
+            username=username,
+            first_name=first_name,
+            language_code=language_code or DEFAULT_LANGUAGE
+        ))
+        session.commit()
+        return {'language': language_code or DEFAULT_LANGUAGE, 'has_profile': False}
+    finally:
+        session.close()
+
+def save_language_preference(telegram_id, language):
+    """
+    Store a user's language preference, creating their settings if needed.
+
+    Returns:
+        True if the user exists, False otherwise
+    """
+    session = get_session()
+    try:
+        user = get_user_by_telegram_id(session, telegram_id, ACCOUNT_OPTIONS)
+        if not user:
+            return False
+
+        if not user.settings:
+            # Create settings if they don't exist
+            session.add(UserSettings(user_id=user.id, language_preference=language))
+        else:
+            # Update existing settings
+            user.settings.language_preference = language
+
+        session.commit()
+        user_cache.invalidate(telegram_id)
+        return True
+    finally:
+        session.close()
+
+def save_profile_data(telegram_id, data):
+    """
+    Create or update a user's profile from the values collected during onboarding.
+
+    Args:
+        telegram_id: Telegram user id
+        data: The conversation's user_data
+
+    Returns:
+        True if the profile was saved, False if the user does not exist
+    """
+    session = get_session()
+    try:
+        user = get_user_by_telegram_id(session, telegram_id, ACCOUNT_OPTIONS)
+        if not user:
+            return False
+
+        # Check if user already has a profile
+        if not user.profile:
+            # Create new profile
+            profile = Profile(
+                user_id=user.id,
+                age=data.get('age'),
+                gender=Gender.MALE if data.get('gender') == 'male' else Gender.FEMALE,
+                nationality=data.get('nationality'),
+                city=data.get('city'),
+                education_level=data.get('education'),
+                profession=data.get('profession'),
+                religiosity_level=ReligiosityLevel(data.get('religiosity', 'moderate')),
+                prayer_habits=data.get('prayer_habits'),
+                personal_covering=CoveringStyle(data.get('covering', 'none')) if data.get('gender') == 'female' else None,
+                personality_type=data.get('personality_type'),
+                personality_details=data.get('personality_details'),
+                birth_date=data.get('birth_date'),
+                birth_time=data.get('birth_time'),
+                birth_location=data.get('birth_location'),
+                zodiac_sign=data.get('zodiac_sign')
+            )
+            session.add(profile)
+        else:
+            # Update existing profile
+            profile = user.profile
+            profile.age = data.get('age', profile.age)
+            profile.gender = Gender.MALE if data.get('gender') == 'male' else Gender.FEMALE
+            profile.nationality = data.get('nationality', profile.nationality)
+            profile.city = data.get('city', profile.city)
+            profile.education_level = data.get('education', profile.education_level)
+            profile.profession = data.get('profession', profile.profession)
+
+            if 'religiosity' in data:
+                profile.religiosity_level = ReligiosityLevel(data.get('religiosity'))
+
+            profile.prayer_habits = data.get('prayer_habits', profile.prayer_habits)
+
+            if data.get('gender') == 'female' and 'covering' in data:
+                profile.personal_covering = CoveringStyle(data.get('covering'))
+
+            if 'personality_type' in data:
+                profile.personality_type = data.get('personality_type')
+                profile.personality_details = data.get('personality_details')
+
+            if 'birth_date' in data:
+                profile.birth_date = data.get('birth_date')
+                profile.birth_time = data.get('birth_time')
+                profile.birth_location = data.get('birth_location')
+                profile.zodiac_sign = data.get('zodiac_sign')
+
+            # Cached pair scores of the old version no longer match
+            profile.version = (profile.version or 0) + 1
+
+        # Rankings that involve this user are now stale
+        invalidate_user(session, user.id)
+        session.commit()
+        user_cache.invalidate(telegram_id)
+
+        # Encode the saved profile once so matching never re-derives its features,
+        # and log it for processes scoring from the profile snapshot
+        record_profile_change(feature_store.update(profile), feature_store.vocabularies)
+        return True
+    finally:
+        session.close()
+
+def _user_features(session, user_id, user=None):
+    """Encoded profile of a user, loading the profile only if it was never encoded."""
+    record = feature_store.find_user(user_id)
+    if record is not None:
+        return record
+    if user is not None and user.profile:
+        return feature_store.get(user.profile)
+    profile = session.query(Profile).options(
+        selectinload(Profile.interests), joinedload(Profile.user).joinedload(User.settings)
+    ).filter(
+        Profile.user_id == user_id
+    ).first()
+    return feature_store.get(profile) if profile else None
+
+def load_next_match(telegram_id, match_index):
+    """
+    Load the potential match at a position in the user's ranking.
+
+    Args:
+        telegram_id: Telegram user id
+        match_index: Cursor into the ranking (wraps around at the end)
+
+    Returns:
+        Dictionary with a 'status' of 'no_profile', 'no_matches' (also once
+        the user answered MAX_DAILY_MATCHES candidates today) or 'ok'; for
+        'ok' it also holds the cursor 'index', the candidate's display fields,
+        the compatibility 'score' and its per-factor 'sub_scores'
+    """
+    session = get_session()
+    try:
+        state, user = user_cache.get(telegram_id), None
+        if state is None:
+            # Load everything ranking may need in the query resolving the user
+            user = get_user_by_telegram_id(session, telegram_id, MATCHING_OPTIONS)
+            state = remember_user(user) if user else None
+        if not state or not state.has_profile:
+            return {'status': 'no_profile'}
+
+        # Answered candidates leave the ranking, so the quota is counted from
+        # the day's answers rather than the ranking's length
+        remaining = MAX_DAILY_MATCHES - count_answered_today(session, state.user_id)
+        if remaining <= 0:
+            return {'status': 'no_matches'}
+
+        # Use today's precomputed slate if the nightly pipeline produced one,
+        # otherwise fall back to the per-user match cache
+        ranked_matches = get_daily_slate(session, state.user_id)
+        if not ranked_matches:
+            if user is None:
+                user = session.get(User, state.user_id, options=MATCHING_OPTIONS)
+            if not user or not user.profile:
+                user_cache.invalidate(telegram_id)
+                return {'status': 'no_profile'}
+            ranked_matches = get_ranked_matches(session, user)
+        ranked_matches = ranked_matches[:remaining]
+
+        candidate, dropped = None, False
+        while ranked_matches:
+            if match_index >= len(ranked_matches):
+                match_index = 0
+            entry = ranked_matches[match_index]
+            candidate = session.get(User, entry.candidate_id,
+                                    options=[joinedload(User.profile), joinedload(User.settings)])
+            if candidate is not None and candidate.profile is not None:
+                break
+            # The candidate removed their account or profile after the ranking was built
+            _drop_from_ranking(session, state.user_id, entry.candidate_id)
+            ranked_matches = ranked_matches[:match_index] + ranked_matches[match_index + 1:]
+            dropped = True
+        if dropped:
+            session.commit()
+        if not ranked_matches:
+            return {'status': 'no_matches'}
+
+        seeker_features = _user_features(session, state.user_id, user)
+        breakdown = (features_compatibility_breakdown(seeker_features, feature_store.get(candidate.profile))
+                     if seeker_features else {})
+        breakdown.pop('score', None)
+        return {
+            'status': 'ok',
+            'index': match_index,
+            'candidate_id': candidate.id,
+            'first_name': candidate.first_name,
+            'age': candidate.profile.age,
+            'nationality': candidate.profile.nationality,
+            'city': candidate.profile.city,
+            'education': candidate.profile.education_level,
+            'profession': candidate.profile.profession,
+            'score': entry.score,
+            'sub_scores': breakdown
+        }
+    finally:
+        session.close()
+
+def _drop_from_ranking(session, user_id, candidate_id):
+    """Remove a candidate the user answered from their match cache and today's slate."""
+    session.query(MatchCacheEntry).filter(
+        MatchCacheEntry.user_id == user_id, MatchCacheEntry.candidate_id == candidate_id
+    ).delete(synchronize_session=False)
+    session.query(DailySlate).filter(
+        DailySlate.user_id == user_id, DailySlate.candidate_id == candidate_id,
+        DailySlate.slate_date == utc_today()
+    ).delete(synchronize_session=False)
+
+def record_match_response(telegram_id, response, candidate_id, scores=None):
+    """
+    Record a user's response to a potential match.
+
+    Args:
+        telegram_id: Telegram user id of the responding user
+        response: 'yes' or 'no'
+        candidate_id: Internal id of the candidate user
+        scores: The 'score' and 'sub_scores' the user was shown with the
+            candidate; the pair is scored again if missing
+
+    Returns:
+        Dictionary with a 'status' of 'error', 'mutual', 'pending' or 'declined';
+        'mutual' also holds the candidate's 'name'
+
+    The candidate's notification (new like, or mutual match and conversation)
+    is added to the outbox in the same transaction and delivered later.
+    Either way the candidate leaves the user's ranking and the answer counts
+    against the user's MAX_DAILY_MATCHES for the day; a declined candidate
+    is not offered again until REJECTED_PAIR_TTL_DAYS have passed.
+    """
+    session = get_session()
+    try:
+        state = load_user_state(session, telegram_id)
+        if not state:
+            return {'status': 'error'}
+
+        if response != "yes":
+            # User is not interested
+            record_seen_pairs(session, [(state.user_id, candidate_id)], rejected=True)
+            _drop_from_ranking(session, state.user_id, candidate_id)
+            session.commit()
+            return {'status': 'declined'}
+
+        user = session.get(User, state.user_id)
+        if not user:
+            user_cache.invalidate(telegram_id)
+            return {'status': 'error'}
+
+        # A repeated answer (double tap, stale button) keeps the first one
+        if session.query(Match.id).filter(
+            Match.sender_id == user.id, Match.receiver_id == candidate_id
+        ).first() is not None:
+            return {'status': 'pending'}
+
+        # Check if there's already a match in the opposite direction
+        existing_match = session.query(Match).options(joinedload(Match.sender)).filter(
+            Match.sender_id == candidate_id,
+            Match.receiver_id == user.id,
+            Match.status.in_([MatchStatus.PENDING, MatchStatus.ACCEPTED])
+        ).first()
+
+        if existing_match and existing_match.status == MatchStatus.ACCEPTED:
+            # Already mutual; the conversation exists
+            return {'status': 'mutual', 'name': existing_match.sender.first_name}
+
+        if existing_match:
+            # Mutual match! Update status and create conversation
+            existing_match.status = MatchStatus.ACCEPTED
+
+            record_seen_pairs(session, [(user.id, candidate_id)], answered=True)
+            _drop_from_ranking(session, user.id, candidate_id)
+            conversation = Conversation(match_id=existing_match.id)
+            conversation.participants.append(user)
+            conversation.participants.append(existing_match.sender)
+
+            session.add(conversation)
+            name = existing_match.sender.first_name
+            enqueue_event(session, MUTUAL_MATCH, existing_match.sender_id,
+                          f"mutual_match:{existing_match.id}", {'name': user.first_name})
+            enqueue_event(session, CONVERSATION_CREATED, existing_match.sender_id,
+                          f"conversation_created:{existing_match.id}", {'name': user.first_name})
+            session.commit()
+
+            return {'status': 'mutual', 'name': name}
+
+        if scores is None:
+            # The button belongs to a match shown before the last one
+            candidate_features = _user_features(session, candidate_id)
+            user_features = _user_features(session, user.id)
+            if candidate_features is None or user_features is None:
+                return {'status': 'error'}
+            sub_scores = features_compatibility_breakdown(user_features, candidate_features)
+            scores = {'score': sub_scores.pop('score'), 'sub_scores': sub_scores}
+        sub_scores = scores.get('sub_scores', {})
+
+        # Create a new match
+        match = Match(
+            sender_id=user.id,
+            receiver_id=candidate_id,
+            status=MatchStatus.PENDING,
+            compatibility_score=scores['score'],
+            religious_score=sub_scores.get('religious'),
+            personality_score=sub_scores.get('personality'),
+            family_score=sub_scores.get('family'),
+            lifestyle_score=sub_scores.get('lifestyle'),
+            horoscope_score=sub_scores.get('horoscope')
+        )
+        session.add(match)
+        record_seen_pairs(session, [(user.id, candidate_id)], answered=True)
+        _drop_from_ranking(session, user.id, candidate_id)
+        try:
+            session.flush()
+        except IntegrityError:
+            # The same answer was recorded concurrently
+            session.rollback()
+            return {'status': 'pending'}
+        enqueue_event(session, NEW_LIKE, candidate_id, f"new_like:{match.id}")
+        session.commit()
+        return {'status': 'pending'}
+    finally:
+        session.close()
+
+def load_conversations(telegram_id):
+    """
+    Load a user's conversations with the name of the other participant.
+
+    Returns:
+        List of (conversation_id, other_participant_name) tuples, or None if
+        the user does not exist
+    """
+    session = get_session()
+    try:
+        state = load_user_state(session, telegram_id)
+        if not state:
+            return None
+
+        user_conversations = session.query(Conversation).options(*CONVERSATION_OPTIONS).filter(
+            Conversation.participants.any(User.id == state.user_id)
+        ).order_by(Conversation.id)
+
+        conversations = []
+        for conversation in user_conversations:
+            # Find the other participant
+            other_participant = next((p for p in conversation.participants if p.id != state.user_id), None)
+            if other_participant:
+                conversations.append((conversation.id, other_participant.first_name))
+        return conversations
+    finally:
+        session.close()
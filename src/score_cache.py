@@ -0,0 +1,222 @@
+"""
+Pairwise compatibility score cache for the Traditional Matchmaking Telegram Bot.
+
+The same (seeker, candidate) pair is scored again whenever a ranking is
+rebuilt, by the match cache and by the nightly pipeline. Scores are kept
+in a bounded LRU cache keyed by both profile ids, both profile versions,
+both settings digests and a hash of the weights. save_profile_data bumps a
+profile's version, and a settings change alters the digest, so old entries
+simply stop matching and age out; nothing has to be scanned or deleted when
+a profile changes.
+
+With SCORE_CACHE_SHARED set, misses are also looked up in the pair_scores
+table and new scores written to it, so the worker processes of the pipeline
+and the bot share what any of them computed.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from src.config import SCORE_CACHE_SIZE, SCORE_CACHE_SHARED
+from src.database import get_session
+from src.models import PairScore
+from src.features import default_weights
+from src.ranking import top_k_features
+
+logger = logging.getLogger(__name__)
+
+def weights_key(weights):
+    """Return a short stable hash of a weights dictionary."""
+    text = ",".join(f"{name}={float(value)!r}" for name, value in sorted(weights.items()))
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+class ScoreCache:
+    """Thread-safe LRU cache of pair scores, optionally backed by the pair_scores table."""
+
+    def __init__(self, maxsize=SCORE_CACHE_SIZE, shared=SCORE_CACHE_SHARED, session_factory=None):
+        """
+        Args:
+            maxsize: Maximum number of pairs kept in memory
+            shared: Also read and write the pair_scores table
+            session_factory: Session factory of the shared table (default: database.get_session)
+        """
+        self.maxsize = maxsize
+        self.shared = shared
+        self.session_factory = session_factory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'shared_hits': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        """Share of lookups answered from memory or the shared table."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return (self.stats['hits'] + self.stats['shared_hits']) / lookups if lookups else 0.0
+
+    def get_many(self, keys):
+        """
+        Look up pair scores.
+
+        Args:
+            keys: Keys (profile id, version, settings digest, candidate profile
+                id, version, settings digest, weights key)
+
+        Returns:
+            List of scores, None for pairs that are not cached
+        """
+        scores = []
+        with self._lock:
+            for key in keys:
+                score = self._entries.get(key)
+                if score is None:
+                    self.stats['misses'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                scores.append(score)
+
+        missing = [index for index, score in enumerate(scores) if score is None]
+        if self.shared and missing:
+            found = self._load_shared([keys[index] for index in missing])
+            for index in missing:
+                scores[index] = found.get(keys[index])
+            self.stats['shared_hits'] += len(found)
+            self._remember(found.items())
+        return scores
+
+    def put_many(self, items):
+        """Store (key, score) pairs."""
+        items = list(items)
+        self._remember(items)
+        if self.shared and items:
+            self._store_shared(items)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, items):
+        with self._lock:
+            for key, score in items:
+                self._entries[key] = score
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _session(self):
+        return (self.session_factory or get_session)()
+
+    @staticmethod
+    def _by_seeker(keys):
+        """Group keys by (profile id, weights key), so each group is one IN query."""
+        groups = {}
+        for key in keys:
+            groups.setdefault((key[0], key[6]), []).append(key[3])
+        return groups
+
+    def _load_shared(self, keys):
+        """Return the scores of the shared table that are current for keys."""
+        session = self._session()
+        try:
+            wanted = set(keys)
+            found = {}
+            for (profile_id, weights), candidate_ids in self._by_seeker(keys).items():
+                for row in session.query(PairScore).filter(
+                    PairScore.profile_id == profile_id,
+                    PairScore.weights_key == weights,
+                    PairScore.candidate_profile_id.in_(candidate_ids)
+                ):
+                    key = (row.profile_id, row.profile_version, row.profile_settings,
+                           row.candidate_profile_id, row.candidate_version, row.candidate_settings,
+                           row.weights_key)
+                    # Rows of older profile versions or other settings are stale
+                    if key in wanted:
+                        found[key] = row.score
+            return found
+        finally:
+            session.close()
+
+    def _store_shared(self, items):
+        """Replace the shared table's entries of the pairs in items."""
+        session = self._session()
+        try:
+            for (profile_id, weights), candidate_ids in self._by_seeker([key for key, _ in items]).items():
+                session.query(PairScore).filter(
+                    PairScore.profile_id == profile_id,
+                    PairScore.weights_key == weights,
+                    PairScore.candidate_profile_id.in_(candidate_ids)
+                ).delete(synchronize_session=False)
+            session.bulk_insert_mappings(PairScore, [{
+                'profile_id': profile_id, 'profile_version': version, 'profile_settings': settings,
+                'candidate_profile_id': candidate_id, 'candidate_version': candidate_version,
+                'candidate_settings': candidate_settings, 'weights_key': weights, 'score': score
+            } for (profile_id, version, settings, candidate_id, candidate_version, candidate_settings, weights), score
+                in items])
+            session.commit()
+        except Exception:
+            # The table is only a cache; the scores are still returned
+            session.rollback()
+            logger.exception("Storing shared pair scores failed")
+        finally:
+            session.close()
+
+# Process-wide cache used by ranking
+score_cache = ScoreCache()
+
+def _pair_key(seeker, candidate, weights):
+    if seeker.profile_id is None or candidate.profile_id is None:
+        return None
+    return (seeker.profile_id, seeker.version, seeker.settings_digest,
+            candidate.profile_id, candidate.version, candidate.settings_digest, weights)
+
+def cached_top_k(seeker_features, candidate_features, k, weights=None, cache=None):
+    """
+    Select the k best candidates of one encoded seeker, reusing cached pair scores.
+
+    Cached pairs keep their stored scores; the others are ranked by
+    top_k_features, which prunes candidates that cannot make the cut. Every
+    pair it scores exactly is cached, whether or not it is selected.
+
+    Args:
+        seeker_features: ProfileFeatures of the user looking for matches
+        candidate_features: List of candidate ProfileFeatures
+        k: Number of candidates to select
+        weights: Dictionary of weights for different compatibility factors
+        cache: ScoreCache to use (default: score_cache)
+
+    Returns:
+        List of (candidate index, score) tuples, identical to top_k_features
+    """
+    cache = score_cache if cache is None else cache
+    weights = weights or default_weights()
+    key_weights = weights_key(weights)
+
+    keys = [_pair_key(seeker_features, candidate, key_weights) for candidate in candidate_features]
+    cacheable = [index for index, key in enumerate(keys) if key is not None]
+    missing = [index for index, key in enumerate(keys) if key is None]
+    selected = []
+
+    for index, score in zip(cacheable, cache.get_many([keys[index] for index in cacheable])):
+        if score is None:
+            missing.append(index)
+        elif score > 0:
+            # Deal-breaker pairs score 0 and are never selected
+            selected.append((index, score))
+
+    if missing:
+        missing.sort()
+        scored = []
+        for position, score in top_k_features(seeker_features, [candidate_features[index] for index in missing],
+                                              k, weights, scored=scored):
+            selected.append((missing[position], score))
+        cache.put_many((keys[missing[position]], score) for position, score in scored
+                       if keys[missing[position]] is not None)
+
+    # Best first; ties keep the candidates' order
+    return sorted(selected, key=lambda item: (-item[1], item[0]))[:k]
@@ -0,0 +1,126 @@
+"""
+Seen and declined candidate pairs for the Traditional Matchmaking Telegram Bot.
+
+Every candidate offered in a daily slate and every candidate a user declines
+is stored as a (user, candidate) row of the seen_pairs table with an expiry
+time. The candidate query anti-joins against the table on its primary key,
+so users never spend their daily quota on candidates they already saw, and
+the eligible set shrinks over time instead of repeating itself. Once a pair
+expires the candidate may be offered again; expired rows are deleted in bulk
+through the expires_at index.
+
+Candidates a user liked or declined also carry the time of the answer, so
+the answers of the day are counted against MAX_DAILY_MATCHES.
+"""
+
+import datetime
+import logging
+
+from sqlalchemy import func
+
+from src.config import SEEN_PAIR_TTL_DAYS, REJECTED_PAIR_TTL_DAYS
+from src.models import SeenPair
+
+logger = logging.getLogger(__name__)
+
+def record_seen_pairs(session, pairs, rejected=False, answered=False, now=None):
+    """
+    Hide candidates from users until the pairs expire, as part of the caller's transaction.
+
+    A pair that is already stored keeps its rejected flag, its answer time
+    and the later of the two expiry times, so declining a candidate from a
+    slate extends how long it stays hidden and offering a declined one again
+    never shortens it.
+
+    Args:
+        session: Database session
+        pairs: Iterable of (user id, candidate id) tuples
+        rejected: Whether the users declined the candidates (kept for
+            REJECTED_PAIR_TTL_DAYS instead of SEEN_PAIR_TTL_DAYS)
+        answered: Whether the users answered the candidates (liked or declined)
+        now: Current time (defaults to utcnow)
+    """
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return
+
+    now = now or datetime.datetime.utcnow()
+    expires_at = now + datetime.timedelta(days=REJECTED_PAIR_TTL_DAYS if rejected else SEEN_PAIR_TTL_DAYS)
+
+    by_user = {}
+    for user_id, candidate_id in pairs:
+        by_user.setdefault(user_id, []).append(candidate_id)
+
+    answered_at = now if answered or rejected else None
+    rows = {pair: {"user_id": pair[0], "candidate_id": pair[1], "rejected": rejected,
+                   "answered_at": answered_at, "expires_at": expires_at}
+            for pair in pairs}
+    for user_id, candidate_ids in by_user.items():
+        stored = SeenPair.__table__.select().where(
+            SeenPair.user_id == user_id, SeenPair.candidate_id.in_(candidate_ids)
+        )
+        for existing in session.execute(stored).mappings():
+            if existing["expires_at"] <= now:
+                continue
+            row = rows[(existing["user_id"], existing["candidate_id"])]
+            row["rejected"] = row["rejected"] or existing["rejected"]
+            row["answered_at"] = row["answered_at"] or existing["answered_at"]
+            row["expires_at"] = max(row["expires_at"], existing["expires_at"])
+        session.query(SeenPair).filter(
+            SeenPair.user_id == user_id, SeenPair.candidate_id.in_(candidate_ids)
+        ).delete(synchronize_session=False)
+
+    session.execute(SeenPair.__table__.insert(), list(rows.values()))
+
+def utc_today(now=None):
+    """
+    Return the current date in UTC.
+
+    Daily quotas and slates all roll over at UTC midnight.
+
+    Args:
+        now: Current time (defaults to utcnow)
+
+    Returns:
+        datetime.date
+    """
+    return (now or datetime.datetime.utcnow()).date()
+
+def count_answered_today(session, user_id, now=None):
+    """
+    Count the candidates a user liked or declined since midnight (UTC).
+
+    Args:
+        session: Database session
+        user_id: Internal id of the user
+        now: Current time (defaults to utcnow)
+
+    Returns:
+        Number of answered candidates
+    """
+    midnight = datetime.datetime.combine(utc_today(now), datetime.time())
+    return session.query(func.count()).select_from(SeenPair).filter(
+        SeenPair.user_id == user_id, SeenPair.answered_at >= midnight
+    ).scalar()
+
+def expire_seen_pairs(session, now=None):
+    """
+    Delete every expired pair, so its candidate can be offered again.
+
+    The candidate query already ignores expired rows; this keeps the table
+    small.
+
+    Args:
+        session: Database session
+        now: Current time (defaults to utcnow)
+
+    Returns:
+        Number of rows deleted
+    """
+    deleted = session.query(SeenPair).filter(
+        SeenPair.expires_at <= (now or datetime.datetime.utcnow())
+    ).delete(synchronize_session=False)
+    session.commit()
+    if deleted:
+        logger.info("Expired %d seen candidate pairs", deleted)
+    return deleted
@@ -0,0 +1,325 @@
+"""
+Outbound message queue for the Traditional Matchmaking Telegram Bot.
+
+Every message the bot sends or edits goes through one SendQueue, which keeps
+the bot inside Telegram's rate limits instead of running into 429 errors:
+
+- a global token bucket (SEND_RATE messages per second) and one per chat
+  (SEND_CHAT_RATE per second after a burst of SEND_CHAT_BURST),
+- two priority lanes, so replies to a user's own button press are sent
+  before queued bulk notifications,
+- a chat handles one request at a time, in priority then submission order,
+- a RetryAfter error pauses all sending for the time Telegram asks and the
+  request is retried (up to SEND_MAX_RETRIES times),
+- a request submitted with the coalesce key of one still waiting in the same
+  chat replaces it, so e.g. only the last of several edits of a message is
+  sent.
+
+The queue calls whatever coroutine function it is given (Bot.send_message,
+Message.reply_text, ...), so it can be tested against a fake Bot API.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import warnings
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+
+from src.config import SEND_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lower is sent first
+INTERACTIVE = 0
+BULK = 1
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second after a burst of `burst`."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now=None):
+        """Return seconds until a token is available (0 if one is)."""
+        now = self.clock() if now is None else now
+        self._refill(now)
+        return max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.0)
+
+    def take(self, now=None):
+        """Use one token; callers check wait_time first."""
+        self._refill(self.clock() if now is None else now)
+        self.tokens -= 1
+
+    def block(self, seconds):
+        """Hand out no tokens for the next `seconds` seconds."""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def is_full(self, now=None):
+        now = self.clock() if now is None else now
+        self._refill(now)
+        return self.tokens >= self.burst and now >= self.blocked_until
+
+@dataclass
+class _Job:
+    """One queued API request."""
+    call: object
+    args: tuple
+    kwargs: dict
+    future: asyncio.Future
+    coalesce: object = None
+    attempts: int = 0
+
+@dataclass
+class _Chat:
+    """Requests waiting for one chat and the chat's rate limit."""
+    bucket: TokenBucket
+    # Heap of (priority, sequence, job)
+    pending: list = field(default_factory=list)
+    busy: bool = False
+    timer: object = None
+
+class SendQueue:
+    """Rate-limited, prioritised queue of Telegram API requests."""
+
+    def __init__(self, rate=SEND_RATE, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 max_retries=SEND_MAX_RETRIES, burst=None, clock=time.monotonic):
+        """
+        Args:
+            rate: Requests per second across all chats
+            chat_rate: Requests per second to one chat
+            chat_burst: Requests to one chat allowed at once before chat_rate applies
+            max_retries: RetryAfter errors tolerated per request before it fails
+            burst: Requests across all chats allowed at once (default: one second's worth)
+            clock: Monotonic clock in seconds
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.clock = clock
+        self.bucket = TokenBucket(rate, burst or max(1, rate), clock)
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'coalesced': 0}
+        self._sequence = itertools.count()
+        self._loop = None
+        self._reset()
+
+    def _reset(self):
+        self._chats = {}
+        # Heap of (priority, sequence, chat id) of chats whose next request may be ready
+        self._ready = []
+        self._timer = None
+        self._futures = set()
+
+    async def send(self, chat_id, call, /, *args, priority=INTERACTIVE, coalesce=None, **kwargs):
+        """
+        Queue an API request and return its result once it has been sent.
+
+        Args:
+            chat_id: Chat the request is rate-limited against
+            call: Coroutine function making the request
+            *args: Positional arguments of call
+            priority: INTERACTIVE or BULK
+            coalesce: Optional key; a waiting request of the chat with the same
+                key is replaced by this one and both callers get its result
+            **kwargs: Keyword arguments of call
+
+        Returns:
+            Whatever call returns; its exceptions are raised here
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Timers and futures belong to one event loop
+            self._loop = loop
+            self._reset()
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst, self.clock))
+
+        if coalesce is not None:
+            for _, _, job in chat.pending:
+                if job.coalesce == coalesce:
+                    job.call, job.args, job.kwargs = call, args, kwargs
+                    self.stats['coalesced'] += 1
+                    return await job.future
+
+        job = _Job(call, args, kwargs, loop.create_future(), coalesce)
+        self._futures.add(job.future)
+        job.future.add_done_callback(self._futures.discard)
+        heapq.heappush(chat.pending, (priority, next(self._sequence), job))
+        self._offer(chat_id, chat)
+        self._pump()
+        return await job.future
+
+    async def join(self):
+        """Wait until every queued request has been sent or has failed."""
+        while self._futures:
+            await asyncio.gather(*list(self._futures), return_exceptions=True)
+
+    def _offer(self, chat_id, chat):
+        """Make a chat's next request a candidate for sending."""
+        if chat.pending and not chat.busy:
+            priority, sequence, _ = chat.pending[0]
+            heapq.heappush(self._ready, (priority, sequence, chat_id))
+
+    def _pump(self):
+        """Start every request allowed by the rate limits, best priority first."""
+        self._timer = None
+        while self._ready:
+            priority, sequence, chat_id = self._ready[0]
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.busy or not chat.pending or chat.pending[0][:2] != (priority, sequence):
+                # Superseded by a later offer of the same chat
+                heapq.heappop(self._ready)
+                continue
+
+            now = self.clock()
+            wait = self.bucket.wait_time(now)
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = self._loop.call_later(wait, self._pump)
+                return
+
+            heapq.heappop(self._ready)
+            wait = chat.bucket.wait_time(now)
+            if wait > 0:
+                if chat.timer is None:
+                    chat.timer = self._loop.call_later(wait, self._wake_chat, chat_id)
+                continue
+
+            _, _, job = heapq.heappop(chat.pending)
+            if job.future.done():
+                # The caller was cancelled before the request was sent
+                self._offer(chat_id, chat)
+                continue
+            self.bucket.take(now)
+            chat.bucket.take(now)
+            chat.busy = True
+            self._loop.create_task(self._run(chat_id, chat, priority, sequence, job))
+
+    def _wake_chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is not None:
+            chat.timer = None
+            self._offer(chat_id, chat)
+            self._pump()
+
+    def _forget_chat(self, chat_id):
+        """Drop an idle chat once its bucket has refilled."""
+        chat = self._chats.get(chat_id)
+        if chat is None or chat.pending or chat.busy:
+            return
+        if chat.bucket.is_full():
+            del self._chats[chat_id]
+        else:
+            self._loop.call_later(chat.bucket.burst / chat.bucket.rate, self._forget_chat, chat_id)
+
+    async def _run(self, chat_id, chat, priority, sequence, job):
+        try:
+            result = await job.call(*job.args, **job.kwargs)
+        except RetryAfter as error:
+            job.attempts += 1
+            if job.attempts > self.max_retries:
+                self.stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(error)
+            else:
+                delay = _retry_seconds(error)
+                logger.warning("Flood control: pausing outbound messages for %.1f seconds", delay)
+                self.stats['retried'] += 1
+                # Telegram's limit was hit despite the buckets, so everything waits
+                self.bucket.block(delay)
+                chat.bucket.block(delay)
+                heapq.heappush(chat.pending, (priority, sequence, job))
+        except Exception as error:
+            self.stats['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            self.stats['sent'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            chat.busy = False
+            if chat.pending:
+                self._offer(chat_id, chat)
+                self._pump()
+            else:
+                self._forget_chat(chat_id)
+
+def _retry_seconds(error):
+    """Seconds a RetryAfter error asks to wait, whichever type PTB reports."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+_send_queue = None
+
+def get_send_queue():
+    """Return the process-wide send queue."""
+    global _send_queue
+    if _send_queue is None:
+        _send_queue = SendQueue()
+    return _send_queue
+
+def share_send_rate(shards):
+    """
+    Limit this process's send queue to an equal share of SEND_RATE.
+
+    Each of `shards` worker processes sends through its own queue, so
+    together they stay within the global limit. Replies and outbox
+    notifications to a chat are both sent by the worker owning the chat's
+    shard (see notifications.set_delivery_shard), so the per-chat limits
+    need no sharing.
+
+    Args:
+        shards: Number of processes sending concurrently
+    """
+    global _send_queue
+    _send_queue = SendQueue(rate=SEND_RATE / max(1, shards))
+
+async def reply_text(message, text, **kwargs):
+    """Queue Message.reply_text as an interactive reply."""
+    return await get_send_queue().send(message.chat_id, message.reply_text, text, **kwargs)
+
+async def edit_message_text(query, text, **kwargs):
+    """
+    Queue CallbackQuery.edit_message_text as an interactive reply.
+
+    A newer edit of the same message replaces one that has not been sent yet.
+    """
+    message = getattr(query, "message", None)
+    if message is not None:
+        chat_id, coalesce = message.chat_id, ("edit", message.chat_id, message.message_id)
+    else:
+        chat_id, coalesce = query.from_user.id, None
+    return await get_send_queue().send(chat_id, query.edit_message_text, text, coalesce=coalesce, **kwargs)
+
+async def notify(bot, chat_id, text, coalesce=None, **kwargs):
+    """
+    Queue a bulk notification (daily slates, mutual matches, family messages).
+
+    Args:
+        bot: Bot sending the message
+        chat_id: Recipient chat
+        text: Message text
+        coalesce: Optional key; a waiting notification with the same key is
+            replaced by this one
+        **kwargs: Further arguments of Bot.send_message
+    """
+    return await get_send_queue().send(chat_id, bot.send_message, chat_id=chat_id, text=text,
+                                       priority=BULK, coalesce=coalesce, **kwargs)
@@ -0,0 +1,375 @@
+"""
+Memory-mapped snapshots of the active profile pool for the Traditional Matchmaking Telegram Bot.
+
+An exporter writes the encoded matching features of every active profile as
+one .npy file per ProfileMatrix column. Every process that loads the
+snapshot memory-maps the same files, so the pages are shared instead of
+copied per worker.
+
+Snapshots are versioned directories published by atomically replacing the
+CURRENT pointer file. Profiles saved after an export are appended to a
+delta log, which loaders apply on top of the snapshot they map.
+
+Usage:
+    python -m src.snapshot    # export a new snapshot from the database
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from src.config import SNAPSHOT_DIR, SNAPSHOT_KEEP
+from src.features import MISSING, ProfileFeatures, ProfileVocabularies
+from src.batch_matching import ProfileMatrix, batch_overall_compatibility
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY_NAMES = ('practices', 'interests', 'husband_roles', 'wife_roles', 'arrangements')
+
+# Column dtypes on disk; codes are small so int16 is plenty
+CODE_DTYPE = np.int16
+
+def _version_name(version):
+    """Directory name of a snapshot version."""
+    return f"v{version:06d}"
+
+def current_version(root=SNAPSHOT_DIR):
+    """Return the published snapshot version, or None if none was exported."""
+    try:
+        with open(os.path.join(root, "CURRENT")) as pointer:
+            return int(pointer.read().strip().lstrip("v"))
+    except FileNotFoundError:
+        return None
+
+@contextmanager
+def _delta_lock(root):
+    """Hold an exclusive lock on the delta log of a snapshot root."""
+    with open(os.path.join(root, "delta.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _translate(record, source, target):
+    """Re-encode a record's vocabulary-dependent fields from one vocabulary set to another."""
+    values = {name: getattr(record, name) for name in ProfileFeatures.__slots__}
+    for name in ProfileMatrix.MASK_COLUMNS:
+        values[name] = getattr(target, name).mask(getattr(source, name).tokens(values[name]))
+    if record.arrangement != MISSING:
+        values['arrangement'] = target.arrangements.code(source.arrangements.token(record.arrangement))
+    return ProfileFeatures(**values)
+
+def _record_to_json(record, vocabularies):
+    """Serialize a record with set fields and the living arrangement as tokens."""
+    data = {name: getattr(record, name) for name in ProfileFeatures.__slots__}
+    for name in ProfileMatrix.MASK_COLUMNS:
+        data[name] = getattr(vocabularies, name).tokens(data[name])
+    if record.arrangement != MISSING:
+        data['arrangement'] = vocabularies.arrangements.token(record.arrangement)
+    else:
+        data['arrangement'] = None
+    return data
+
+def _record_from_json(data, vocabularies):
+    """Rebuild a record serialized by _record_to_json against a vocabulary set."""
+    missing = [name for name in ProfileMatrix.DEALBREAKER_COLUMNS if data.get(name) is None]
+    if missing:
+        raise ValueError(f"Delta log record of user {data.get('user_id')} missing: {', '.join(missing)}")
+    values = dict(data)
+    for name in ProfileMatrix.MASK_COLUMNS:
+        values[name] = getattr(vocabularies, name).mask(values[name])
+    values['arrangement'] = (vocabularies.arrangements.code(values['arrangement'])
+                             if values['arrangement'] is not None else MISSING)
+    return ProfileFeatures(**values)
+
+def write_snapshot(records, vocabularies, root=SNAPSHOT_DIR, delta_since=None, keep=SNAPSHOT_KEEP):
+    """
+    Write encoded profiles as a new snapshot version and publish it.
+
+    Args:
+        records: ProfileFeatures of every active profile
+        vocabularies: ProfileVocabularies the records were encoded with
+        root: Directory holding the snapshot versions
+        delta_since: Delta log entries at or after this time (ns) are applied
+            on load; pass the time taken before the records were read
+        keep: Number of versions retained after publishing
+
+    Returns:
+        Version number of the new snapshot
+    """
+    os.makedirs(root, exist_ok=True)
+    version = (current_version(root) or 0) + 1
+    final = os.path.join(root, _version_name(version))
+    staging = final + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    # Rows are sorted by user id so loaders can find them with a binary search
+    records = sorted(records, key=lambda record: record.user_id)
+    matrix = ProfileMatrix.from_features(records, vocabularies)
+    columns = {
+        'user_id': np.array([record.user_id for record in records], dtype=np.int64),
+        'profile_id': np.array([record.profile_id for record in records], dtype=np.int64)
+    }
+    for name in ProfileMatrix.CODE_COLUMNS:
+        columns[name] = getattr(matrix, name).astype(CODE_DTYPE)
+    for name in ProfileMatrix.FLAG_COLUMNS + ProfileMatrix.MASK_COLUMNS + ProfileMatrix.DEALBREAKER_COLUMNS:
+        columns[name] = getattr(matrix, name)
+
+    for name, values in columns.items():
+        with open(os.path.join(staging, f"{name}.npy"), "wb") as column:
+            np.save(column, values)
+            column.flush()
+            os.fsync(column.fileno())
+
+    with open(os.path.join(staging, "vocabularies.json"), "w") as vocabulary_file:
+        # Tokens in code order, so a loader re-creates the same bit positions
+        json.dump({name: getattr(vocabularies, name).tokens((1 << len(getattr(vocabularies, name))) - 1)
+                   for name in VOCABULARY_NAMES}, vocabulary_file)
+    with open(os.path.join(staging, "manifest.json"), "w") as manifest:
+        json.dump({
+            "version": version,
+            "created_at": time.time_ns(),
+            "delta_since": delta_since if delta_since is not None else time.time_ns(),
+            "rows": len(records),
+            "columns": sorted(columns)
+        }, manifest)
+
+    # Publish: the directory rename and the pointer replace are both atomic
+    os.rename(staging, final)
+    pointer = os.path.join(root, "CURRENT.tmp")
+    with open(pointer, "w") as pointer_file:
+        pointer_file.write(_version_name(version))
+        pointer_file.flush()
+        os.fsync(pointer_file.fileno())
+    os.replace(pointer, os.path.join(root, "CURRENT"))
+
+    _prune(root, version, keep)
+    return version
+
+def _prune(root, version, keep):
+    """Remove versions older than the retained ones and the delta entries none of them need."""
+    retained = range(max(1, version - keep + 1), version + 1)
+    for name in os.listdir(root):
+        if name.startswith("v") and name[1:].isdigit() and int(name[1:]) not in retained:
+            # Processes that still map these files keep their pages until they reload
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    oldest = min(_read_manifest(root, retained_version)["delta_since"] for retained_version in retained
+                 if os.path.exists(os.path.join(root, _version_name(retained_version))))
+    log = os.path.join(root, "delta.jsonl")
+    with _delta_lock(root):
+        if not os.path.exists(log):
+            return
+        with open(log) as entries:
+            kept = [line for line in entries if json.loads(line)["ts"] >= oldest]
+        with open(log + ".tmp", "w") as compacted:
+            compacted.writelines(kept)
+        os.replace(log + ".tmp", log)
+
+def _read_manifest(root, version):
+    """Return the manifest of a snapshot version."""
+    with open(os.path.join(root, _version_name(version), "manifest.json")) as manifest:
+        return json.load(manifest)
+
+def record_profile_change(record, vocabularies, root=SNAPSHOT_DIR):
+    """
+    Append a saved profile to the delta log of the published snapshots.
+
+    Does nothing until a snapshot export has been started.
+
+    Args:
+        record: ProfileFeatures of the saved profile
+        vocabularies: ProfileVocabularies the record was encoded with
+        root: Directory holding the snapshot versions
+    """
+    if not os.path.isdir(root):
+        return
+    entry = json.dumps({"ts": time.time_ns(), "record": _record_to_json(record, vocabularies)})
+    with _delta_lock(root):
+        with open(os.path.join(root, "delta.jsonl"), "a") as log:
+            log.write(entry + "\n")
+
+class ProfileSnapshot:
+    """A memory-mapped snapshot version with its delta log applied."""
+
+    def __init__(self, version, user_ids, base, overlay_user_ids, overlay, superseded):
+        self.version = version
+        self.user_ids = user_ids
+        self.base = base
+        self.overlay_user_ids = overlay_user_ids
+        self.overlay = overlay
+        # Base rows replaced by a delta entry
+        self.superseded = superseded
+
+    @property
+    def vocabularies(self):
+        return self.base.vocabularies
+
+    def __len__(self):
+        return len(self.user_ids) - int(self.superseded.sum()) + len(self.overlay_user_ids)
+
+    @classmethod
+    def load(cls, root=SNAPSHOT_DIR, version=None):
+        """
+        Map a snapshot version (the published one by default) and apply the delta log.
+
+        Returns:
+            ProfileSnapshot, or None if no snapshot was exported
+        """
+        version = version or current_version(root)
+        if version is None:
+            return None
+        directory = os.path.join(root, _version_name(version))
+        manifest = _read_manifest(root, version)
+
+        vocabularies = ProfileVocabularies()
+        with open(os.path.join(directory, "vocabularies.json")) as vocabulary_file:
+            for name, tokens in json.load(vocabulary_file).items():
+                for token in tokens:
+                    getattr(vocabularies, name).code(token)
+
+        columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                   for name in manifest["columns"]}
+        user_ids = columns.pop('user_id')
+        columns.pop('profile_id')
+        base = ProfileMatrix(columns, vocabularies)
+
+        # Latest delta entry per user since the snapshot was taken
+        changes = {}
+        log = os.path.join(root, "delta.jsonl")
+        if os.path.exists(log):
+            with _delta_lock(root), open(log) as entries:
+                for line in entries:
+                    entry = json.loads(line)
+                    if entry["ts"] >= manifest["delta_since"]:
+                        record = _record_from_json(entry["record"], vocabularies)
+                        changes[record.user_id] = record
+
+        superseded = np.zeros(len(user_ids), dtype=bool)
+        if changes:
+            changed_ids = np.fromiter(changes, dtype=np.int64)
+            rows = np.searchsorted(user_ids, changed_ids)
+            found = rows < len(user_ids)
+            found[found] = user_ids[rows[found]] == changed_ids[found]
+            superseded[rows[found]] = True
+
+        overlay_records = list(changes.values())
+        overlay = ProfileMatrix.from_features(overlay_records, vocabularies)
+        overlay_user_ids = np.array([record.user_id for record in overlay_records], dtype=np.int64)
+        return cls(version, user_ids, base, overlay_user_ids, overlay, superseded)
+
+    def _base_rows(self, user_ids):
+        """Rows of the given users in the base columns that no delta entry replaced."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        rows = np.searchsorted(self.user_ids, user_ids)
+        found = rows < len(self.user_ids)
+        found[found] = self.user_ids[rows[found]] == user_ids[found]
+        rows = rows[found]
+        return rows[~self.superseded[rows]]
+
+    def score(self, seeker_features, vocabularies, user_ids=None, weights=None):
+        """
+        Score one encoded seeker against the snapshot's profiles.
+
+        Args:
+            seeker_features: ProfileFeatures of the user looking for matches
+            vocabularies: ProfileVocabularies the seeker was encoded with
+            user_ids: Optional user ids to restrict scoring to; users missing
+                from the snapshot are skipped
+            weights: Dictionary of weights for different compatibility factors
+
+        Returns:
+            Tuple of (user ids, scores) arrays, identical to
+            calculate_batch_features_compatibility on the same profiles
+        """
+        seeker = ProfileMatrix.from_features([_translate(seeker_features, vocabularies, self.vocabularies)],
+                                             self.vocabularies)
+
+        if user_ids is None:
+            base_ids = self.user_ids
+            base_scores = batch_overall_compatibility(seeker, self.base, weights)
+            keep = ~self.superseded
+            base_ids, base_scores = base_ids[keep], base_scores[keep]
+            overlay_rows = np.arange(len(self.overlay_user_ids))
+        else:
+            rows = self._base_rows(user_ids)
+            base_ids = self.user_ids[rows]
+            base_scores = (batch_overall_compatibility(seeker, self.base.take(rows), weights)
+                           if len(rows) else np.zeros(0))
+            overlay_rows = np.flatnonzero(np.isin(self.overlay_user_ids, np.asarray(user_ids, dtype=np.int64)))
+
+        if not len(overlay_rows):
+            return np.asarray(base_ids), base_scores
+        overlay_scores = batch_overall_compatibility(seeker, self.overlay.take(overlay_rows), weights)
+        return (np.concatenate([base_ids, self.overlay_user_ids[overlay_rows]]),
+                np.concatenate([base_scores, overlay_scores]))
+
+# Snapshot used by batch scoring, reloaded when a newer version is published
+_snapshot = None
+
+def get_profile_snapshot(root=SNAPSHOT_DIR):
+    """Return the published snapshot, or None if none has been exported."""
+    global _snapshot
+    version = current_version(root)
+    if version is None:
+        return None
+    if _snapshot is None or _snapshot.version != version:
+        _snapshot = ProfileSnapshot.load(root, version)
+    return _snapshot
+
+def export_snapshot(session, root=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP):
+    """
+    Encode every active profile and publish it as a new snapshot.
+
+    Args:
+        session: Database session
+        root: Directory holding the snapshot versions
+        keep: Number of versions retained
+
+    Returns:
+        Version number of the new snapshot
+    """
+    from sqlalchemy.orm import contains_eager, selectinload
+    from src.models import User, Profile, AccountStatus
+    from src.features import encode_profile
+
+    # Profiles saved while the export reads the table are replayed from the delta log
+    os.makedirs(root, exist_ok=True)
+    delta_since = time.time_ns()
+    profiles = session.query(Profile).join(User, User.id == Profile.user_id).options(
+        selectinload(Profile.interests), contains_eager(Profile.user).joinedload(User.settings)
+    ).filter(User.account_status == AccountStatus.ACTIVE).yield_per(5000)
+
+    vocabularies = ProfileVocabularies()
+    records = [encode_profile(profile, vocabularies) for profile in profiles]
+    return write_snapshot(records, vocabularies, root, delta_since, keep)
+
+def main():
+    """Export a snapshot from the command line."""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    from src.database import init_db, get_session
+
+    init_db()
+    session = get_session()
+    try:
+        start = time.perf_counter()
+        version = export_snapshot(session)
+        logger.info("Published snapshot %s in %s (%.1fs)", _version_name(version), SNAPSHOT_DIR,
+                    time.perf_counter() - start)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
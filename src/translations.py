@@ -1,9 +1,16 @@
 """
 Translation utilities for the Traditional Matchmaking Telegram Bot.
+
+load_translations compiles the translation files into one table per
+language (with the default language's entries filled in), so get_text is a
+single dictionary lookup. Each entry holds the interned template and, if it
+has replacement fields, a renderer prepared from the parsed template.
 """
 
 import json
 import os
+import string
+import sys
 from pathlib import Path
 
 from src.config import TRANSLATION_PATH, DEFAULT_LANGUAGE
@@ -14,8 +21,60 @@ os.makedirs(TRANSLATION_PATH, exist_ok=True)
 # Initialize translations dictionary
 translations = {}
 
+# Compiled tables: language -> {key: (template, renderer or None)}
+catalog = {}
+# Incremented on every compile so caches built from the catalog can tell it changed
+catalog_generation = 0
+
+_formatter = string.Formatter()
+
+def compile_template(text):
+    """
+    Prepare a translation template for repeated formatting.
+
+    Args:
+        text: Template in str.format syntax
+
+    Returns:
+        Tuple of the interned template and a renderer taking the format
+        arguments as a dictionary, or None if the template has no fields
+    """
+    text = sys.intern(text)
+    try:
+        parsed = list(_formatter.parse(text))
+    except ValueError:
+        # Malformed template; formatting reports the error
+        return text, lambda kwargs: text.format(**kwargs)
+
+    fields = [field for _, field, _, _ in parsed if field is not None]
+    if not fields:
+        return text, None
+    if any(spec or conversion or not field.isidentifier() for _, field, spec, conversion in parsed if field is not None):
+        return text, lambda kwargs: text.format(**kwargs)
+
+    if len(parsed) <= 2 and len(fields) == 1:
+        # The common case: one field, e.g. "... match with {name}. ..."
+        prefix, field = parsed[0][0], parsed[0][1]
+        suffix = parsed[1][0] if len(parsed) == 2 else ""
+        return text, lambda kwargs: prefix + str(kwargs[field]) + suffix
+
+    pieces = tuple((literal, field) for literal, field, _, _ in parsed)
+    return text, lambda kwargs: "".join([literal + (str(kwargs[field]) if field is not None else "")
+                                         for literal, field in pieces])
+
+def compile_catalog():
+    """Rebuild the compiled tables from the loaded translations."""
+    global catalog, catalog_generation
+    default = {key: compile_template(text) for key, text in translations.get(DEFAULT_LANGUAGE, {}).items()}
+    compiled = {DEFAULT_LANGUAGE: default}
+    for language, entries in translations.items():
+        if language != DEFAULT_LANGUAGE:
+            compiled[language] = {**default, **{key: compile_template(text) for key, text in entries.items()}}
+    catalog = compiled
+    catalog_generation += 1
+
 def load_translations():
-    """Load all translation files from the translations directory."""
+    """Load all translation files from the translations directory and compile them."""
     global translations
     translations = {}
     
@@ -34,6 +93,8 @@ def load_translations():
         except Exception as e:
             print(f"Error loading translation file {file_path}: {e}")
 
+    compile_catalog()
+
 def create_default_translation_files():
     """Create default English and Arabic translation files."""
     # English translations
@@ -93,6 +154,7 @@ def create_default_translation_files():
         "not_interested": "Not Interested ✗",
         "mutual_match": "Congratulations! You have a new match with {name}. You both expressed interest in each other.",
         "group_created": "A conversation group has been created for you and {name}. May this be the beginning of a blessed connection.",
+        "new_like": "Someone has expressed interest in you. Open View Potential Matches to see your matches.",
         "conversation_starters": "Here are some suggested topics to discuss:",
         "topic_1": "Family values and traditions",
         "topic_2": "Life goals and aspirations",
@@ -187,6 +249,7 @@ def create_default_translation_files():
         "not_interested": "غير مهتم ✗",
         "mutual_match": "تهانينا! لديك توافق جديد مع {name}. لقد أبديتما اهتمامًا ببعضكما البعض.",
         "group_created": "تم إنشاء مجموعة محادثة لك ولـ {name}. نتمنى أن تكون هذه بداية توافق مبارك.",
+        "new_like": "أبدى شخص ما اهتمامه بك. افتح عرض التوافقات المحتملة لرؤية توافقاتك.",
         "conversation_starters": "إليك بعض المواضيع المقترحة للمناقشة:",
         "topic_1": "قيم وتقاليد العائلة",
         "topic_2": "أهداف وطموحات الحياة",
@@ -232,14 +295,20 @@ def create_default_translation_files():
         json.dump(ar_translations, f, ensure_ascii=False, indent=2)
 
 def get_user_language(user_id, db_session):
-    """Get the user's preferred language from database."""
-    from src.models import User, UserSettings
-    
-    user = db_session.query(User).filter(User.telegram_id == str(user_id)).first()
-    if user and user.settings:
-        return user.settings.language_preference
+    """Get the user's preferred language from the user cache or the database."""
+    from src.user_cache import load_user_state
     
-    return DEFAULT_LANGUAGE
+    state = load_user_state(db_session, user_id)
+    return state.language if state else DEFAULT_LANGUAGE
+
+def _compile_missing(language, key):
+    """Compile an entry added to the raw translations after the catalog was built."""
+    for source in (language, DEFAULT_LANGUAGE):
+        if key in translations.get(source, {}):
+            entry = compile_template(translations[source][key])
+            catalog.setdefault(language, {})[key] = entry
+            return entry
+    return None
 
 def get_text(key, user_id=None, db_session=None, lang=None, **kwargs):
     """
@@ -253,12 +322,8 @@ def get_text(key, user_id=None, db_session=None, lang=None, **kwargs):
         **kwargs: Format parameters for the translated string
     
     Returns:
-        Translated string
+        Translated string, or the key itself if it has no translation
     """
-    # Load translations if not already loaded
-    if not translations:
-        load_translations()
-    
     # Determine language to use
     language = lang
     if not language and user_id and db_session:
@@ -266,18 +331,18 @@ def get_text(key, user_id=None, db_session=None, lang=None, **kwargs):
     if not language:
         language = DEFAULT_LANGUAGE
     
-    # Get translation
-    if language in translations and key in translations[language]:
-        text = translations[language][key]
-    elif DEFAULT_LANGUAGE in translations and key in translations[DEFAULT_LANGUAGE]:
-        text = translations[DEFAULT_LANGUAGE][key]
-    else:
-        text = key
+    # Get translation (the table already falls back to the default language)
+    entry = catalog.get(language, catalog.get(DEFAULT_LANGUAGE, {})).get(key)
+    if entry is None:
+        entry = _compile_missing(language, key)
+        if entry is None:
+            return key
+    text, render = entry
     
     # Apply format parameters if provided
-    if kwargs:
+    if kwargs and render is not None:
         try:
-            text = text.format(**kwargs)
+            return render(kwargs)
         except Exception as e:
             print(f"Error formatting translation for key {key}: {e}")
     
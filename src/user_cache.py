@@ -0,0 +1,109 @@
+"""
+In-memory user state cache for the Traditional Matchmaking Telegram Bot.
+
+Almost every update needs the same few facts about its sender: the internal
+user id, the language preference, whether the profile is complete and the
+account status. They are kept here per Telegram id, least recently used
+entries evicted beyond USER_CACHE_SIZE and every entry reloaded after
+USER_CACHE_TTL seconds, so most updates need no query to resolve them.
+
+Repository functions that change these facts invalidate the user's entry.
+In worker mode each process only sees its own shard of users, so its cache
+is never stale because of another process's writes; the TTL bounds
+staleness after changes made outside the bot (e.g. moderation).
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from src.config import DEFAULT_LANGUAGE, USER_CACHE_SIZE, USER_CACHE_TTL
+from src.models import User, Profile, UserSettings
+
+UserState = namedtuple('UserState', ['user_id', 'language', 'has_profile', 'account_status'])
+
+class UserCache:
+    """Thread-safe LRU cache of UserState with a time to live."""
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        # Repository functions run on several executor threads
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, telegram_id):
+        """Return the cached state of a user, or None if missing or expired."""
+        key = str(telegram_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < self.clock():
+                self._entries.pop(key, None)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, telegram_id, state):
+        key = str(telegram_id)
+        with self._lock:
+            self._entries[key] = (state, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._entries.pop(str(telegram_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+user_cache = UserCache()
+
+def remember_user(user):
+    """
+    Cache the state of a User that was loaded anyway (with profile and settings).
+
+    Returns:
+        UserState
+    """
+    language = user.settings.language_preference if user.settings else None
+    state = UserState(user.id, language or DEFAULT_LANGUAGE, user.profile is not None, user.account_status)
+    user_cache.put(user.telegram_id, state)
+    return state
+
+def load_user_state(session, telegram_id):
+    """
+    Return a user's UserState, from the cache or with a single query.
+
+    Args:
+        session: Database session, only used on a cache miss
+        telegram_id: Telegram user id
+
+    Returns:
+        UserState, or None if the user is not registered
+    """
+    state = user_cache.get(telegram_id)
+    if state is not None:
+        return state
+
+    row = session.query(
+        User.id, UserSettings.language_preference, Profile.id, User.account_status
+    ).outerjoin(UserSettings, UserSettings.user_id == User.id).outerjoin(
+        Profile, Profile.user_id == User.id
+    ).filter(User.telegram_id == str(telegram_id)).first()
+    if row is None:
+        return None
+
+    user_id, language, profile_id, account_status = row
+    state = UserState(user_id, language or DEFAULT_LANGUAGE, profile_id is not None, account_status)
+    user_cache.put(telegram_id, state)
+    return state
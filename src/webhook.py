@@ -0,0 +1,170 @@
+"""
+Webhook server mode for the Traditional Matchmaking Telegram Bot.
+
+WebhookApp is a plain ASGI application: Telegram POSTs every update to it,
+the secret token header is checked, and the update is put on one of several
+bounded queues. A full queue holds the request until there is room (or
+answers 503 so Telegram redelivers later). Each queue is drained by its own
+task and updates are assigned to queues by the sender's Telegram id, so a
+user's updates are still processed in order while different users are
+handled concurrently.
+
+Enabled by setting WEBHOOK_URL; serving requires an ASGI server (uvicorn):
+    WEBHOOK_URL=https://bot.example.com/telegram python run.py
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+
+from telegram import Update
+
+from src.config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET,
+    WEBHOOK_QUEUE_SIZE, WEBHOOK_CONCURRENCY, WEBHOOK_ENQUEUE_TIMEOUT
+)
+from src.workers import route_update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+class WebhookApp:
+    """ASGI application feeding Telegram webhook updates to a PTB Application."""
+
+    def __init__(self, application, secret_token, path=WEBHOOK_PATH, queue_size=WEBHOOK_QUEUE_SIZE,
+                 concurrency=WEBHOOK_CONCURRENCY, enqueue_timeout=WEBHOOK_ENQUEUE_TIMEOUT, webhook_url=None):
+        """
+        Args:
+            application: Application built without an updater
+            secret_token: Value Telegram must send in the secret token header
+            path: URL path updates are POSTed to
+            queue_size: Updates buffered in total before requests wait
+            concurrency: Number of queues, each drained by one task
+            enqueue_timeout: Seconds a request waits for room before a 503
+            webhook_url: If given, registered with Telegram on startup
+        """
+        self.application = application
+        self.secret_token = secret_token.encode()
+        self.path = path
+        self.enqueue_timeout = enqueue_timeout
+        self.webhook_url = webhook_url
+        self.queues = [asyncio.Queue(max(1, -(-queue_size // concurrency))) for _ in range(concurrency)]
+        self.drainers = []
+        self.stats = {'accepted': 0, 'processed': 0, 'rejected': 0, 'failed': 0}
+
+    async def startup(self):
+        """Start the application and the drain tasks."""
+        await self.application.initialize()
+        # Run the hooks run_polling would run
+        post_init = getattr(self.application, 'post_init', None)
+        if post_init:
+            await post_init(self.application)
+        await self.application.start()
+        self.drainers = [asyncio.create_task(self._drain(updates)) for updates in self.queues]
+        if self.webhook_url:
+            await self.application.bot.set_webhook(
+                self.webhook_url, secret_token=self.secret_token.decode(),
+                allowed_updates=Update.ALL_TYPES, max_connections=len(self.queues)
+            )
+
+    async def shutdown(self):
+        """Process every queued update, then stop the application."""
+        for updates in self.queues:
+            await updates.join()
+        for drainer in self.drainers:
+            drainer.cancel()
+        await asyncio.gather(*self.drainers, return_exceptions=True)
+        await self.application.stop()
+        post_stop = getattr(self.application, 'post_stop', None)
+        if post_stop:
+            await post_stop(self.application)
+        await self.application.shutdown()
+
+    async def _drain(self, updates):
+        """Process the updates of one queue in order."""
+        while True:
+            update = await updates.get()
+            try:
+                await self.application.process_update(update)
+                self.stats['processed'] += 1
+            except Exception:
+                self.stats['failed'] += 1
+                logger.exception("Failed to process update %s", update.update_id)
+            finally:
+                updates.task_done()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status = await self._handle(scope, receive)
+            await send({'type': 'http.response.start', 'status': status,
+                        'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b''})
+
+    async def _lifespan(self, receive, send):
+        """Run startup and shutdown for the ASGI server's lifespan events."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, scope, receive):
+        """Validate and enqueue one webhook request, returning the HTTP status."""
+        if scope['path'] != self.path:
+            return 404
+        if scope['method'] != 'POST':
+            return 405
+
+        token = dict(scope['headers']).get(SECRET_HEADER, b'')
+        if not hmac.compare_digest(token, self.secret_token):
+            return 403
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return 400
+
+        try:
+            await asyncio.wait_for(route_update(update, self.queues).put(update), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            # Telegram retries non-2xx deliveries, so shed load instead of waiting longer
+            self.stats['rejected'] += 1
+            return 503
+        self.stats['accepted'] += 1
+        return 200
+
+def run_webhook():
+    """Serve the bot's webhook with uvicorn until interrupted."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("Webhook mode needs an ASGI server: pip install uvicorn")
+
+    from src.bot import build_application
+    from src.database import init_db
+    from src.persistence import SQLPersistence
+    from src.translations import load_translations
+
+    init_db()
+    load_translations()
+
+    # Telegram accepts 1-256 characters from A-Z, a-z, 0-9, _ and -
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    app = WebhookApp(build_application(persistence=SQLPersistence(), updater=False), secret_token, webhook_url=WEBHOOK_URL)
+    uvicorn.run(app, host=WEBHOOK_LISTEN, port=WEBHOOK_PORT, lifespan="on", log_level="info")
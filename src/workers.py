@@ -0,0 +1,161 @@
+"""
+Multi-process worker mode for the Traditional Matchmaking Telegram Bot.
+
+One ingress process long-polls Telegram and hands every update to one of N
+worker processes, chosen by the sender's Telegram id, so all of a user's
+updates are handled in order by the same process. Each worker runs the
+regular application (see bot.build_application) without an updater and
+keeps conversation state in the database through SQLPersistence, loading
+only its own shard of users. Scoring in one worker no longer delays the
+handlers of users served by the others.
+
+Enabled by setting BOT_WORKERS above 1:
+    BOT_WORKERS=4 python run.py
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+
+from telegram import Bot, Update
+
+from src.config import BOT_TOKEN, BOT_WORKERS, WORKER_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Seconds Telegram holds a getUpdates request open when there is nothing new
+POLL_TIMEOUT = 30
+
+def shard_for(telegram_id, shards):
+    """Return the worker index that handles a Telegram user."""
+    return (telegram_id or 0) % shards
+
+def route_update(update, queues):
+    """
+    Return the worker queue an update belongs to.
+
+    Args:
+        update: Telegram Update
+        queues: One queue per worker process
+
+    Returns:
+        Queue of the worker owning the update's sender
+    """
+    user = update.effective_user
+    return queues[shard_for(user.id if user else 0, len(queues))]
+
+async def serve_worker(shard, shards, updates):
+    """
+    Feed the updates of one shard to an application until None is received.
+
+    Args:
+        shard: Index of this worker
+        shards: Number of workers
+        updates: Queue of update dictionaries from the ingress process
+    """
+    from src.bot import build_application
+    from src.persistence import SQLPersistence
+    from src.notifications import set_delivery_shard
+    from src.sender import share_send_rate
+    from src.translations import load_translations
+
+    load_translations()
+    share_send_rate(shards)
+    set_delivery_shard(shard, shards)
+    application = build_application(persistence=SQLPersistence(shard, shards), updater=False)
+    loop = asyncio.get_running_loop()
+
+    async with application:
+        # Run the hooks run_polling would run
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        try:
+            while True:
+                data = await loop.run_in_executor(None, updates.get)
+                if data is None:
+                    break
+                # The application processes its queue in order, one update at a time
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+
+def _worker_main(shard, shards, updates):
+    """Entry point of a worker process."""
+    logging.basicConfig(
+        format=f'%(asctime)s - worker {shard} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(serve_worker(shard, shards, updates))
+
+def _start_worker(context, shard, shards, updates):
+    """Start the worker process of a shard."""
+    process = context.Process(target=_worker_main, args=(shard, shards, updates),
+                              name=f"bot-worker-{shard}", daemon=True)
+    process.start()
+    return process
+
+async def run_ingress(bot, queues, processes=None, restart=None):
+    """
+    Long-poll Telegram and dispatch every update to its worker's queue.
+
+    A full queue blocks polling, so a slow worker applies back-pressure
+    instead of growing memory without bound.
+
+    Args:
+        bot: Bot used for getUpdates
+        queues: One bounded queue per worker
+        processes: Worker processes, checked before every poll
+        restart: Callable(shard) returning a replacement for a dead worker
+    """
+    loop = asyncio.get_running_loop()
+    offset = None
+    async with bot:
+        while True:
+            for shard, process in enumerate(processes or ()):
+                if not process.is_alive():
+                    logger.error("Worker %d exited with code %s, restarting", shard, process.exitcode)
+                    processes[shard] = restart(shard)
+
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT,
+                                            allowed_updates=Update.ALL_TYPES)
+            for update in updates:
+                await loop.run_in_executor(None, route_update(update, queues).put, update.to_dict())
+                offset = update.update_id + 1
+
+def run_workers(workers=BOT_WORKERS, queue_size=WORKER_QUEUE_SIZE):
+    """
+    Run the bot as one ingress process and `workers` worker processes.
+
+    Args:
+        workers: Number of worker processes
+        queue_size: Updates buffered per worker before polling pauses
+    """
+    from src.database import init_db
+
+    init_db()
+
+    # Workers are spawned so none inherits this process's database connections
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(queue_size) for _ in range(workers)]
+    processes = [_start_worker(context, shard, workers, queues[shard]) for shard in range(workers)]
+    logger.info("Started %d worker processes", workers)
+
+    try:
+        asyncio.run(run_ingress(
+            Bot(BOT_TOKEN), queues, processes,
+            lambda shard: _start_worker(context, shard, workers, queues[shard])
+        ))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for updates in queues:
+            try:
+                updates.put(None, timeout=1)
+            except queue.Full:
+                pass
+        for process in processes:
+            process.join(timeout=10)
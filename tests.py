@@ -2,24 +2,68 @@
 Test script for the Traditional Matchmaking Telegram Bot.
 """
 
+import asyncio
+import json
 import os
 import sys
+import random
+import shutil
+import tempfile
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from src.models import User, Profile, Match, Conversation, Gender, ReligiosityLevel, CoveringStyle
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.models import (
+    Base, User, Profile, Match, Conversation, UserSettings, Interest,
+    Gender, ReligiosityLevel, CoveringStyle, MatchStatus, AccountStatus
+)
 from src.matching import (
     calculate_personality_compatibility, calculate_zodiac_compatibility,
     calculate_religious_compatibility, calculate_family_values_compatibility,
     calculate_lifestyle_compatibility, calculate_overall_compatibility,
-    score_personality_test, determine_zodiac_sign
+    score_personality_test, determine_zodiac_sign, PersonalityType, ZodiacSign,
+    MBTI_COMPATIBILITY, ZODIAC_COMPATIBILITY, personality_code, zodiac_code,
+    personality_compatibility_by_code, zodiac_compatibility_by_code, validate_compatibility_tables,
+    has_dealbreakers
 )
+from src.batch_matching import calculate_batch_compatibility, calculate_batch_features_compatibility
+from src.ranking import top_k_matches, top_k_features
+from src.score_cache import ScoreCache, cached_top_k, score_cache
+from src.features import (
+    ProfileFeatureStore, ProfileVocabularies, encode_profile, calculate_features_compatibility,
+    features_have_dealbreakers, feature_store
+)
+from src.candidates import find_candidates, find_candidate_ids, build_candidate_query
+from src.ann import CandidateIndex, current_generation
+from src.snapshot import ProfileSnapshot, write_snapshot, record_profile_change, current_version
+from src.migrations import apply_columns, apply_indexes, drop_indexes
+from src.match_cache import get_ranked_matches, invalidate_user
+from src.models import MatchCacheEntry, DailySlate, PipelineCheckpoint
+from src.pipeline import generate_daily_slates, get_daily_slate, pending_user_chunks
+from src.database import run_db, create_db_engine, get_session
+from src import repository
+from src.persistence import SQLPersistence
+from src.workers import shard_for, route_update
+from src.webhook import WebhookApp
+from src.sender import SendQueue, INTERACTIVE, BULK, get_send_queue, share_send_rate
+from src.notifications import deliver_pending, set_delivery_shard
+from src.models import OutboxEvent, PairScore, SeenPair
+from src.seen_pairs import record_seen_pairs, expire_seen_pairs, utc_today
+from src.user_cache import UserCache, UserState, user_cache
+from telegram.error import RetryAfter
+import src.bot as bot
 from src.translations import get_text, load_translations
-from datetime import datetime
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 class TestMatchingAlgorithms(unittest.TestCase):
     """Test cases for matching algorithms."""
@@ -142,6 +186,1393 @@ class TestMatchingAlgorithms(unittest.TestCase):
         self.assertEqual(determine_zodiac_sign(taurus_date).value, "Taurus")
         self.assertEqual(determine_zodiac_sign(gemini_date).value, "Gemini")
 
+    def test_compatibility_tables_complete(self):
+        """MBTI and zodiac tables cover every pair symmetrically."""
+        self.assertEqual(validate_compatibility_tables(), [])
+
+    def test_code_lookup_matches_enum_lookup(self):
+        """Pre-encoded codes give the same score as strings and enum members."""
+        for type_a in PersonalityType:
+            for type_b in PersonalityType:
+                score = personality_compatibility_by_code(personality_code(type_a.value), personality_code(type_b))
+                self.assertEqual(score, MBTI_COMPATIBILITY[type_a][type_b])
+                self.assertEqual(score, calculate_personality_compatibility(type_a.value, type_b))
+        for sign_a in ZodiacSign:
+            for sign_b in ZodiacSign:
+                score = zodiac_compatibility_by_code(zodiac_code(sign_a), zodiac_code(sign_b.value))
+                self.assertEqual(score, ZODIAC_COMPATIBILITY[sign_a][sign_b])
+                self.assertEqual(score, calculate_zodiac_compatibility(sign_a, sign_b.value))
+
+        with self.assertRaises(ValueError):
+            calculate_personality_compatibility("XXXX", "INTJ")
+        self.assertEqual(calculate_zodiac_compatibility(None, "Leo"), 50)
+
+def make_random_profile(rng):
+    """Build a profile-like object with randomly filled matching fields."""
+    def maybe(values):
+        return rng.choice(values + [None])
+    
+    return SimpleNamespace(
+        gender=maybe(list(Gender)),
+        religiosity_level=maybe(list(ReligiosityLevel)),
+        prayer_habits=maybe(["Five times daily", "Most daily prayers", "Weekly", "Occasionally", "Rarely"]),
+        religious_education=maybe(["Formal Islamic education", "Regular Islamic classes", "Self-taught", "Basic knowledge"]),
+        religious_practices=rng.sample(["Quran reading", "Charity work", "Fasting", "Gatherings", "Umrah"], rng.randint(0, 3)),
+        living_arrangement=maybe(["With husband's family", "With wife's family", "Independent home near family",
+                                  "Completely independent", "Undecided"]),
+        family_size=maybe(["No children", "1-2 children", "3-5 children", "More than 5"]),
+        role_expectations=maybe([{
+            "husband_role": rng.sample(["Provider", "Spiritual leader", "Decision maker"], rng.randint(0, 2)),
+            "wife_role": rng.sample(["Homemaker", "Child-rearer", "Career professional"], rng.randint(0, 2))
+        }]),
+        education_level=maybe(["High School", "Bachelor's Degree", "Master's Degree", "PhD", "Other"]),
+        interests=[SimpleNamespace(id=i) for i in rng.sample(range(1, 80), rng.randint(0, 6))],
+        personality_type=maybe([t.value for t in PersonalityType]),
+        zodiac_sign=maybe([s.value for s in ZodiacSign]),
+        personal_covering=maybe(list(CoveringStyle)),
+        partner_covering_preference=maybe(list(CoveringStyle)),
+        covering_importance=maybe([1, 3, 5]),
+        settings=maybe([SimpleNamespace(religious_dealbreaker=True)])
+    )
+
+class TestBatchMatching(unittest.TestCase):
+    """Test cases for vectorized batch scoring."""
+    
+    def test_batch_matches_scalar_scores(self):
+        """Batch scores must be identical to the scalar function."""
+        rng = random.Random(42)
+        for _ in range(20):
+            seeker = make_random_profile(rng)
+            candidates = [make_random_profile(rng) for _ in range(50)]
+            
+            batch_scores = calculate_batch_compatibility(seeker, candidates)
+            scalar_scores = [calculate_overall_compatibility(seeker, c) for c in candidates]
+            
+            self.assertEqual(list(batch_scores), scalar_scores)
+    
+    def test_batch_empty_candidates(self):
+        """Scoring against no candidates returns an empty vector."""
+        rng = random.Random(1)
+        self.assertEqual(len(calculate_batch_compatibility(make_random_profile(rng), [])), 0)
+
+class TestRanking(unittest.TestCase):
+    """Test cases for bounded top-K ranking."""
+    
+    def exhaustive(self, scores, k):
+        order = sorted(range(len(scores)), key=lambda index: -scores[index])
+        return [(index, scores[index]) for index in order if scores[index] > 0][:k]
+    
+    def test_top_k_matches_exhaustive_ranking(self):
+        """Pruned selection must return exactly the exhaustive top K, ties included."""
+        rng = random.Random(5)
+        vocabularies = ProfileVocabularies()
+        pruned = 0
+        for k in (0, 1, 5, 40):
+            seeker = make_random_profile(rng)
+            # Duplicates produce exact ties
+            candidates = [make_random_profile(rng) for _ in range(150)]
+            candidates += candidates[:20]
+            expected = self.exhaustive([calculate_overall_compatibility(seeker, c) for c in candidates], k)
+            
+            stats = {}
+            self.assertEqual(top_k_matches(seeker, candidates, k, stats=stats), expected)
+            if not k:
+                # Nothing is scored when no candidate can be selected
+                self.assertEqual(stats, {'scored': 0, 'pruned': 0, 'blocked': 0})
+            records = [encode_profile(c, vocabularies) for c in candidates]
+            self.assertEqual(top_k_features(encode_profile(seeker, vocabularies), records, k), expected)
+            pruned += stats.get('pruned', 0)
+        self.assertGreater(pruned, 0)
+
+class TestScoreCache(unittest.TestCase):
+    """Test cases for the pairwise score cache."""
+    
+    def make_records(self, count):
+        rng = random.Random(9)
+        vocabularies = ProfileVocabularies()
+        profiles = [make_random_profile(rng) for _ in range(count)]
+        for profile_id, profile in enumerate(profiles, 1):
+            profile.id = profile_id
+        return [encode_profile(profile, vocabularies) for profile in profiles], vocabularies
+    
+    def test_cached_scores_invalidated_by_version(self):
+        """Every exactly scored pair is cached, and a bumped version or settings change is scored again."""
+        records, vocabularies = self.make_records(41)
+        seeker, candidates = records[0], records[1:]
+        scored = []
+        expected = top_k_features(seeker, candidates, 10, scored=scored)
+        cache = ScoreCache(maxsize=1000, shared=False)
+        
+        self.assertEqual(cached_top_k(seeker, candidates, 10, cache=cache), expected)
+        self.assertEqual(len(cache), len(scored))
+        self.assertGreater(len(cache), 10)
+        self.assertEqual(cached_top_k(seeker, candidates, 10, cache=cache), expected)
+        self.assertEqual(cache.stats['hits'], len(scored))
+        
+        best = candidates[expected[0][0]]
+        for change in ('version', 'settings_digest'):
+            misses = cache.stats['misses']
+            setattr(best, change, getattr(best, change) + 1)
+            self.assertEqual(cached_top_k(seeker, candidates, 10, cache=cache), expected)
+            # Candidates pruned in the first ranking were scored by the second one
+            self.assertEqual(cache.stats['misses'] - misses, 1)
+        # Other weights are cached separately, and the oldest entries are evicted
+        small = ScoreCache(maxsize=15, shared=False)
+        weights = {'religious': 1.0, 'personality': 0, 'family': 0, 'lifestyle': 0, 'horoscope': 0}
+        self.assertEqual(cached_top_k(seeker, candidates, 10, weights, cache=small),
+                         top_k_features(seeker, candidates, 10, weights))
+        self.assertEqual(len(small), 15)
+        self.assertGreater(small.stats['evictions'], 0)
+        self.assertEqual(small.hit_rate, 0)
+    
+    def test_shared_table_between_processes(self):
+        """A score computed by one process is read from the shared table by another."""
+        records, vocabularies = self.make_records(41)
+        seeker, candidates = records[0], records[1:]
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        
+        first = ScoreCache(shared=True, session_factory=factory)
+        expected = cached_top_k(seeker, candidates, 10, cache=first)
+        other = ScoreCache(shared=True, session_factory=factory)
+        self.assertEqual(cached_top_k(seeker, candidates, 10, cache=other), expected)
+        self.assertEqual(other.stats['shared_hits'], len(first))
+        
+        # Rows of an older version are not used, and are replaced
+        candidates[expected[0][0]].version += 1
+        cached_top_k(seeker, candidates, 10, cache=ScoreCache(shared=True, session_factory=factory))
+        session = factory()
+        self.assertEqual(session.query(PairScore).count(), 40)
+        self.assertEqual(session.query(PairScore).filter(
+            PairScore.candidate_version == candidates[expected[0][0]].version).count(), 1)
+        session.close()
+        engine.dispose()
+
+class TestProfileFeatures(unittest.TestCase):
+    """Test cases for the encoded profile feature store."""
+    
+    def test_features_match_scalar_scores(self):
+        """Scoring encoded records must match scoring the profiles."""
+        rng = random.Random(7)
+        vocabularies = ProfileVocabularies()
+        profiles = [make_random_profile(rng) for _ in range(200)]
+        records = [encode_profile(profile, vocabularies) for profile in profiles]
+        
+        for i in range(0, len(profiles), 2):
+            self.assertEqual(
+                calculate_features_compatibility(records[i], records[i + 1]),
+                calculate_overall_compatibility(profiles[i], profiles[i + 1])
+            )
+    
+    def test_dealbreaker_masks_match_rules(self):
+        """The bitmask check blocks exactly the pairs the deal-breaker rules describe."""
+        from src.batch_matching import ProfileMatrix, batch_dealbreakers
+
+        def reference(a, b):
+            religious = (a.religiosity >= 0 and b.religiosity >= 0 and abs(a.religiosity - b.religiosity) > 1 and
+                         (a.religious_strict or b.religious_strict))
+            covering = a.gender != b.gender and any(
+                x.partner_covering >= 0 and y.personal_covering >= 0 and
+                x.partner_covering != y.personal_covering and x.covering_strict
+                for x, y in ((a, b), (b, a))
+            )
+            return bool(religious or covering)
+
+        rng = random.Random(11)
+        vocabularies = ProfileVocabularies()
+        profiles = [make_random_profile(rng) for _ in range(120)]
+        for profile in profiles[::7]:
+            profile.gender = None
+        records = [encode_profile(profile, vocabularies) for profile in profiles]
+        matrix = ProfileMatrix.from_features(records, vocabularies)
+        blocked = 0
+        for row, seeker in enumerate(records):
+            expected = [reference(seeker, record) for record in records]
+            self.assertEqual([features_have_dealbreakers(seeker, record) for record in records], expected)
+            self.assertEqual(list(batch_dealbreakers(matrix.take(slice(row, row + 1)), matrix)), expected)
+            blocked += sum(expected)
+        self.assertGreater(blocked, 0)
+
+    def test_religious_strictness_read_from_user_settings(self):
+        """Strictness kept in the user's settings blocks pairs in the encoded and scalar paths."""
+        session = make_test_session()
+        strict = add_test_user(session, 1, Gender.MALE, religiosity_level=ReligiosityLevel.CONSERVATIVE)
+        strict.settings = UserSettings(religious_dealbreaker=True)
+        other = add_test_user(session, 2, Gender.FEMALE, religiosity_level=ReligiosityLevel.PROGRESSIVE)
+        session.commit()
+        
+        vocabularies = ProfileVocabularies()
+        records = [encode_profile(user.profile, vocabularies) for user in (strict, other)]
+        self.assertTrue(records[0].religious_strict)
+        self.assertTrue(features_have_dealbreakers(*records))
+        self.assertTrue(has_dealbreakers(strict.profile, other.profile))
+        self.assertEqual(calculate_overall_compatibility(strict.profile, other.profile), 0)
+        session.close()
+    
+    def test_default_settings_are_not_strict(self):
+        """A settings row the user never changed adds no religious deal-breaker."""
+        session = make_test_session()
+        seeker = add_test_user(session, 1, Gender.MALE, religiosity_level=ReligiosityLevel.CONSERVATIVE)
+        seeker.settings = UserSettings()
+        other = add_test_user(session, 2, Gender.FEMALE, religiosity_level=ReligiosityLevel.PROGRESSIVE)
+        other.settings = UserSettings()
+        session.commit()
+        
+        record = encode_profile(seeker.profile, ProfileVocabularies())
+        self.assertFalse(record.religious_strict)
+        self.assertFalse(has_dealbreakers(seeker.profile, other.profile))
+        self.assertEqual([user.id for user in find_candidates(session, seeker)], [other.id])
+        session.close()
+    
+    def test_store_encodes_once(self):
+        """The store returns the cached record until the profile is updated."""
+        rng = random.Random(3)
+        profile = make_random_profile(rng)
+        profile.id = 10
+        store = ProfileFeatureStore()
+        
+        record = store.get(profile)
+        self.assertIs(store.get(profile), record)
+        self.assertIsNot(store.update(profile), record)
+        self.assertIn(10, store)
+    
+    def test_store_reencodes_newer_version(self):
+        """A profile saved through another session is encoded again on next use."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        user = add_test_user(session, 1, Gender.MALE, religiosity_level=ReligiosityLevel.MODERATE)
+        session.commit()
+        store = ProfileFeatureStore()
+        record = store.get(user.profile)
+        
+        other = factory()
+        profile = other.get(Profile, user.profile.id)
+        profile.religiosity_level = ReligiosityLevel.CONSERVATIVE
+        profile.version += 1
+        other.commit()
+        other.close()
+        
+        session.expire_all()
+        updated = store.get(user.profile)
+        self.assertIsNot(updated, record)
+        self.assertEqual(updated.version, 2)
+        self.assertNotEqual(updated.religiosity, record.religiosity)
+        self.assertIs(store.get(user.profile), updated)
+        session.close()
+        engine.dispose()
+
+class TestCandidateIndex(unittest.TestCase):
+    """Test cases for nearest-neighbour candidate retrieval."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        rng = random.Random(11)
+        self.store = ProfileFeatureStore()
+        profiles = [make_random_profile(rng) for _ in range(600)]
+        for user_id, profile in enumerate(profiles, 1):
+            profile.id = profile.user_id = user_id
+        self.records = self.store.get_many(profiles)
+        self.index = CandidateIndex.build(self.records, self.store.vocabularies, nlist=8)
+    
+    def test_search_recalls_best_candidates(self):
+        """Probing every list retrieves most of the exact top candidates of the opposite gender."""
+        found = 0
+        seekers = [record for record in self.records if record.gender >= 0][:20]
+        for seeker in seekers:
+            retrieved = self.index.search(seeker, self.store.vocabularies, k=60, nprobe=8)
+            candidates = [record for record in self.records if record.user_id in set(retrieved)]
+            self.assertTrue(all(record.gender != seeker.gender for record in candidates))
+            self.assertFalse(any(features_have_dealbreakers(seeker, record) for record in candidates))
+            
+            eligible = [record for record in self.records if record.gender != seeker.gender and
+                        record.gender >= 0 and not features_have_dealbreakers(seeker, record)]
+            best = sorted(eligible, key=lambda record: -calculate_features_compatibility(seeker, record))[:5]
+            found += sum(record.user_id in retrieved for record in best)
+        self.assertGreaterEqual(found / (5 * len(seekers)), 0.8)
+    
+    def test_save_and_load(self):
+        """A saved index is memory-mapped back with the same results."""
+        seeker = next(record for record in self.records if record.gender >= 0)
+        with tempfile.TemporaryDirectory() as directory:
+            self.index.save(directory)
+            loaded = CandidateIndex.load(directory)
+            self.assertEqual(len(loaded), len(self.index))
+            self.assertEqual(loaded.search(seeker, self.store.vocabularies, k=20),
+                             self.index.search(seeker, self.store.vocabularies, k=20))
+            del loaded
+            
+            # Every save publishes a new generation; the oldest ones are pruned
+            self.assertEqual(self.index.save(directory, keep=2), 2)
+            self.assertEqual(self.index.save(directory, keep=2), 3)
+            self.assertEqual(current_generation(directory), 3)
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.startswith("g")),
+                             ["g000002", "g000003"])
+            self.assertEqual(len(CandidateIndex.load(directory, 2)), len(self.index))
+        self.assertIsNone(CandidateIndex.load(os.path.join(directory, "missing")))
+
+class TestProfileSnapshot(unittest.TestCase):
+    """Test cases for memory-mapped profile snapshots."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.rng = random.Random(5)
+        self.root = tempfile.mkdtemp()
+        self.profiles = [make_random_profile(self.rng) for _ in range(100)]
+        for user_id, profile in enumerate(self.profiles, 1):
+            profile.id = profile.user_id = user_id
+        # The snapshot and the scoring process encode with different vocabularies
+        export_store = ProfileFeatureStore()
+        write_snapshot(export_store.get_many(reversed(self.profiles)), export_store.vocabularies, self.root)
+        self.store = ProfileFeatureStore()
+    
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+    
+    def expected_scores(self, seeker, profiles):
+        return list(calculate_batch_features_compatibility(
+            self.store.get(seeker), self.store.get_many(profiles), self.store.vocabularies))
+    
+    def test_scores_match_features(self):
+        """Scoring from the mapped snapshot matches scoring the encoded records."""
+        snapshot = ProfileSnapshot.load(self.root)
+        seeker = make_random_profile(self.rng)
+        
+        user_ids, scores = snapshot.score(self.store.get(seeker), self.store.vocabularies)
+        self.assertEqual(list(user_ids), list(range(1, 101)))
+        self.assertEqual(list(scores), self.expected_scores(seeker, self.profiles))
+        
+        user_ids, scores = snapshot.score(self.store.get(seeker), self.store.vocabularies, [7, 3, 500])
+        self.assertEqual(list(user_ids), [7, 3])
+        self.assertEqual(list(scores), self.expected_scores(seeker, [self.profiles[6], self.profiles[2]]))
+    
+    def test_delta_log_and_versions(self):
+        """Changed profiles are applied from the delta log until the next version replaces them."""
+        changed = make_random_profile(self.rng)
+        changed.id = changed.user_id = 4
+        added = make_random_profile(self.rng)
+        added.id = added.user_id = 101
+        for profile in (changed, added):
+            record_profile_change(self.store.get(profile), self.store.vocabularies, self.root)
+        
+        snapshot = ProfileSnapshot.load(self.root)
+        seeker = make_random_profile(self.rng)
+        user_ids, scores = snapshot.score(self.store.get(seeker), self.store.vocabularies, [4, 101])
+        self.assertEqual(len(snapshot), 101)
+        self.assertEqual(sorted(zip(user_ids, scores)),
+                         list(zip([4, 101], self.expected_scores(seeker, [changed, added]))))
+        
+        # Publishing newer versions prunes old ones and the delta entries they no longer need
+        for _ in range(2):
+            write_snapshot(self.store.get_many(self.profiles), self.store.vocabularies, self.root, keep=2)
+        self.assertEqual(current_version(self.root), 3)
+        self.assertEqual(sorted(name for name in os.listdir(self.root) if name.startswith("v")),
+                         ["v000002", "v000003"])
+        with open(os.path.join(self.root, "delta.jsonl")) as log:
+            self.assertEqual(log.read(), "")
+        self.assertEqual(len(ProfileSnapshot.load(self.root)), 100)
+    
+    def test_missing_masks_are_an_error(self):
+        """Snapshot columns or delta entries without deal-breaker masks are rejected, not recomputed."""
+        changed = make_random_profile(self.rng)
+        changed.id = changed.user_id = 4
+        record_profile_change(self.store.get(changed), self.store.vocabularies, self.root)
+        log = os.path.join(self.root, "delta.jsonl")
+        with open(log) as entries:
+            entry = json.loads(entries.read())
+        del entry["record"]["offers"]
+        with open(log, "w") as entries:
+            entries.write(json.dumps(entry) + "\n")
+        with self.assertRaises(ValueError):
+            ProfileSnapshot.load(self.root)
+        
+        os.remove(log)
+        manifest = os.path.join(self.root, "v000001", "manifest.json")
+        with open(manifest) as manifest_file:
+            info = json.load(manifest_file)
+        info["columns"].remove("accepts")
+        with open(manifest, "w") as manifest_file:
+            json.dump(info, manifest_file)
+        with self.assertRaises(ValueError):
+            ProfileSnapshot.load(self.root)
+
+def make_test_session():
+    """Create a session bound to a fresh in-memory database."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+def add_test_user(session, telegram_id, gender, age=30, **profile_fields):
+    """Add a user with a profile to the test database."""
+    user = User(telegram_id=str(telegram_id), first_name=f"User {telegram_id}")
+    user.profile = Profile(gender=gender, age=age, **profile_fields)
+    session.add(user)
+    session.flush()
+    return user
+
+class TestCandidateQuery(unittest.TestCase):
+    """Test cases for SQL-side candidate generation."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.session = make_test_session()
+        self.seeker = add_test_user(self.session, 1, Gender.MALE, age=30, nationality="Saudi",
+                                    religiosity_level=ReligiosityLevel.CONSERVATIVE)
+    
+    def tearDown(self):
+        self.session.close()
+    
+    def candidate_ids(self):
+        return {user.telegram_id for user in find_candidates(self.session, self.seeker)}
+    
+    def test_filters_gender_and_status(self):
+        """Only active users of the opposite gender are returned."""
+        add_test_user(self.session, 2, Gender.FEMALE)
+        add_test_user(self.session, 3, Gender.MALE)
+        banned = add_test_user(self.session, 4, Gender.FEMALE)
+        banned.account_status = AccountStatus.BANNED
+        self.session.flush()
+        
+        self.assertEqual(self.candidate_ids(), {"2"})
+    
+    def test_index_keeps_newer_profiles_and_falls_back(self):
+        """Profiles saved after the index build stay candidates, and too few survivors use the full query."""
+        from src import ann
+        
+        females = [add_test_user(self.session, telegram_id, Gender.FEMALE) for telegram_id in range(2, 9)]
+        self.session.commit()
+        feature_store.clear()
+        self.addCleanup(feature_store.clear)
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(ann, 'ANN_INDEX_DIR', directory), \
+                patch.object(ann, '_candidate_index', None), patch.object(ann, '_candidate_index_generation', None), \
+                patch('src.candidates.ANN_CANDIDATES', 1), patch('src.candidates.ANN_OVERFETCH', 2):
+            built = ann.build_candidate_index(self.session, directory, nlist=1)
+            indexed = self.candidate_ids()
+            self.assertEqual(len(indexed), 2)
+            
+            newcomer = add_test_user(self.session, 9, Gender.FEMALE)
+            changed = next(user for user in females if user.telegram_id not in indexed)
+            changed.profile.city = "Jeddah"
+            self.session.commit()
+            self.assertEqual(self.candidate_ids(), indexed | {"9", changed.telegram_id})
+            
+            # Nothing the index knows about survives, so every eligible user is considered
+            record_seen_pairs(self.session, [(self.seeker.id, user.id) for user in females + [newcomer]
+                                             if user.telegram_id in indexed | {"9", changed.telegram_id}])
+            self.session.commit()
+            self.assertEqual(len(self.candidate_ids()), 4)
+            
+            # A rebuild by another process is picked up
+            CandidateIndex.build([], feature_store.vocabularies).save(directory)
+            self.assertIsNot(ann.get_candidate_index(), built)
+            self.assertEqual(len(ann.get_candidate_index()), 0)
+    
+    def test_pool_limit_needs_index(self):
+        """Without an index every eligible user is ranked, however many there are."""
+        for telegram_id in range(2, 6):
+            add_test_user(self.session, telegram_id, Gender.FEMALE)
+        self.session.flush()
+        
+        found = {user.telegram_id for user in find_candidates(self.session, self.seeker, limit=2)}
+        self.assertEqual(found, {"2", "3", "4", "5"})
+        self.assertEqual(len(find_candidate_ids(self.session, self.seeker, limit=2)), 4)
+        limited = build_candidate_query(self.session, self.seeker, limit=2).all()
+        self.assertEqual([user.telegram_id for user in limited], ["2", "3"])
+    
+    def test_filters_preferences_both_ways(self):
+        """Age range and nationality preferences are applied on both sides."""
+        self.seeker.settings = UserSettings(age_range_min=25, age_range_max=32,
+                                            preferred_nationalities=["Saudi", "Emirati"])
+        add_test_user(self.session, 2, Gender.FEMALE, age=28, nationality="Emirati")
+        add_test_user(self.session, 3, Gender.FEMALE, age=40, nationality="Saudi")
+        add_test_user(self.session, 4, Gender.FEMALE, age=28, nationality="Omani")
+        picky = add_test_user(self.session, 5, Gender.FEMALE, age=28, nationality="Saudi")
+        picky.settings = UserSettings(age_range_max=29)
+        self.session.flush()
+        
+        self.assertEqual(self.candidate_ids(), {"2"})
+    
+    def test_excludes_previous_decisions(self):
+        """Users already responded to, or who rejected the user, are excluded."""
+        liked = add_test_user(self.session, 2, Gender.FEMALE)
+        rejected_by = add_test_user(self.session, 3, Gender.FEMALE)
+        admirer = add_test_user(self.session, 4, Gender.FEMALE)
+        self.session.add_all([
+            Match(sender_id=self.seeker.id, receiver_id=liked.id, compatibility_score=70),
+            Match(sender_id=rejected_by.id, receiver_id=self.seeker.id, compatibility_score=70,
+                  status=MatchStatus.REJECTED),
+            Match(sender_id=admirer.id, receiver_id=self.seeker.id, compatibility_score=70,
+                  status=MatchStatus.PENDING)
+        ])
+        self.session.flush()
+        
+        self.assertEqual(self.candidate_ids(), {"4"})
+    
+    def test_excludes_seen_pairs_until_expiry(self):
+        """Seen or declined candidates, and users who declined the seeker, return once expired."""
+        seen, declined, decliner, expired, viewer = (add_test_user(self.session, telegram_id, Gender.FEMALE)
+                                                     for telegram_id in range(2, 7))
+        record_seen_pairs(self.session, [(self.seeker.id, seen.id)])
+        record_seen_pairs(self.session, [(self.seeker.id, declined.id), (decliner.id, self.seeker.id)],
+                          rejected=True)
+        record_seen_pairs(self.session, [(self.seeker.id, expired.id)], now=datetime.utcnow() - timedelta(days=400))
+        # Being offered to the viewer does not hide the viewer from the seeker
+        record_seen_pairs(self.session, [(viewer.id, self.seeker.id)])
+        self.session.flush()
+        
+        self.assertEqual(self.candidate_ids(), {"5", "6"})
+        self.assertEqual(expire_seen_pairs(self.session), 1)
+        self.assertEqual(self.session.query(SeenPair).count(), 4)
+    
+    def test_seen_pair_keeps_rejection(self):
+        """Offering a declined candidate again keeps the rejection and its later expiry."""
+        candidate = add_test_user(self.session, 2, Gender.FEMALE)
+        record_seen_pairs(self.session, [(self.seeker.id, candidate.id)], rejected=True)
+        declined = self.session.query(SeenPair).one()
+        rejected_until = declined.expires_at
+        self.session.expire_all()
+        
+        record_seen_pairs(self.session, [(self.seeker.id, candidate.id)])
+        pair = self.session.query(SeenPair).one()
+        self.assertTrue(pair.rejected)
+        self.assertEqual(pair.expires_at, rejected_until)
+    
+    def test_applies_dealbreakers(self):
+        """Strict religious and covering preferences are enforced in SQL."""
+        self.seeker.settings = UserSettings(religious_dealbreaker=True)
+        self.seeker.profile.partner_covering_preference = CoveringStyle.HIJAB
+        self.seeker.profile.covering_importance = 5
+        add_test_user(self.session, 2, Gender.FEMALE, religiosity_level=ReligiosityLevel.PROGRESSIVE)
+        add_test_user(self.session, 3, Gender.FEMALE, personal_covering=CoveringStyle.NONE)
+        add_test_user(self.session, 4, Gender.FEMALE, religiosity_level=ReligiosityLevel.MODERATE,
+                      personal_covering=CoveringStyle.HIJAB)
+        self.session.flush()
+        
+        self.assertEqual(self.candidate_ids(), {"4"})
+
+class TestMatchCache(unittest.TestCase):
+    """Test cases for the ranked match cache."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.session = make_test_session()
+        self.seeker = add_test_user(self.session, 1, Gender.MALE, education_level="Master's Degree",
+                                    religiosity_level=ReligiosityLevel.MODERATE)
+        for telegram_id, education in ((2, "High School"), (3, "Master's Degree"), (4, "Bachelor's Degree")):
+            add_test_user(self.session, telegram_id, Gender.FEMALE, education_level=education,
+                          religiosity_level=ReligiosityLevel.MODERATE)
+        self.session.commit()
+    
+    def tearDown(self):
+        self.session.close()
+    
+    def test_ranked_by_score_and_reused(self):
+        """Candidates are ranked once and then read back from the cache."""
+        entries = get_ranked_matches(self.session, self.seeker)
+        scores = [entry.score for entry in entries]
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(self.session.get(User, entries[0].candidate_id).telegram_id, "3")
+        
+        self.assertEqual([e.candidate_id for e in get_ranked_matches(self.session, self.seeker)],
+                         [e.candidate_id for e in entries])
+    
+    def test_invalidate_only_affected_entries(self):
+        """A changed user is dropped from other rankings and loses their own."""
+        get_ranked_matches(self.session, self.seeker)
+        other = self.session.query(User).filter(User.telegram_id == "2").first()
+        get_ranked_matches(self.session, other)
+        
+        invalidate_user(self.session, other.id)
+        self.session.commit()
+        
+        remaining = self.session.query(MatchCacheEntry).all()
+        self.assertEqual(len(remaining), 2)
+        self.assertTrue(all(entry.user_id == self.seeker.id for entry in remaining))
+        self.assertNotIn(other.id, [entry.candidate_id for entry in remaining])
+
+class TestPipeline(unittest.TestCase):
+    """Test cases for the nightly slate generation pipeline."""
+    
+    def seed(self, session):
+        for telegram_id in range(1, 5):
+            add_test_user(session, telegram_id, Gender.MALE, education_level="Bachelor's Degree")
+        for telegram_id in range(5, 15):
+            add_test_user(session, telegram_id, Gender.FEMALE, education_level="PhD")
+        session.commit()
+    
+    def test_slates_respect_quota_and_resume(self):
+        """Slates hold at most MAX_DAILY_MATCHES entries and finished users are skipped."""
+        from src.config import MAX_DAILY_MATCHES
+        
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        self.seed(session)
+        run_date = datetime(2026, 1, 1).date()
+        
+        # Simulate a run interrupted after the first user
+        first = session.query(User).order_by(User.id).first()
+        session.add(PipelineCheckpoint(run_date=run_date, user_id=first.id))
+        session.commit()
+        
+        stats = generate_daily_slates(factory, run_date, workers=1, chunk_size=3)
+        self.assertEqual(stats['users'], 13)
+        self.assertEqual(get_daily_slate(session, first.id, run_date), [])
+        
+        slate = get_daily_slate(session, first.id + 1, run_date)
+        self.assertEqual(len(slate), MAX_DAILY_MATCHES)
+        self.assertEqual(generate_daily_slates(factory, run_date, workers=1)['users'], 0)
+        
+        # Candidates offered yesterday are not offered again
+        generate_daily_slates(factory, run_date + timedelta(days=1), workers=1)
+        next_slate = get_daily_slate(session, first.id + 1, run_date + timedelta(days=1))
+        self.assertEqual(len(next_slate), MAX_DAILY_MATCHES)
+        self.assertFalse({entry.candidate_id for entry in slate} & {entry.candidate_id for entry in next_slate})
+        session.close()
+    
+    def test_pending_chunks_are_read_lazily(self):
+        """Each chunk is queried when requested, so checkpoints written meanwhile are respected."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        self.seed(session)
+        run_date = datetime(2026, 1, 1).date()
+        
+        chunks = pending_user_chunks(session, run_date, 4)
+        first = next(chunks)
+        self.assertEqual(len(first), 4)
+        later = session.query(User.id).filter(User.id > first[-1]).order_by(User.id).limit(2).all()
+        session.add_all(PipelineCheckpoint(run_date=run_date, user_id=user_id) for user_id, in later)
+        session.commit()
+        remaining = [user_id for chunk in chunks for user_id in chunk]
+        self.assertEqual(len(remaining), 8)
+        self.assertFalse({user_id for user_id, in later} & set(remaining))
+        session.close()
+    
+    def test_slate_date_is_utc(self):
+        """The slate day rolls over at UTC midnight, like the daily answer count."""
+        self.assertEqual(utc_today(datetime(2026, 1, 1, 23, 30)), datetime(2026, 1, 1).date())
+        with patch('src.pipeline.utc_today', return_value=datetime(2026, 1, 2).date()):
+            engine = create_engine("sqlite://")
+            Base.metadata.create_all(engine)
+            factory = sessionmaker(bind=engine)
+            session = factory()
+            self.seed(session)
+            generate_daily_slates(factory, workers=1)
+            user = session.query(User).order_by(User.id).first()
+            self.assertEqual(len(get_daily_slate(session, user.id)), len(get_daily_slate(
+                session, user.id, datetime(2026, 1, 2).date())))
+            self.assertEqual({entry.slate_date for entry in session.query(DailySlate)}, {datetime(2026, 1, 2).date()})
+            session.close()
+    
+    def test_worker_processes(self):
+        """Slates generated by a process pool are written to the database."""
+        with tempfile.TemporaryDirectory() as directory:
+            db_uri = f"sqlite:///{os.path.join(directory, 'pipeline.db')}"
+            engine = create_engine(db_uri)
+            Base.metadata.create_all(engine)
+            factory = sessionmaker(bind=engine)
+            session = factory()
+            self.seed(session)
+            
+            stats = generate_daily_slates(factory, datetime(2026, 1, 1).date(), workers=2,
+                                          chunk_size=4, db_uri=db_uri)
+            self.assertEqual(stats['users'], 14)
+            self.assertEqual(session.query(DailySlate).count(), stats['matches'])
+            session.close()
+            engine.dispose()
+
+class TestMigrations(unittest.TestCase):
+    """Test cases for index migrations."""
+    
+    def test_apply_indexes_to_existing_database(self):
+        """Missing indexes are created and duplicate match pairs removed."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        drop_indexes(engine)
+        
+        session = sessionmaker(bind=engine)()
+        sender = add_test_user(session, 1, Gender.MALE)
+        receiver = add_test_user(session, 2, Gender.FEMALE)
+        session.add_all([
+            Match(sender_id=sender.id, receiver_id=receiver.id, compatibility_score=70),
+            Match(sender_id=sender.id, receiver_id=receiver.id, compatibility_score=70)
+        ])
+        session.commit()
+        session.close()
+        
+        created = apply_indexes(engine)
+        self.assertIn('uq_matches_sender_receiver', created)
+        self.assertIn('ix_profiles_gender_age', created)
+        self.assertEqual(apply_indexes(engine), [])
+        
+        session = sessionmaker(bind=engine)()
+        self.assertEqual(session.query(Match).count(), 1)
+        session.close()
+
+    def test_apply_columns_to_existing_database(self):
+        """Columns added to the models are added to existing tables with their defaults."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        add_test_user(session, 1, Gender.MALE)
+        session.commit()
+        session.close()
+        with engine.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE profiles DROP COLUMN version")
+        
+        self.assertEqual(apply_columns(engine), ['profiles.version'])
+        self.assertEqual(apply_columns(engine), [])
+        session = sessionmaker(bind=engine)()
+        self.assertEqual(session.query(Profile.version).scalar(), 1)
+        session.close()
+
+class TestDatabase(unittest.TestCase):
+    """Test cases for engine and session configuration."""
+
+    def test_sqlite_file_engine_uses_wal_and_concurrent_writers(self):
+        """File databases run in WAL mode and concurrent writers wait instead of failing."""
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'pool.db')}")
+            Base.metadata.create_all(engine)
+            with engine.connect() as connection:
+                self.assertEqual(connection.exec_driver_sql("PRAGMA journal_mode").scalar(), "wal")
+                self.assertEqual(connection.exec_driver_sql("PRAGMA busy_timeout").scalar(), 30000)
+
+            factory = sessionmaker(bind=engine)
+
+            def register(telegram_id):
+                session = factory()
+                try:
+                    session.add(User(telegram_id=str(telegram_id), first_name="User"))
+                    session.commit()
+                finally:
+                    session.close()
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(register, range(200)))
+
+            session = factory()
+            self.assertEqual(session.query(User).count(), 200)
+            session.close()
+            engine.dispose()
+
+    def test_get_session_returns_independent_sessions(self):
+        """Each unit of work gets its own session rather than a thread-local one."""
+        first, second = get_session(), get_session()
+        self.assertIsNot(first, second)
+        first.close()
+        second.close()
+
+class TestRepository(unittest.TestCase):
+    """Test cases for the handler data access run off the event loop."""
+
+    def test_units_of_work_through_run_db(self):
+        """Repository functions run in the executor and return plain values."""
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'repo.db')}")
+            Base.metadata.create_all(engine)
+            factory = sessionmaker(bind=engine)
+
+            async def scenario():
+                created = await run_db(repository.get_or_create_user, 1, "sara", "Sara", "ar")
+                saved = await run_db(repository.save_profile_data, 1, {'age': 28, 'gender': 'female'})
+                missing = await run_db(repository.save_language_preference, 2, 'en')
+                loaded = await run_db(repository.get_or_create_user, 1, "sara", "Sara", "ar")
+                await run_db(repository.save_profile_data, 1, {'age': 29, 'gender': 'female'})
+                return created, saved, missing, loaded
+
+            user_cache.clear()
+            with patch('src.repository.get_session', factory):
+                created, saved, missing, loaded = asyncio.run(scenario())
+
+            self.assertEqual(created, {'language': 'ar', 'has_profile': False})
+            self.assertTrue(saved)
+            self.assertFalse(missing)
+            self.assertTrue(loaded['has_profile'])
+            session = factory()
+            # Every save bumps the version keying cached pair scores
+            self.assertEqual(session.query(Profile.version).scalar(), 2)
+            session.close()
+            engine.dispose()
+
+    def test_declined_candidate_leaves_ranking(self):
+        """Declining stores the pair and removes the candidate from the cached ranking."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        ids = [add_test_user(session, telegram_id, gender).id
+               for telegram_id, gender in ((1, Gender.MALE), (2, Gender.FEMALE), (3, Gender.FEMALE))]
+        session.commit()
+        session.close()
+        feature_store.clear()
+        user_cache.clear()
+        
+        with patch('src.repository.get_session', factory):
+            shown = repository.load_next_match(1, 0)
+            self.assertEqual(repository.record_match_response(1, "no", shown['candidate_id'])['status'], 'declined')
+            remaining = repository.load_next_match(1, 0)
+        
+        self.assertNotEqual(remaining['candidate_id'], shown['candidate_id'])
+        session = factory()
+        pair = session.query(SeenPair).one()
+        self.assertEqual((pair.user_id, pair.candidate_id, pair.rejected), (ids[0], shown['candidate_id'], True))
+        self.assertEqual(session.query(MatchCacheEntry).filter(
+            MatchCacheEntry.candidate_id == shown['candidate_id']).count(), 0)
+        session.close()
+        engine.dispose()
+    
+    def test_daily_quota_counts_answers(self):
+        """Answering MAX_DAILY_MATCHES candidates ends the day's matches although more remain."""
+        from src.config import MAX_DAILY_MATCHES
+        
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        add_test_user(session, 1, Gender.MALE)
+        for telegram_id in range(2, MAX_DAILY_MATCHES + 4):
+            add_test_user(session, telegram_id, Gender.FEMALE)
+        session.commit()
+        session.close()
+        feature_store.clear()
+        user_cache.clear()
+        
+        with patch('src.repository.get_session', factory):
+            for answer in range(MAX_DAILY_MATCHES):
+                shown = repository.load_next_match(1, 0)
+                self.assertEqual(shown['status'], 'ok')
+                repository.record_match_response(1, "yes" if answer % 2 else "no", shown['candidate_id'])
+            finished = repository.load_next_match(1, 0)
+        
+        self.assertEqual(finished['status'], 'no_matches')
+        session = factory()
+        self.assertGreater(session.query(MatchCacheEntry).count(), 0)
+        self.assertEqual(session.query(SeenPair).filter(SeenPair.answered_at.isnot(None)).count(), MAX_DAILY_MATCHES)
+        session.close()
+        engine.dispose()
+    
+    def test_candidate_without_profile_leaves_ranking(self):
+        """A ranked candidate whose profile was removed is skipped and dropped."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        for telegram_id, gender in ((1, Gender.MALE), (2, Gender.FEMALE), (3, Gender.FEMALE)):
+            add_test_user(session, telegram_id, gender)
+        session.commit()
+        session.close()
+        feature_store.clear()
+        user_cache.clear()
+        
+        with patch('src.repository.get_session', factory):
+            shown = repository.load_next_match(1, 0)
+            session = factory()
+            session.delete(session.get(User, shown['candidate_id']).profile)
+            session.commit()
+            session.close()
+            remaining = repository.load_next_match(1, 0)
+        
+        self.assertEqual(remaining['status'], 'ok')
+        self.assertNotEqual(remaining['candidate_id'], shown['candidate_id'])
+        session = factory()
+        self.assertEqual(session.query(MatchCacheEntry).filter(
+            MatchCacheEntry.candidate_id == shown['candidate_id']).count(), 0)
+        session.close()
+        engine.dispose()
+    
+    def test_match_stores_shown_scores(self):
+        """A like stores the scores shown with the candidate, or scores the pair itself."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        session = factory()
+        ids = [add_test_user(session, telegram_id, gender, personality_type=personality).id
+               for telegram_id, gender, personality in
+               ((1, Gender.MALE, "INTJ"), (2, Gender.FEMALE, "ENFP"), (3, Gender.FEMALE, None))]
+        session.commit()
+        session.close()
+        feature_store.clear()
+        user_cache.clear()
+        
+        shown = {'score': 81.5, 'sub_scores': {'religious': 90.0, 'personality': 70.0, 'family': 50.0,
+                                               'lifestyle': 60.0, 'horoscope': 50.0}}
+        with patch('src.repository.get_session', factory):
+            repository.record_match_response(1, "yes", ids[1], shown)
+            repository.record_match_response(1, "yes", ids[2])
+        
+        session = factory()
+        first, second = session.query(Match).order_by(Match.id).all()
+        self.assertEqual((first.compatibility_score, first.religious_score, first.personality_score),
+                         (81.5, 90.0, 70.0))
+        seeker, candidate = (session.get(User, user_id).profile for user_id in (ids[0], ids[2]))
+        self.assertEqual(second.compatibility_score, calculate_overall_compatibility(seeker, candidate))
+        self.assertEqual(second.personality_score, 50)
+        session.close()
+        engine.dispose()
+
+class TestNotificationOutbox(unittest.TestCase):
+    """Test cases for match notifications delivered from the outbox."""
+
+    def setUp(self):
+        self.engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.factory = sessionmaker(bind=self.engine)
+        session = self.factory()
+        self.ids = [add_test_user(session, telegram_id, gender).id
+                    for telegram_id, gender in ((1, Gender.MALE), (2, Gender.FEMALE))]
+        session.commit()
+        session.close()
+        user_cache.clear()
+        self.patches = [patch('src.repository.get_session', self.factory),
+                        patch('src.notifications.get_session', self.factory)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.engine.dispose()
+
+    def outbox(self):
+        session = self.factory()
+        try:
+            return [(event.kind, event.recipient_id, event.delivered_at is not None, event.attempts)
+                    for event in session.query(OutboxEvent).order_by(OutboxEvent.id)]
+        finally:
+            session.close()
+
+    def test_events_written_with_match(self):
+        """A like and the mutual match that follows each enqueue the other user's notification."""
+        repository.record_match_response(1, "yes", self.ids[1])
+        self.assertEqual(self.outbox(), [('new_like', self.ids[1], False, 0)])
+
+        self.assertEqual(repository.record_match_response(2, "yes", self.ids[0])['status'], 'mutual')
+        self.assertEqual([event[:2] for event in self.outbox()], [
+            ('new_like', self.ids[1]), ('mutual_match', self.ids[0]), ('conversation_created', self.ids[0])
+        ])
+
+    def test_repeated_yes_is_ignored(self):
+        """Answering yes twice keeps one match and one notification, also after a mutual match."""
+        self.assertEqual(repository.record_match_response(1, "yes", self.ids[1])['status'], 'pending')
+        self.assertEqual(repository.record_match_response(1, "yes", self.ids[1])['status'], 'pending')
+        self.assertEqual(repository.record_match_response(2, "yes", self.ids[0])['status'], 'mutual')
+        self.assertEqual(repository.record_match_response(2, "yes", self.ids[0])['status'], 'mutual')
+        
+        session = self.factory()
+        self.assertEqual(session.query(Match).count(), 1)
+        self.assertEqual(session.query(Conversation).count(), 1)
+        session.close()
+        self.assertEqual(len(self.outbox()), 3)
+
+    def test_batched_delivery_is_idempotent(self):
+        """Each recipient gets one combined message, and delivered events are not resent."""
+        repository.record_match_response(1, "yes", self.ids[1])
+        repository.record_match_response(2, "yes", self.ids[0])
+        bot = SimpleNamespace(send_message=AsyncMock())
+
+        async def scenario():
+            return await deliver_pending(bot), await deliver_pending(bot)
+
+        with patch('src.notifications.get_text', lambda key, lang=None, name=None: f"{key} {name}"):
+            self.assertEqual(asyncio.run(scenario()), (3, 0))
+        messages = {call.kwargs['chat_id']: call.kwargs['text'] for call in bot.send_message.await_args_list}
+        self.assertEqual(set(messages), {1, 2})
+        self.assertIn("mutual_match User 2", messages[1])
+        self.assertEqual(len(messages[1].split("\n\n")), 2)
+        self.assertTrue(all(delivered for _, _, delivered, _ in self.outbox()))
+
+    def test_workers_deliver_own_shard(self):
+        """A worker only claims the events of recipients in its shard."""
+        repository.record_match_response(1, "yes", self.ids[1])
+        repository.record_match_response(2, "yes", self.ids[0])
+        bot = SimpleNamespace(send_message=AsyncMock())
+
+        async def scenario(shard):
+            set_delivery_shard(shard, 2)
+            return await deliver_pending(bot)
+
+        try:
+            self.assertEqual(asyncio.run(scenario(1)), 2)
+            self.assertEqual([call.kwargs['chat_id'] for call in bot.send_message.await_args_list], [1])
+            self.assertEqual(asyncio.run(scenario(0)), 1)
+        finally:
+            set_delivery_shard(0, 1)
+        self.assertEqual([call.kwargs['chat_id'] for call in bot.send_message.await_args_list], [1, 2])
+
+    def test_failed_delivery_retried_later(self):
+        """A failed send keeps the event for a later attempt."""
+        repository.record_match_response(1, "yes", self.ids[1])
+        bot = SimpleNamespace(send_message=AsyncMock(side_effect=RuntimeError("blocked")))
+
+        async def scenario():
+            return await deliver_pending(bot), await deliver_pending(bot)
+
+        self.assertEqual(asyncio.run(scenario()), (1, 0))
+        self.assertEqual(self.outbox(), [('new_like', self.ids[1], False, 1)])
+
+class TestUserCache(unittest.TestCase):
+    """Test cases for the in-memory user state cache."""
+
+    def test_lru_and_ttl(self):
+        """The least recently used entry is evicted and entries expire."""
+        now = [0.0]
+        cache = UserCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        for telegram_id in (1, 2):
+            cache.put(telegram_id, UserState(telegram_id, 'en', True, None))
+        cache.get(1)
+        cache.put(3, UserState(3, 'ar', False, None))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1).user_id, 1)
+        now[0] = 11
+        self.assertIsNone(cache.get(1))
+
+    def test_returning_user_needs_no_query(self):
+        """A cached user is resolved without a query, and writes invalidate the entry."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        user_cache.clear()
+
+        with patch('src.repository.get_session', factory):
+            repository.get_or_create_user(1, "sara", "Sara", "ar")
+            self.assertEqual(repository.get_or_create_user(1, "sara", "Sara", "ar")['language'], 'en')
+            with count_queries(engine) as statements:
+                state = repository.get_or_create_user(1, "sara", "Sara", "ar")
+            self.assertEqual(statements, [])
+            self.assertEqual(state, {'language': 'en', 'has_profile': False})
+
+            repository.save_language_preference(1, 'ar')
+            repository.save_profile_data(1, {'age': 28, 'gender': 'female'})
+            self.assertEqual(repository.get_or_create_user(1, "sara", "Sara", "ar"),
+                             {'language': 'ar', 'has_profile': True})
+        user_cache.clear()
+        engine.dispose()
+
+class TestWorkerMode(unittest.TestCase):
+    """Test cases for sharded worker processes and their persistence."""
+
+    def test_updates_routed_by_user(self):
+        """Every update of a user goes to the same worker queue."""
+        queues = [[], [], []]
+        for telegram_id in (7, 8, 9, 10, 7):
+            update = SimpleNamespace(effective_user=SimpleNamespace(id=telegram_id))
+            route_update(update, queues).append(telegram_id)
+        self.assertEqual(queues, [[9], [7, 10, 7], [8]])
+        self.assertIs(route_update(SimpleNamespace(effective_user=None), queues), queues[0])
+        self.assertEqual(shard_for(7, 3), 1)
+
+    def test_sql_persistence_shards(self):
+        """Conversation states and user data round-trip and load per shard."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+
+        async def scenario():
+            writer = SQLPersistence(session_factory=factory)
+            await writer.update_user_data(10, {'language': 'ar', 'birth_date': datetime(1995, 5, 1)})
+            await writer.update_user_data(11, {'language': 'en'})
+            await writer.update_conversation("main", (10, 10), 3)
+            await writer.update_conversation("main", (11, 11), 7)
+            await writer.update_conversation("main", (11, 11), None)
+            await writer.flush()
+
+            even = SQLPersistence(shard=0, shards=2, session_factory=factory)
+            odd = SQLPersistence(shard=1, shards=2, session_factory=factory)
+            return (await even.get_user_data(), await odd.get_user_data(),
+                    await even.get_conversations("main"), await odd.get_conversations("main"))
+
+        even_users, odd_users, even_states, odd_states = asyncio.run(scenario())
+        self.assertEqual(even_users, {10: {'language': 'ar', 'birth_date': datetime(1995, 5, 1)}})
+        self.assertEqual(odd_users, {11: {'language': 'en'}})
+        self.assertEqual(even_states, {(10, 10): 3})
+        self.assertEqual(odd_states, {})
+        engine.dispose()
+
+    def test_sql_persistence_writes_changes_in_batches(self):
+        """Only changed state is written, in one batch, and survives a restart."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+
+        async def scenario():
+            first = SQLPersistence(session_factory=factory, flush_delay=0)
+            for telegram_id in (20, 21, 22):
+                await first.update_user_data(telegram_id, {'language': 'en'})
+                await first.update_conversation("main", (telegram_id, telegram_id), 1)
+            await asyncio.sleep(0.05)
+            batches = first.stats['batches']
+
+            # Rewriting the same state is skipped; only user 21's change is written
+            for telegram_id in (20, 21, 22):
+                await first.update_conversation("main", (telegram_id, telegram_id), 2 if telegram_id == 21 else 1)
+            await first.update_user_data(20, {'language': 'en'})
+            await first.flush()
+
+            restarted = SQLPersistence(session_factory=factory)
+            states = await restarted.get_conversations("main")
+            await restarted.get_user_data()
+            await restarted.update_user_data(22, {'language': 'en'})
+            return batches, first.stats, states, restarted.stats
+
+        batches, stats, states, restarted_stats = asyncio.run(scenario())
+        self.assertEqual(batches, 1)
+        self.assertEqual(stats, {'batches': 2, 'written': 7, 'unchanged': 3})
+        self.assertEqual(states, {(20, 20): 1, (21, 21): 2, (22, 22): 1})
+        self.assertEqual(restarted_stats['unchanged'], 1)
+        engine.dispose()
+
+class TestWebhook(unittest.TestCase):
+    """Test cases for the webhook ASGI application."""
+
+    def make_app(self, queue_size=100, enqueue_timeout=5):
+        processed = []
+
+        async def process_update(update):
+            processed.append(update.update_id)
+
+        application = SimpleNamespace(
+            bot=None, initialize=AsyncMock(), start=AsyncMock(), stop=AsyncMock(), shutdown=AsyncMock(),
+            process_update=process_update
+        )
+        app = WebhookApp(application, "secret", path="/telegram", queue_size=queue_size, concurrency=2,
+                         enqueue_timeout=enqueue_timeout)
+        return app, processed
+
+    def post(self, app, update, token="secret", path="/telegram", method="POST"):
+        """Call the ASGI app with one request and return the response status."""
+        body = json.dumps(update).encode()
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'path': path, 'method': method,
+                 'headers': [(b'x-telegram-bot-api-secret-token', token.encode())]}
+        self.loop.run_until_complete(app(scope, receive, send))
+        return sent[0]['status']
+
+    def update(self, update_id, telegram_id):
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": 0, "text": "/start",
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": {"id": telegram_id, "is_bot": False, "first_name": "User"}
+        }}
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_validates_requests_and_processes_in_order(self):
+        """Only authenticated POSTs are queued, and every update is processed after shutdown."""
+        app, processed = self.make_app()
+        self.loop.run_until_complete(app.startup())
+
+        self.assertEqual(self.post(app, self.update(1, 5), token="wrong"), 403)
+        self.assertEqual(self.post(app, self.update(1, 5), path="/other"), 404)
+        self.assertEqual(self.post(app, self.update(1, 5), method="GET"), 405)
+        self.assertEqual(self.post(app, "not an update"), 400)
+        for update_id in range(1, 11):
+            self.assertEqual(self.post(app, self.update(update_id, 5 + update_id % 2)), 200)
+
+        self.loop.run_until_complete(app.shutdown())
+        self.assertEqual(sorted(processed), list(range(1, 11)))
+        self.assertEqual([i for i in processed if i % 2], [1, 3, 5, 7, 9])
+        self.assertEqual(app.stats['accepted'], 10)
+
+    def test_full_queue_answers_503(self):
+        """Requests are shed with a 503 when the queue stays full."""
+        app, _ = self.make_app(queue_size=2, enqueue_timeout=0.01)
+        # Not started, so nothing drains the queues
+        statuses = [self.post(app, self.update(update_id, 4)) for update_id in range(1, 4)]
+        self.assertEqual(statuses, [200, 503, 503])
+        self.assertEqual(app.stats['rejected'], 2)
+
+@contextmanager
+def count_queries(engine):
+    """Collect the SQL statements an engine executes inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def make_callback_update(telegram_id):
+    """Build a minimal callback-query update whose replies are recorded."""
+    return SimpleNamespace(callback_query=SimpleNamespace(
+        from_user=SimpleNamespace(id=telegram_id),
+        edit_message_text=AsyncMock()
+    ))
+
+class FakeBotAPI:
+    """Stand-in for the Bot API recording every message and failing on request."""
+
+    def __init__(self, delay=0.0, flood=()):
+        self.delay = delay
+        self.flood = list(flood)
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.delay)
+        if self.flood:
+            raise RetryAfter(timedelta(seconds=self.flood.pop(0)))
+        self.sent.append((chat_id, text, time.monotonic()))
+        return text
+
+class TestSendQueue(unittest.TestCase):
+    """Test cases for the rate-limited outbound message queue."""
+
+    def test_interactive_replies_sent_before_bulk(self):
+        """Queued notifications wait while a user's reply jumps ahead."""
+        api = FakeBotAPI()
+
+        async def scenario():
+            sender = SendQueue(rate=50, burst=1, chat_rate=100, chat_burst=10)
+            sends = [sender.send(chat, api.send_message, chat, "slate", priority=BULK) for chat in (1, 2, 3)]
+            sends.append(sender.send(4, api.send_message, 4, "reply", priority=INTERACTIVE))
+            return await asyncio.gather(*sends)
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, ["slate", "slate", "slate", "reply"])
+        self.assertEqual([chat for chat, _, _ in api.sent], [1, 4, 2, 3])
+
+    def test_chat_rate_limited(self):
+        """Messages to one chat are spaced out; other chats are not held up."""
+        api = FakeBotAPI()
+
+        async def scenario():
+            sender = SendQueue(rate=1000, chat_rate=20, chat_burst=1)
+            await asyncio.gather(*(sender.send(chat, api.send_message, chat, str(i))
+                                   for i, chat in enumerate((1, 1, 1, 2))))
+
+        asyncio.run(scenario())
+        first_chat = [(text, at) for chat, text, at in api.sent if chat == 1]
+        self.assertEqual([text for text, _ in first_chat], ["0", "1", "2"])
+        self.assertGreaterEqual(first_chat[2][1] - first_chat[0][1], 0.09)
+        self.assertLess(api.sent[1][2] - api.sent[0][2], 0.04)
+
+    def test_retry_after_pauses_and_retries(self):
+        """A flood control error delays the message instead of losing it."""
+        api = FakeBotAPI(flood=[0.1])
+
+        async def scenario():
+            sender = SendQueue(rate=1000, chat_rate=1000, chat_burst=10)
+            start = time.monotonic()
+            result = await sender.send(1, api.send_message, 1, "hello")
+            return result, time.monotonic() - start, sender.stats
+
+        result, elapsed, stats = asyncio.run(scenario())
+        self.assertEqual(result, "hello")
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual((stats['sent'], stats['retried']), (1, 1))
+
+        api = FakeBotAPI(flood=[0, 0, 0])
+        sender = SendQueue(rate=1000, chat_rate=1000, chat_burst=10, max_retries=2)
+        with self.assertRaises(RetryAfter):
+            asyncio.run(sender.send(1, api.send_message, 1, "hello"))
+
+    def test_waiting_edits_coalesced(self):
+        """Only the latest of several waiting edits of a message is sent."""
+        api = FakeBotAPI(delay=0.02)
+
+        async def scenario():
+            sender = SendQueue(rate=1000, chat_rate=1000, chat_burst=10)
+            sends = [sender.send(1, api.send_message, 1, f"edit {i}", coalesce=("edit", 1, 5)) for i in range(3)]
+            return await asyncio.gather(*sends), sender.stats
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual([text for _, text, _ in api.sent], ["edit 0", "edit 2"])
+        self.assertEqual(results, ["edit 0", "edit 2", "edit 2"])
+        self.assertEqual(stats['coalesced'], 1)
+
+    def test_workers_share_send_rate(self):
+        """Worker processes together send no faster than SEND_RATE."""
+        from src import sender
+        from src.config import SEND_RATE
+
+        try:
+            share_send_rate(4)
+            self.assertEqual(get_send_queue().bucket.rate * 4, SEND_RATE)
+            self.assertIs(get_send_queue(), get_send_queue())
+        finally:
+            sender._send_queue = None
+
+class TestQueryBudgets(unittest.TestCase):
+    """Handlers must run a fixed number of queries however many rows they show."""
+
+    # Maximum statements per handler call
+    SHOW_MATCHES_BUDGET = 10
+    SHOW_CONVERSATIONS_BUDGET = 3
+
+    def assertWithinBudget(self, statements, budget):
+        self.assertLessEqual(len(statements), budget,
+                             f"{len(statements)} queries exceed the budget of {budget}:\n" + "\n".join(statements))
+
+    def seed(self, candidate_count):
+        """Build a database with one seeker, some candidates and conversations."""
+        engine = create_db_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+
+        session = factory()
+        interests = [Interest(name=f"Interest {i}", category="Hobby") for i in range(3)]
+        seeker = add_test_user(session, 1, Gender.FEMALE, personality_type="INFJ")
+        seeker.profile.interests.extend(interests[:2])
+        for i in range(candidate_count):
+            candidate = add_test_user(session, 100 + i, Gender.MALE, personality_type="ENTP")
+            candidate.profile.interests.extend(interests[i % 3:])
+            conversation = Conversation()
+            conversation.participants.extend([seeker, candidate])
+            session.add(conversation)
+        session.commit()
+        session.close()
+        return engine, factory
+
+    def run_handler(self, handler, candidate_count):
+        """Call a handler against a fresh database and return its SQL statements."""
+        engine, factory = self.seed(candidate_count)
+        feature_store.clear()
+        score_cache.clear()
+        user_cache.clear()
+        update = make_callback_update(1)
+        with patch('src.repository.get_session', factory), count_queries(engine) as statements:
+            asyncio.run(handler(update, SimpleNamespace(user_data={'language': 'en'})))
+        update.callback_query.edit_message_text.assert_awaited()
+        engine.dispose()
+        return statements
+
+    def test_show_potential_matches_budget(self):
+        """Ranking and showing a match does not load relationships per candidate."""
+        few = self.run_handler(bot.show_potential_matches, 3)
+        many = self.run_handler(bot.show_potential_matches, 12)
+        self.assertWithinBudget(many, self.SHOW_MATCHES_BUDGET)
+        self.assertEqual(len(few), len(many))
+
+    def test_show_conversations_budget(self):
+        """Listing conversations does not load participants per conversation."""
+        few = self.run_handler(bot.show_conversations, 2)
+        many = self.run_handler(bot.show_conversations, 10)
+        self.assertWithinBudget(many, self.SHOW_CONVERSATIONS_BUDGET)
+        self.assertEqual(len(few), len(many))
+
 class TestTranslations(unittest.TestCase):
     """Test cases for translations."""
     
@@ -183,5 +1614,32 @@ class TestTranslations(unittest.TestCase):
         text = get_text("non_existent_key", lang="en")
         self.assertEqual(text, "non_existent_key")
 
+    def test_compiled_templates(self):
+        """Compiled templates format like str.format and fall back to the default language."""
+        from src.translations import compile_template
+        args = {'score': 85.25, 'name': "Sara", 'other': "Omar"}
+        for template in ("Score: {score}%", "{name} and {other}!", "{score:.1f}", "{name!r}"):
+            text, render = compile_template(template)
+            self.assertEqual(text, template)
+            self.assertEqual(render(args), template.format(**args))
+        self.assertEqual(compile_template("No fields"), ("No fields", None))
+
+        with patch.dict('src.translations.translations', {'en': {'greeting': "Hello {name}"}, 'ar': {}}):
+            from src.translations import compile_catalog
+            compile_catalog()
+            self.assertEqual(get_text("greeting", lang="ar", name="Sara"), "Hello Sara")
+            self.assertEqual(get_text("greeting", lang="en"), "Hello {name}")
+        load_translations()
+
+    def test_keyboards_cached_per_language(self):
+        """Static menus are built once per language and rebuilt after a reload."""
+        from src.keyboards import get_keyboard
+        english = get_keyboard("main_menu", "en")
+        self.assertIs(get_keyboard("main_menu", "en"), english)
+        self.assertIsNot(get_keyboard("main_menu", "ar"), english)
+        self.assertEqual(english.inline_keyboard[0][0].callback_data, "menu_matches")
+        load_translations()
+        self.assertIsNot(get_keyboard("main_menu", "en"), english)
+
 if __name__ == "__main__":
     unittest.main()